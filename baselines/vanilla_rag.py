@@ -102,7 +102,7 @@ class SQLAgent:
         self.desc_str = get_desc(source=None)
         self.fk_str = get_fk(source=None)
         self.table_names = get_table_names(source=None)
-        self.table_info = config.db_config.pdk_database.get_table_info(table_names=self.table_names)
+        self.table_info = config.db_config.get_table_info(config.db_config.pdk_database, self.table_names)
 
         system_prompt = VANILLA_RAG_SYS_PROMPT('SQLite', self.desc_str, self.fk_str, self.table_info)
         system_prompt += """Here are some examples for user questions and their corresponding query decomposition:"""        
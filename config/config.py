@@ -1,12 +1,13 @@
 
-import sqlite3
-
 from langchain_community.graphs import Neo4jGraph
-from langchain_community.utilities import SQLDatabase
 
 from config.sky130 import View
 from core.agents.agent import Agent
 from core.database.graphdb import URI, USER, PASSWORD
+from core.database.db_utils import get_pooled_sql_database, get_mmap_sql_database, stage_database_file, load_memdb, connect_memdb, connect_read_only, TableInfoCache, PartitionCache, FederatedDatabase
+from core.database.sql import get_table_names
+from core.database.query_guard import QueryGuard
+from core.database.columnar import get_duckdb_sql_database
 from config.sky130 import SCLVariants, sky130_scl_corners, Sky130TechLefCorner
 
 class LMConfigs:
@@ -82,7 +83,7 @@ class LMConfigs:
 
 class FlowConfigs:
 
-    def __init__(self, few_shot=True, generator_few_shot=True, secure=False, use_planner=True, use_router=True, use_selector=True, decompose_query=True, use_refiner=True, use_in_mem_db=True, max_refine_iters=3, graph_recursion_limit=6, add_table_info=False) -> None:
+    def __init__(self, few_shot=True, generator_few_shot=True, secure=False, use_planner=True, use_router=True, use_selector=True, decompose_query=True, use_refiner=True, use_in_mem_db=True, max_refine_iters=3, graph_recursion_limit=6, add_table_info=False, resolve_names=True) -> None:
         self.few_shot = few_shot
         self.generator_few_shot = generator_few_shot
         self.use_in_mem_db = use_in_mem_db
@@ -95,6 +96,8 @@ class FlowConfigs:
         self.graph_recursion_limit = graph_recursion_limit 
         self.secure = secure   
         self.add_table_info = add_table_info
+        # Add the exact cell, pin, layer and via names matching the question to the generator prompt
+        self.resolve_names = resolve_names
         
     def set_use_planner(self, value):
         self.use_planner = value 
@@ -114,62 +117,93 @@ class FlowConfigs:
 
 class DatabaseConfig:
 
-    def __init__(self, pdk_database="dbs/sky130_index.db", design_database="sky130pico", partition=False, in_mem_db=True, load_graph_db=True) -> None:
+    def __init__(self, pdk_database="dbs/sky130_index.db", design_database="sky130pico", partition=False, in_mem_db=True, load_graph_db=True, max_partitions=None, max_partition_bytes=None, mmap_db=False, mmap_stage_dir=None, query_timeout=10.0, max_vm_steps=None, max_rows=10000, backend="sqlite", parquet_dir="dbs/sky130_parquet") -> None:
         
+        if backend not in ("sqlite", "duckdb"):
+            raise ValueError(f"Invalid backend {backend}, expected one of ['sqlite', 'duckdb']")
         self.partition = partition
+        self.backend = backend
+        # Budgets for the generated SQL run by the refiner
+        self.query_guard = QueryGuard(timeout=query_timeout, max_vm_steps=max_vm_steps, max_rows=max_rows)
+        # In-memory images only live while a connection to them is open
+        self.memory_connections = {}
+        self.table_info_cache = TableInfoCache()
+        self.database_views = {}
+        self.federation = None
         db_conn = {}
-        if partition:
+        if backend == "duckdb":
+            if partition:
+                raise ValueError("The DuckDB backend serves every library and corner from one Parquet export, use partition=False")
+            # Aggregates over all cells, corners and NLDM points run on the columnar export of the single database
+            self.pdk_database = get_duckdb_sql_database(parquet_dir, view_support=True)
+            self.table_info_cache.register(self.pdk_database, parquet_dir)
+        elif partition:
+            db_files = {}
+            # The columns a partition dropped, restored by the federated views
+            partition_labels = {}
             for variant in SCLVariants:
                 variant_name = variant.value
                 key_lef = f"{variant_name}_{View.Lef.value}"
-                disk_connection = sqlite3.connect(f"dbs/sky130/{key_lef}.db")
-                memory_lef_conn = sqlite3.connect(f"file:{key_lef}_memdb?mode=memory&cache=shared", uri=True, check_same_thread=False)
-                disk_connection.backup(memory_lef_conn)
-
-                db_conn[key_lef] = SQLDatabase.from_uri(
-                    f"sqlite:///file:{key_lef}_memdb?mode=memory&cache=shared&uri=true",
-                    view_support=True
-                )
+                db_files[key_lef] = f"dbs/sky130/{key_lef}.db"
+                self.database_views[key_lef] = View.Lef.value
+                partition_labels[key_lef] = {'Cell_Library': variant_name}
 
                 for corner in Sky130TechLefCorner:
                     key_tlef = f"{variant_name}_{View.TechLef.value}_{corner.value}"
-                    disk_connection = sqlite3.connect(f"dbs/sky130/{key_tlef}.db")
-                    memory_tlef_conn = sqlite3.connect(f"file:{key_tlef}_memdb?mode=memory&cache=shared", uri=True, check_same_thread=False)
-                    disk_connection.backup(memory_tlef_conn)
-                    db_conn[key_tlef] = SQLDatabase.from_uri(
-                        f"sqlite:///file:{key_tlef}_memdb?mode=memory&cache=shared&uri=true",
-                        view_support=True
-                    )
+                    db_files[key_tlef] = f"dbs/sky130/{key_tlef}.db"
+                    self.database_views[key_tlef] = View.TechLef.value
+                    partition_labels[key_tlef] = {'Cell_Library': variant_name, 'Corner': corner.value}
+
                 for corner in sky130_scl_corners[variant]:
                     key_lib = f"{variant_name}_{View.Liberty.value}_{corner.value}"
-                    disk_connection = sqlite3.connect(f"dbs/sky130/{key_lib}.db")
-                    memory_lib_conn = sqlite3.connect(f"file:{key_lib}_memdb?mode=memory&cache=shared", uri=True, check_same_thread=False)
-                    disk_connection.backup(memory_lib_conn)
-                    db_conn[key_lib] = SQLDatabase.from_uri(
-                        f"sqlite:///file:{key_lib}_memdb?mode=memory&cache=shared&uri=true",
-                        view_support=True
-                    )
-
-                self.pdk_database = db_conn 
+                    db_files[key_lib] = f"dbs/sky130/{key_lib}.db"
+                    self.database_views[key_lib] = View.Liberty.value
+                    partition_labels[key_lib] = {'Cell_Library': variant_name, 'Corner': corner.value}
+
+            if mmap_db and mmap_stage_dir:
+                db_files = {key: stage_database_file(db_file, mmap_stage_dir) for key, db_file in db_files.items()}
+
+            # Partitions are copied to memory on first use, see `get_database`
+            self.pdk_database = PartitionCache(
+                db_files,
+                max_partitions=0 if mmap_db else max_partitions,
+                max_bytes=max_partition_bytes,
+                on_open=self.open_partition,
+                immutable=mmap_db,
+                view_support=True
+            )
+            # Questions spanning several libraries or corners attach their partitions to one connection
+            self.federation = FederatedDatabase(
+                {key: (db_file, partition_labels[key]) for key, db_file in db_files.items()},
+                immutable=mmap_db,
+                view_support=True
+            )
         else:
-            if in_mem_db: 
-                disk_connection = sqlite3.connect(pdk_database)
-                memory_connection = sqlite3.connect("file:main_memdb?mode=memory&cache=shared", uri=True, check_same_thread=False)
-                disk_connection.backup(memory_connection)
-                db_conn["single"] = SQLDatabase.from_uri(
-                    "sqlite:///file:main_memdb?mode=memory&cache=shared&uri=true",
+            if mmap_db:
+                # Served straight from the page cache, which every process on the host shares
+                db_file = stage_database_file(pdk_database, mmap_stage_dir) if mmap_stage_dir else pdk_database
+                self.pdk_database = get_mmap_sql_database(db_file, view_support=True)
+            elif in_mem_db: 
+                # One in-memory image per process, each thread reads it through its own connection
+                self.memory_connections["single"] = load_memdb(pdk_database, "main_memdb")
+                db_conn["single"] = get_pooled_sql_database(
+                    lambda: connect_memdb("main_memdb"),
                     view_support=True,
                 )
                 self.pdk_database = db_conn["single"] 
 
             else:
-                self.pdk_database = SQLDatabase.from_uri(
-                    f"sqlite:///{pdk_database}", 
+                self.pdk_database = get_pooled_sql_database(
+                    lambda: connect_read_only(pdk_database), 
                     view_support = True
                 )
 
-            self.pdk_database.run("PRAGMA cache_size = 25600;")
-            self.pdk_database.run("PRAGMA page_size = 16384;")
+            if not mmap_db:
+                self.pdk_database.run("PRAGMA cache_size = 25600;")
+                self.pdk_database.run("PRAGMA page_size = 16384;")
+            self.table_info_cache.register(self.pdk_database, pdk_database)
+
+        self.warm_table_info()
         
         if load_graph_db: 
             self.design_database = Neo4jGraph(
@@ -183,6 +217,38 @@ class DatabaseConfig:
         else:
             self.design_database = None 
             
+    def warm_table_info(self):
+        """Renders the table info of every view of the PDK database once, at startup.
+
+        Partitions are warmed when they are opened instead.
+        """
+        if not self.partition:
+            for view in [View.Liberty.value, View.Lef.value, View.TechLef.value]:
+                self.get_table_info(self.pdk_database, get_table_names(view))
+            self.get_table_info(self.pdk_database, get_table_names(None))
+
+    def open_partition(self, key, database):
+        self.table_info_cache.register(database, self.pdk_database.db_files[key])
+        self.get_table_info(database, get_table_names(self.database_views[key], partition=True))
+
+    def get_partition_stats(self):
+        """Returns the hit, miss and eviction counters of the partition cache."""
+        return self.pdk_database.stats() if self.partition else {}
+
+    def get_table_info(self, database, table_names=None):
+        """Returns `database.get_table_info(table_names)`, cached until the database file changes."""
+        if self.is_federated(database):
+            # The union views only exist on the pooled connections, describe the partitions instead
+            return self.federation.describe(database)
+        return self.table_info_cache.get_table_info(database, table_names)
+
+    def is_federated(self, database):
+        return self.federation is not None and self.federation.get_keys(database) is not None
+
+    def get_federation_desc(self, database):
+        """Returns the description of the attached partitions if `database` is the federated one."""
+        return self.federation.describe(database) if self.is_federated(database) else ""
+
     def get_pdk_database(self):
         return self.pdk_database 
     
@@ -192,18 +258,34 @@ class DatabaseConfig:
     def get_database(
         self, view: str, scl_library: list[str], pvt_corner: str, techlef_corner: list[str]
     ):
+        """Returns the database of the routed view, library and corner.
+
+        In partition mode a question spanning several libraries or corners (`pvt_corner` may
+        also be a list) gets the federated database with all of their partitions attached,
+        or a `ValueError` when they are more than SQLite can attach to one connection.
+        """
         if self.partition: 
-            if view == View.Liberty.value:
-                key = f"{scl_library[0]}_{view}_{pvt_corner}"
-            elif view == View.TechLef.value:
-                key = f"{scl_library[0]}_{view}_{techlef_corner[0]}"
-            elif view == View.Lef.value:
-                key = f"{scl_library[0]}_{view}"  
-
-            return self.pdk_database[key] 
+            keys = self.get_partition_keys(view, scl_library, pvt_corner, techlef_corner)
+            if len(keys) > 1:
+                return self.federation.attach(keys)
+
+            return self.pdk_database[keys[0]] 
         else:
             return self.pdk_database
 
+    def get_partition_keys(self, view, scl_library, pvt_corner, techlef_corner):
+        if view == View.Liberty.value:
+            corners = pvt_corner if isinstance(pvt_corner, list) else [pvt_corner]
+            keys = [f"{library}_{view}_{corner}" for library in scl_library for corner in corners]
+        elif view == View.TechLef.value:
+            keys = [f"{library}_{view}_{corner}" for library in scl_library for corner in techlef_corner]
+        elif view == View.Lef.value:
+            keys = [f"{library}_{view}" for library in scl_library]
+
+        # Not every library has every PVT corner
+        existing = [key for key in keys if key in self.pdk_database]
+        return existing or keys[:1]
+
 
 class ChipQueryConfig:
 
@@ -27,6 +27,7 @@ from core.eval.test_design_pdk import test_design_pdk
 from core.eval.cases import pdk_cases, design_cases, pdk_design_cases
 from core.eval.metrics import compute_execution_acc, compute_ves
 from core.database.graphdb import URI, USER, PASSWORD, get_node_descr
+from core.database.db_utils import get_pooled_sql_database, connect_read_only
 
 
 class ChipQuery(Agent):
@@ -91,8 +92,8 @@ class ChipQuery(Agent):
         )
 
         # Databases 
-        self.sql_database = SQLDatabase.from_uri(
-            f"sqlite:///dbs/sky130.db", 
+        self.sql_database = get_pooled_sql_database(
+            lambda: connect_read_only("dbs/sky130.db"), 
             view_support = True
         )
 
@@ -14,7 +14,6 @@ from langchain_community.vectorstores import FAISS
 from core.database.graphdb import URI, USER, PASSWORD, get_node_descr, get_relationship_descr
 from core.agents.refiner import RefinerCypher
 from core.agents.agent import Agent
-from core.agents.few_shot.cypher import cypher_generator_few_shot
 from core.agents.selectors.node_selector import NodeSelector
 from core.graph_flow.states import DesignQueryState
 from core.eval.test_graph import test_design 
@@ -99,6 +98,8 @@ class CypherGenerator(Agent):
 """
         if config.flow_config.few_shot: 
             self.system_prompt += """Here are some examples for user questions and their corresponding query:"""        
+            # The demos embed full schema descriptions, only build them when an agent needs them
+            from core.agents.few_shot.cypher import cypher_generator_few_shot
             example_selector = SemanticSimilarityExampleSelector.from_examples(
                 cypher_generator_few_shot,  
                 OpenAIEmbeddings(),
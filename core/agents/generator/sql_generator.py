@@ -14,8 +14,6 @@ from config.sky130 import cell_variant_sky130
 from core.utils import get_logger, parse_qa_pairs, parse_sql_from_string
 from core.eval.test_set import test_queries, test_queries_tlef, test_queries_lib, test_queries_lef
 from core.eval.metrics import compute_execution_acc, compute_ves
-from core.agents.few_shot.sql import decomposer_few_shot 
-from core.agents.few_shot.sql_partitioned import decomposer_few_shot_partition
 from core.database.sql import get_desc, get_table_names, get_fk
 from core.agents.selectors.table_selector import SchemaSelector
 from core.agents.routers.router import Router
@@ -89,9 +87,12 @@ class Decomposer(Agent):
     if config.flow_config.generator_few_shot: 
       system_prompt += """Here are some examples for user questions and their corresponding query decomposition:"""        
 
+      # The demos embed full schema descriptions, only build them when an agent needs them
       if config.db_config.partition: 
+        from core.agents.few_shot.sql_partitioned import decomposer_few_shot_partition
         example_selector = CustomExampleSelector(decomposer_few_shot_partition)
       else:
+        from core.agents.few_shot.sql import decomposer_few_shot
         example_selector = CustomExampleSelector(decomposer_few_shot)
 
       self.prompt = FewShotPromptTemplate(
@@ -125,7 +126,8 @@ class Decomposer(Agent):
          
     query = state.get("question")
     view = state.get("view")
-    desc_str = state.get("desc_str")
+    # Exact names resolved by the selector follow the schema description
+    desc_str = state.get("desc_str") + (state.get("resolved_names") or "")
 
     if self.config.flow_config.add_table_info: 
       table_info = state.get("table_info")
@@ -13,6 +13,7 @@ from neo4j.exceptions import ClientError, CypherSyntaxError, Neo4jError
 
 from config.sky130 import cell_variant_sky130
 from core.database.sql import get_desc, get_fk
+from core.database.query_guard import QueryTooExpensiveError
 from core.database.graphdb import get_node_descr, get_relationship_descr
 from core.database.graphdb import URI, USER, PASSWORD
 from core.agents.agent import Agent 
@@ -34,6 +35,7 @@ When you find an answer, verify the answer carefully. Include verifiable evidenc
     - If use max or min func, `JOIN <table>` FIRST, THEN use `SELECT MAX(<column>)` or `SELECT MIN(<column>)`
     - If [Value examples] of <column> has 'None' or None, use `JOIN <table>` or `WHERE <column> is NOT NULL` is better
     - If use `ORDER BY <column> ASC|DESC`, add `GROUP BY <column>` before to select distinct values
+    - If [Exception class] is QueryTooExpensiveError, the SQL was rejected or stopped for scanning too many rows, add the missing filters or join conditions
 
 [Requirements]
     1. You must use the given operating conditions [Operating Condtions] and the standard cell variant [Standard Cell Variant] to filter entries related to the operating condition and the standard cell variant the question is referring to. 
@@ -179,9 +181,9 @@ class RefinerSQL(Agent):
                 pvt_corner=pvt_corner,
                 techlef_corner=techlef_corner
             )
-            result = database.run(refined_query)
-        except (sqlalchemy.exc.OperationalError, sqlite3.OperationalError, 
-                sqlite3.Warning, sqlalchemy.exc.ProgrammingError, ValueError) as error:
+            result = self.config.db_config.query_guard.run(database, refined_query)
+        except (sqlalchemy.exc.OperationalError, sqlite3.OperationalError, sqlite3.ProgrammingError,
+                sqlite3.Warning, sqlalchemy.exc.ProgrammingError, ValueError, QueryTooExpensiveError) as error:
             exception_class = error.__class__.__name__
             return {
                 "error": str(error), 
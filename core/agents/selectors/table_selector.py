@@ -20,11 +20,10 @@ from langchain_community.vectorstores import FAISS
 
 
 from config.sky130 import cell_variant_sky130, get_corner_name, View
-from core.agents.few_shot.selector import selector_few_shot
-from core.agents.few_shot.selector_partitioned import selector_few_shot_partition
 from core.agents.utils import parse_json_from_string
 from core.eval.test_set import test_queries, test_queries_lef, test_queries_tlef, test_queries_lib
 from core.database.sql import get_desc, get_fk, get_table_names
+from core.database.name_index import resolve_names, format_resolved_names
 from core.agents.routers.router import  Router
 from core.agents.agent import Agent
 from core.graph_flow.states import PDKQueryState
@@ -502,6 +501,10 @@ class SchemaSelector(Agent):
         if config.flow_config.few_shot: 
             system += "Here are some examples for user input and their corresponding relevant tables:"
 
+            # The demos embed full schema descriptions, only build them when an agent needs them
+            from core.agents.few_shot.selector import selector_few_shot
+            from core.agents.few_shot.selector_partitioned import selector_few_shot_partition
+
             if config.db_config.partition: 
                 example_selector = CustomExampleSelector(selector_few_shot_partition)
             elif custom_selector: 
@@ -534,6 +537,12 @@ class SchemaSelector(Agent):
         
         self.selector = self.prompt | self.llm
 
+    def resolve_names(self, database, question):
+        """Returns the exact names matching the words of `question`, formatted for the generator prompt."""
+        if not self.config.flow_config.resolve_names:
+            return ""
+        return format_resolved_names(resolve_names(database, question))
+
     def select(self, state: PDKQueryState):
 
         if self.config.flow_config.use_selector: 
@@ -572,7 +581,7 @@ class SchemaSelector(Agent):
                 techlef_corner=techlef_corner
             )
 
-            table_info = database.get_table_info(table_names=view_table_names)
+            table_info = self.config.db_config.get_table_info(database, view_table_names)
             
             output_format = get_out_format(view, partition=self.config.db_config.partition) 
 
@@ -637,9 +646,12 @@ class SchemaSelector(Agent):
                 selected_schema=selected_schema,
                 partition=self.config.db_config.partition
             )
-            table_info =  database.get_table_info(table_names=selected_schema)
+            table_info = self.config.db_config.get_table_info(database, selected_schema)
+            resolved_names = self.resolve_names(database, query)
+            # Questions spanning several partitions query them through union views
+            desc_str += self.config.db_config.get_federation_desc(database)
 
-            return {'tables': selected_schema, 'desc_str': desc_str, 'fk_str': fk_str, 'table_info': table_info, 'pvt_corner': pvt_corner}
+            return {'tables': selected_schema, 'desc_str': desc_str, 'fk_str': fk_str, 'table_info': table_info, 'pvt_corner': pvt_corner, 'resolved_names': resolved_names}
         else: 
             view = state.get("view", "")
             scl_library = state.get("scl_library", [])
@@ -666,9 +678,11 @@ class SchemaSelector(Agent):
             tables = get_table_names(source=None, partition=partition)
             desc_str = get_desc(source=None, selected_schema=None,  partition=partition)
             fk_str = get_fk(source=None, partition=partition)
-            table_info = database.get_table_info(table_names=tables)
+            table_info = self.config.db_config.get_table_info(database, tables)
+            resolved_names = self.resolve_names(database, state.get("question"))
+            desc_str += self.config.db_config.get_federation_desc(database)
 
-            return {'tables': tables, 'desc_str': desc_str, 'fk_str': fk_str, 'table_info': table_info} 
+            return {'tables': tables, 'desc_str': desc_str, 'fk_str': fk_str, 'table_info': table_info, 'resolved_names': resolved_names} 
         
 
     def compute_exact_accuracy(self, pred_tables, ground_truth):
@@ -0,0 +1,283 @@
+"""Truth tables and NPN signatures of the Liberty `function` of output pins.
+
+`get_function_signature("(A1&A2) | B1")` parses a Liberty function expression, evaluates
+its truth table over the inputs it depends on and returns `(signature, inputs)`. Functions
+that are the same up to permuting and inverting their inputs and inverting their output
+(NPN equivalence) get the same signature, so an AND-OR, an OR-AND with inverted inputs and
+the AOI cells all share one, whatever their pin names and however the expression is
+written. The builders store it in the indexed Output_Pins.Function_Signature column, and
+`npn_signature(function)` computes it in SQL:
+
+    SELECT Cells.Name FROM Cells JOIN Output_Pins ON Output_Pins.Cell_ID = Cells.Cell_ID
+    WHERE Output_Pins.Function_Signature = npn_signature('(A1&A2) | B1');
+
+    python -m core.database.boolean_functions --function "(A1&A2) | B1" --db dbs/sky130_index.db
+
+Only the `function` attribute is compared. Sequential outputs, whose function reads the
+ff or latch state, and three-state outputs, whose `three_state` enable it does not
+include, get a NULL signature rather than the one of a buffer.
+"""
+
+import re
+import sqlite3
+import argparse
+from functools import lru_cache
+from itertools import permutations
+
+import numpy as np
+
+# Exhaustive NPN canonization tries n! * 2^n input transforms, beyond this many inputs
+# the signature is left NULL and only the input count is stored
+MAX_NPN_INPUTS = 6
+
+# Liberty operators by increasing precedence: | and + (OR), & * and a space (AND), ^ (XOR),
+# ! (prefix NOT) and ' (postfix NOT)
+_TOKEN = re.compile(r"\s*(?:([A-Za-z_][\w\[\]\.]*)|([01])\b|(.))")
+
+
+def tokenize(function):
+    tokens = []
+    for name, constant, operator in _TOKEN.findall(function.strip()):
+        if name:
+            tokens.append(('name', name))
+        elif constant:
+            tokens.append(('const', int(constant)))
+        elif operator.strip():
+            tokens.append(('op', operator))
+    return tokens
+
+
+class FunctionParser:
+    """Recursive descent parser of a Liberty function into nested `(operator, operands...)` tuples."""
+
+    def __init__(self, function):
+        self.function = function
+        self.tokens = tokenize(function)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, *operators):
+        kind, value = self.peek()
+        if kind == 'op' and value in operators:
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self):
+        expression = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Unexpected {self.peek()[1]!r} in function {self.function!r}")
+        return expression
+
+    def parse_or(self):
+        expression = self.parse_and()
+        while self.take('|', '+'):
+            expression = ('or', expression, self.parse_and())
+        return expression
+
+    def parse_and(self):
+        expression = self.parse_xor()
+        while True:
+            kind, value = self.peek()
+            if self.take('&', '*'):
+                expression = ('and', expression, self.parse_xor())
+            # Operands written next to each other are ANDed
+            elif kind in ('name', 'const') or (kind == 'op' and value in ('(', '!')):
+                expression = ('and', expression, self.parse_xor())
+            else:
+                return expression
+
+    def parse_xor(self):
+        expression = self.parse_not()
+        while self.take('^'):
+            expression = ('xor', expression, self.parse_not())
+        return expression
+
+    def parse_not(self):
+        if self.take('!'):
+            return ('not', self.parse_not())
+        expression = self.parse_primary()
+        while self.take("'"):
+            expression = ('not', expression)
+        return expression
+
+    def parse_primary(self):
+        kind, value = self.peek()
+        if kind in ('name', 'const'):
+            self.pos += 1
+            return (kind, value)
+        if self.take('('):
+            expression = self.parse_or()
+            if not self.take(')'):
+                raise ValueError(f"Missing ')' in function {self.function!r}")
+            return expression
+        raise ValueError(f"Unexpected {value!r} in function {self.function!r}")
+
+
+def get_variables(expression, variables=None):
+    """Returns the sorted input names of a parsed function."""
+    variables = set() if variables is None else variables
+    if expression[0] == 'name':
+        variables.add(expression[1])
+    elif expression[0] != 'const':
+        for operand in expression[1:]:
+            get_variables(operand, variables)
+    return sorted(variables)
+
+
+def get_variable_table(index, num_inputs):
+    """Returns the truth table of input `index`: bit `i` is set when bit `index` of assignment `i` is."""
+    table = 0
+    for assignment in range(1 << num_inputs):
+        if assignment >> index & 1:
+            table |= 1 << assignment
+    return table
+
+
+def evaluate(expression, tables, full):
+    """Returns the truth table of a parsed function as an int, `tables` maps input names to theirs."""
+    operator = expression[0]
+    if operator == 'name':
+        return tables.get(expression[1], 0)
+    if operator == 'const':
+        return full if expression[1] else 0
+    if operator == 'not':
+        return evaluate(expression[1], tables, full) ^ full
+    left, right = evaluate(expression[1], tables, full), evaluate(expression[2], tables, full)
+    if operator == 'and':
+        return left & right
+    if operator == 'or':
+        return left | right
+    return left ^ right
+
+
+def get_truth_table(function):
+    """Returns `(truth table, inputs)` of a Liberty function over the inputs it depends on.
+
+    Bit `i` of the truth table is the output for the assignment whose bit `k` is the value
+    of the `k`-th input, inputs in name order. Inputs that appear in the expression but do
+    not change its value (`A | !A`) are dropped.
+    """
+    expression = FunctionParser(function).parse()
+    variables = get_variables(expression)
+    num_inputs = len(variables)
+    full = (1 << (1 << num_inputs)) - 1
+    table = evaluate(expression, {name: get_variable_table(k, num_inputs) for k, name in enumerate(variables)}, full)
+
+    support = []
+    for k, name in enumerate(variables):
+        mask = get_variable_table(k, num_inputs)
+        if (table & mask) >> (1 << k) != table & ~mask & full:
+            support.append(name)
+    if len(support) < num_inputs:
+        full = (1 << (1 << len(support))) - 1
+        table = evaluate(expression, {name: get_variable_table(k, len(support)) for k, name in enumerate(support)}, full)
+    return table, support
+
+
+@lru_cache(maxsize=None)
+def get_npn_transforms(num_inputs):
+    """Returns the `(n! * 2^n, 2^n)` array of the assignments each NPN input transform reads.
+
+    Row `t` lists, for every assignment of the transformed function, the assignment of the
+    original one it takes its value from.
+    """
+    size = 1 << num_inputs
+    bits = (np.arange(size)[:, None] >> np.arange(num_inputs)) & 1
+    # The input inversion masks range over the same n-bit values as the assignments
+    negations = bits
+    weights = np.array([[1 << k for k in permutation] for permutation in permutations(range(num_inputs))], dtype=np.int64)
+    # (negation, assignment, input) @ (input, permutation) -> (negation, assignment, permutation)
+    sources = (bits[None, :, :] ^ negations[:, None, :]) @ weights.T
+    return np.ascontiguousarray(sources.transpose(0, 2, 1).reshape(-1, size))
+
+
+@lru_cache(maxsize=None)
+def get_npn_canonical(table, num_inputs):
+    """Returns the smallest truth table over every input permutation, input inversion and output inversion."""
+    if num_inputs == 0:
+        return 0
+    size = 1 << num_inputs
+    values = np.array([table >> assignment & 1 for assignment in range(size)], dtype=np.uint64)
+    transformed = values[get_npn_transforms(num_inputs)]
+    tables = (transformed << np.arange(size, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+    full = np.uint64((1 << size) - 1)
+    return int(min(tables.min(), (tables ^ full).min()))
+
+
+def format_signature(table, num_inputs):
+    return f"{num_inputs}:{table:0{max(1, (1 << num_inputs) // 4)}x}"
+
+
+@lru_cache(maxsize=4096)
+def get_function_signature(function, input_pins=None):
+    """Returns `(NPN signature, number of inputs)` of a Liberty function, `(None, None)` if it has none.
+
+    The signature is `"{inputs}:{truth table in hex}"` of the canonical NPN representative,
+    e.g. "2:1" for every 2-input AND, OR, NAND and NOR. Functions on more than
+    `MAX_NPN_INPUTS` inputs or that cannot be parsed get no signature. With `input_pins`,
+    the input pin names of the cell, a function that reads anything else gets no signature
+    either: that is the state of an ff or latch group (the `IQ` of a flip-flop output), which
+    is not a combinational function of the pins and must not match a buffer.
+    """
+    if function is None:
+        return None, None
+    try:
+        if input_pins is not None and not {value for kind, value in tokenize(str(function)) if kind == 'name'} <= set(input_pins):
+            return None, None
+        table, inputs = get_truth_table(str(function))
+    except (ValueError, RecursionError):
+        return None, None
+    if len(inputs) > MAX_NPN_INPUTS:
+        return None, len(inputs)
+    return format_signature(get_npn_canonical(table, len(inputs)), len(inputs)), len(inputs)
+
+
+def npn_signature(function):
+    """The `npn_signature(function)` SQL function, the Function_Signature of a Liberty function expression."""
+    return get_function_signature(function)[0]
+
+
+def find_equivalent_cells(conn, function, limit=None):
+    """Returns the `(cell, output pin, function)` rows whose function is NPN-equivalent to `function`."""
+    signature = npn_signature(function)
+    if signature is None:
+        return []
+    query = """
+        SELECT DISTINCT Cells.Name, Output_Pins.Output_Pin_Name, Output_Pins.Function
+        FROM Output_Pins JOIN Cells ON Cells.Cell_ID = Output_Pins.Cell_ID
+        WHERE Output_Pins.Function_Signature = ? ORDER BY Cells.Name"""
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return conn.execute(query, (signature,)).fetchall()
+
+
+__all__ = [
+    'MAX_NPN_INPUTS',
+    'get_truth_table',
+    'get_function_signature',
+    'npn_signature',
+    'find_equivalent_cells'
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the NPN signature of a Liberty function and the cells implementing it.')
+    parser.add_argument('--function', type=str, help='Liberty function expression, e.g. "(A1&A2) | B1"', required=True)
+    parser.add_argument('--db', type=str, help='PDK database to search for NPN-equivalent output pins', default=None)
+    parser.add_argument('--limit', type=int, help='Maximum number of cells to print', default=50)
+    args = parser.parse_args()
+
+    signature, inputs = get_function_signature(args.function)
+    print(f"{args.function}: {inputs} inputs, signature {signature}")
+    if args.db:
+        conn = sqlite3.connect(args.db)
+        for name, pin, function in find_equivalent_cells(conn, args.function, limit=args.limit):
+            print(f"  {name}.{pin} = {function}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
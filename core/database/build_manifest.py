@@ -0,0 +1,144 @@
+"""Manifest of the inputs of a PDK database build, used for incremental rebuilds.
+
+The manifest is a JSON file next to the built database. For every LEF, TechLEF and
+Liberty input it records the content hash, the stage and task key, and what the input
+produced: the partition file and its content address, or the id range of its rows in
+each table of the single database (the builders assign ids one file at a time, so every input owns a contiguous
+range per table). The build options and a hash of the parser and row builder sources are
+stored too, and a manifest written with other ones is ignored, which forces a full build.
+"""
+
+import os
+import json
+import hashlib
+
+MANIFEST_VERSION = 1
+
+# Sources that decide the rows of a build, relative to the repository root
+BUILDER_SOURCES = [
+    'core/parsers/lef',
+    'core/parsers/lib',
+    'core/database/sql_lef.py',
+    'core/database/sql_tlef.py',
+    'core/database/sql_lib.py',
+    'core/database/sql_functions.py',
+    'core/database/boolean_functions.py',
+    'core/database/name_index.py',
+]
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_file_hash(path, chunk_size=1 << 20):
+    """Returns the SHA-256 of a file, read in chunks so large Liberty files are never held in memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_builder_version():
+    """Returns a short hash of the parser and row builder sources in `BUILDER_SOURCES`."""
+    digest = hashlib.sha256()
+    for source in BUILDER_SOURCES:
+        path = os.path.join(ROOT_DIR, source)
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.py'))
+        else:
+            files = [path]
+        for file in files:
+            digest.update(os.path.relpath(file, ROOT_DIR).encode())
+            with open(file, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def get_content_key(stage, input_hashes):
+    """Returns the content address of a partition of `stage` built from inputs with these hashes, in build order."""
+    digest = hashlib.sha256(stage.encode())
+    for input_hash in input_hashes:
+        digest.update(input_hash.encode())
+    return digest.hexdigest()
+
+
+def get_row_ranges(first_ids, next_ids):
+    """Returns `{table: [first id, next id]}` of the rows written between two `get_next_ids` calls."""
+    return {table: [first_ids[table], next_ids[table]] for table in next_ids if next_ids[table] > first_ids[table]}
+
+
+def delete_row_ranges(conn, table_columns, ranges):
+    """Deletes the rows of `get_row_ranges`, the first column of each table in `table_columns` is its id."""
+    cursor = conn.cursor()
+    for table, (first_id, next_id) in ranges.items():
+        if table in table_columns:
+            id_column = table_columns[table][0]
+            cursor.execute(f"DELETE FROM {table} WHERE {id_column} >= ? AND {id_column} < ?", (first_id, next_id))
+
+
+class BuildManifest:
+    """Input hashes and outputs of a build, keyed by input path.
+
+    Hashes are only recomputed for files whose size or modification time changed since
+    they were recorded, so checking a whole PDK for changes costs a `stat` per file.
+    """
+
+    def __init__(self, path, options):
+        self.path = path
+        self.options = options
+        self.inputs = {}
+        self.hashes = {}
+
+    @classmethod
+    def load(cls, path, options):
+        """Returns the manifest at `path`, or an empty one if it is missing or was written with other options."""
+        manifest = cls(path, options)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION and data.get('options') == options:
+                manifest.inputs = data['inputs']
+        return manifest
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'options': self.options, 'inputs': self.inputs}, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def get_hash(self, path):
+        if path not in self.hashes:
+            stat = os.stat(path)
+            entry = self.inputs.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                self.hashes[path] = entry['hash']
+            else:
+                self.hashes[path] = get_file_hash(path)
+        return self.hashes[path]
+
+    def get_changes(self, tasks):
+        """Returns `(changed, removed)`: the tasks whose input is new or changed, and the recorded inputs no task builds anymore."""
+        changed = []
+        for task in tasks:
+            entry = self.inputs.get(task['path'])
+            if entry is None or entry['hash'] != self.get_hash(task['path']) or entry['key'] != task['key']:
+                changed.append(task)
+            else:
+                # Same content, a touched file is not hashed again next time
+                stat = os.stat(task['path'])
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        paths = {task['path'] for task in tasks}
+        removed = [path for path in self.inputs if path not in paths]
+        return changed, removed
+
+    def record(self, task, **outputs):
+        """Records the input of `task` with its outputs, e.g. `rows=` or `partition=`."""
+        stat = os.stat(task['path'])
+        self.inputs[task['path']] = {
+            'hash': self.get_hash(task['path']),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'stage': task['stage'],
+            'key': task['key'],
+            **outputs
+        }
@@ -0,0 +1,247 @@
+"""Parquet export of the PDK tables and a DuckDB query backend over the export.
+
+`export_parquet` writes every table of a single database built by `sql.py` to
+`{parquet_dir}/{table}/pdk_variant=.../pdk_corner=.../*.parquet`, partitioned by cell
+library and, for the Liberty and TechLEF tables, by corner. Tables without those columns
+get them from the parent rows they reference. `get_duckdb_sql_database` serves the export
+as a `SQLDatabase` with one view per table, named and shaped like the SQLite tables, so
+the generated SQL runs on either backend. Both need the optional `duckdb` package, the
+backend also `duckdb_engine` (the SQLAlchemy dialect).
+
+    python -m core.database.columnar --db dbs/sky130_index.db --parquet_dir dbs/sky130_parquet --export --benchmark
+
+Only tables are exported, so a database built with `--timing_storage blob` has no
+Timing_Values on DuckDB, and the SQL functions of `sql_functions` are not available there.
+The R*Tree and name index tables are SQLite features and are left out.
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import argparse
+from statistics import median
+
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+from core.database.db_utils import THREAD_POOL_SIZE, quote_literal, load_memdb
+from core.database.sql_functions import register_sql_functions
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Hive partition columns of the export, hidden by the DuckDB views
+PARTITION_COLUMNS = ('pdk_variant', 'pdk_corner')
+
+# Tables holding the cell library and corner of their rows, as (library column, corner column)
+PARQUET_ROOTS = {
+    'Operating_Conditions': ('Cell_Library', 'Name'),
+    'Macros': ('Cell_Library', None),
+    'Routing_Layers': ('Cell_Library', 'Corner'),
+    'Cut_Layers': ('Cell_Library', 'Corner'),
+    'Vias': ('Cell_Library', 'Corner'),
+}
+
+# Every other exported table with the (parent table, column, parent column) join leading towards its root
+PARQUET_PARENTS = {
+    'Cells': ('Operating_Conditions', 'Condition_ID', 'Condition_ID'),
+    'Input_Pins': ('Cells', 'Cell_ID', 'Cell_ID'),
+    'Output_Pins': ('Cells', 'Cell_ID', 'Cell_ID'),
+    'Input_Pin_Internal_Powers': ('Input_Pins', 'Input_Pin_ID', 'Input_Pin_ID'),
+    'Timing_Values': ('Cells', 'Cell_ID', 'Cell_ID'),
+    'Timing_Arcs': ('Cells', 'Cell_ID', 'Cell_ID'),
+    'Timing_Arc_Summaries': ('Cells', 'Cell_ID', 'Cell_ID'),
+    'Cell_Timing_Summaries': ('Cells', 'Cell_ID', 'Cell_ID'),
+    'Pins': ('Macros', 'Macro_ID', 'Macro_ID'),
+    'Pin_Ports': ('Pins', 'Pin_ID', 'Pin_ID'),
+    'Pin_Port_Rectangles': ('Pin_Ports', 'Port_ID', 'Port_ID'),
+    'Obstructions': ('Macros', 'Macro_ID', 'Macro_ID'),
+    'Obstruction_Rectangles': ('Obstructions', 'Obstruction_ID', 'Obstruction_ID'),
+    'Pin_Geometries': ('Macros', 'Macro_ID', 'Macro_ID'),
+    'Macro_Obstruction_Areas': ('Macros', 'Macro_ID', 'Macro_ID'),
+    'Macro_Pin_Counts': ('Macros', 'Macro_ID', 'Macro_ID'),
+    'Antenna_Diff_Side_Area_Ratios': ('Routing_Layers', 'Routing_Layer_ID', 'Layer_ID'),
+    'Antenna_Diff_Area_Ratios': ('Cut_Layers', 'Cut_Layer_ID', 'Layer_ID'),
+    'Via_Layers': ('Vias', 'Via_ID', 'Via_ID'),
+}
+
+
+def require_duckdb():
+    if duckdb is None:
+        raise ImportError("The Parquet export and the DuckDB backend need the duckdb package (pip install duckdb duckdb_engine)")
+
+
+def get_export_query(table):
+    """Returns the DuckDB query selecting the rows of `table` with their partition columns, and those columns."""
+    joins = []
+    depth = 0
+    current = table
+    while current in PARQUET_PARENTS:
+        parent, column, parent_column = PARQUET_PARENTS[current]
+        depth += 1
+        joins.append(f"JOIN pdk.{parent} t{depth} ON t{depth}.{parent_column} = t{depth - 1}.{column}")
+        current = parent
+
+    library_column, corner_column = PARQUET_ROOTS[current]
+    partition = {'pdk_variant': library_column, 'pdk_corner': corner_column}
+    partition = {name: column for name, column in partition.items() if column is not None}
+    select = ', '.join(f"t{depth}.{column} AS {name}" for name, column in partition.items())
+    return f"SELECT t0.*, {select} FROM pdk.{table} t0 {' '.join(joins)}", list(partition)
+
+
+def export_parquet(db_file, parquet_dir, compression="zstd"):
+    """Writes the tables of a single PDK database to one hive-partitioned Parquet dataset per table.
+
+    Reads the database through the DuckDB sqlite extension, installed on first use.
+    Returns `{table: rows}` of the exported tables.
+    """
+    require_duckdb()
+    with sqlite3.connect(db_file) as conn:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for root in PARQUET_ROOTS:
+            if root in tables and 'Cell_Library' not in [row[1] for row in conn.execute(f"PRAGMA table_info({root})")]:
+                raise ValueError(f"{db_file} is a partition, export the single database, which keeps the Cell_Library columns")
+    conn.close()
+
+    duck = duckdb.connect()
+    duck.execute("INSTALL sqlite;")
+    duck.execute("LOAD sqlite;")
+    duck.execute(f"ATTACH {quote_literal(os.path.abspath(db_file))} AS pdk (TYPE SQLITE, READ_ONLY);")
+
+    exported = {}
+    for table in list(PARQUET_ROOTS) + list(PARQUET_PARENTS):
+        if table not in tables:
+            continue
+        query, partition_by = get_export_query(table)
+        table_dir = os.path.join(parquet_dir, table)
+        # Partitions of a previous export would otherwise be kept next to the new files
+        shutil.rmtree(table_dir, ignore_errors=True)
+        os.makedirs(table_dir)
+        duck.execute(f"""
+            COPY ({query}) TO {quote_literal(table_dir)}
+            (FORMAT PARQUET, PARTITION_BY ({', '.join(partition_by)}), COMPRESSION {compression})
+        """)
+        duck.execute(f"SELECT COUNT(*) FROM pdk.{table}")
+        exported[table] = duck.fetchone()[0]
+        print(f"{table}: {exported[table]} rows written to {table_dir}")
+    duck.close()
+    return exported
+
+
+def create_parquet_views(conn, parquet_dir):
+    """Creates one view per exported table on a DuckDB connection, without the partition columns."""
+    for table in sorted(os.listdir(parquet_dir)):
+        table_dir = os.path.join(parquet_dir, table)
+        if not os.path.isdir(table_dir):
+            continue
+        source = f"read_parquet({quote_literal(os.path.join(table_dir, '**', '*.parquet'))}, hive_partitioning = true)"
+        conn.execute(f"DESCRIBE SELECT * FROM {source}")
+        hidden = [row[0] for row in conn.fetchall() if row[0] in PARTITION_COLUMNS]
+        conn.execute(f"CREATE OR REPLACE VIEW {table} AS SELECT * EXCLUDE ({', '.join(hidden)}) FROM {source}")
+    return conn
+
+
+def connect_duckdb(parquet_dir, threads=None):
+    """Opens an in-memory DuckDB connection with the views of the Parquet export."""
+    require_duckdb()
+    conn = duckdb.connect(config={'threads': threads} if threads else {})
+    return create_parquet_views(conn, parquet_dir)
+
+
+def get_duckdb_sql_database(parquet_dir, pool_size=THREAD_POOL_SIZE, **kwargs):
+    """Returns a `SQLDatabase` over the Parquet export, each pooled connection is an in-memory DuckDB with its views."""
+    require_duckdb()
+    engine = create_engine("duckdb:///:memory:", poolclass=QueuePool, pool_size=pool_size, max_overflow=-1)
+    event.listen(engine, "connect", lambda dbapi_connection, connection_record: create_parquet_views(dbapi_connection, parquet_dir))
+    return SQLDatabase(engine, **kwargs)
+
+
+def normalize_rows(rows, digits=6):
+    """Returns the rows as a sorted list with rounded floats, so both backends' results compare equal."""
+    def normalize(value):
+        return round(value, digits) if isinstance(value, float) else value
+    return sorted((tuple(normalize(value) for value in row) for row in rows), key=repr)
+
+
+def benchmark_backends(db_file, parquet_dir, repeats=5):
+    """Runs the ground-truth SQL of the test set on the in-memory SQLite image and on DuckDB over the export.
+
+    Prints the median latency of each query on both backends and whether the results
+    match. Returns `{query: (sqlite seconds, duckdb seconds or None, results match)}`.
+    """
+    from core.database.sql import get_runnable_test_queries
+
+    queries = get_runnable_test_queries(db_file)
+    sqlite_conn = register_sql_functions(load_memdb(db_file, "benchmark_backends"))
+    duck = connect_duckdb(parquet_dir)
+
+    def time_query(execute, query):
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            rows = execute(query)
+            latencies.append(time.perf_counter() - start)
+        return median(latencies), rows
+
+    def run_duckdb(query):
+        duck.execute(query)
+        return duck.fetchall()
+
+    results = {}
+    for query in queries:
+        sqlite_latency, sqlite_rows = time_query(lambda q: sqlite_conn.execute(q).fetchall(), query)
+        try:
+            duckdb_latency, duckdb_rows = time_query(run_duckdb, query)
+            match = normalize_rows(sqlite_rows) == normalize_rows(duckdb_rows)
+        except duckdb.Error as e:
+            duckdb_latency, match = None, False
+            print(f"DuckDB error: {str(e).splitlines()[0]}")
+        results[query] = (sqlite_latency, duckdb_latency, match)
+        duckdb_ms = f"{duckdb_latency * 1e3:9.3f}" if duckdb_latency is not None else f"{'error':>9}"
+        print(f"{sqlite_latency * 1e3:9.3f} {duckdb_ms} ms  {'ok      ' if match else 'MISMATCH'}  {' '.join(query.split())[:90]}")
+
+    both = [(sqlite_latency, duckdb_latency) for sqlite_latency, duckdb_latency, _ in results.values() if duckdb_latency is not None]
+    print(f"\n{len(both)} of {len(queries)} queries run on DuckDB, {sum(match for *_, match in results.values())} with the same result")
+    if both:
+        print(f"SQLite total {sum(s for s, _ in both) * 1e3:.1f} ms, median {median(s for s, _ in both) * 1e3:.3f} ms per query")
+        print(f"DuckDB total {sum(d for _, d in both) * 1e3:.1f} ms, median {median(d for _, d in both) * 1e3:.3f} ms per query")
+        faster = sum(d < s for s, d in both)
+        print(f"DuckDB is faster on {faster} of {len(both)} queries")
+
+    sqlite_conn.close()
+    duck.close()
+    return results
+
+
+__all__ = [
+    'PARQUET_ROOTS',
+    'PARQUET_PARENTS',
+    'export_parquet',
+    'create_parquet_views',
+    'connect_duckdb',
+    'get_duckdb_sql_database',
+    'benchmark_backends'
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a single PDK database to Parquet and compare SQLite with DuckDB on the test set.')
+    parser.add_argument('--db', type=str, help='Path to a built single PDK database', required=True)
+    parser.add_argument('--parquet_dir', type=str, help='Directory of the Parquet export', required=True)
+    parser.add_argument('--export', help='(Re)write the Parquet export of the database first.', action='store_true', default=False)
+    parser.add_argument('--benchmark', help='Compare the ground-truth SQL latency of both backends.', action='store_true', default=False)
+    parser.add_argument('--repeats', type=int, help='Runs per query and backend for the latency', default=5)
+    args = parser.parse_args()
+
+    if args.export:
+        export_parquet(args.db, args.parquet_dir)
+    if args.benchmark:
+        benchmark_backends(args.db, args.parquet_dir, repeats=args.repeats)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,458 @@
 import os 
+import re
 import csv
+import time
+import shutil
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.utilities import SQLDatabase
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+from core.database.sql_functions import register_sql_functions
+
+
+def create_sql_engine(uri, **kwargs):
+    """Returns a SQLAlchemy engine whose connections all have the PDK SQL functions registered."""
+    engine = create_engine(uri, **kwargs)
+    event.listen(engine, "connect", lambda dbapi_connection, connection_record: register_sql_functions(dbapi_connection))
+    return engine
+
+
+def get_sql_database(uri, **kwargs):
+    """Returns a `SQLDatabase` whose connections all have the PDK SQL functions registered."""
+    return SQLDatabase(create_sql_engine(uri), **kwargs)
+
+
+READ_ONLY_PRAGMAS = [
+    "PRAGMA query_only = ON;",
+    "PRAGMA mmap_size = 268435456;",
+]
+
+
+def connect_read_only(db_file, immutable=False, mmap_size=None):
+    """Opens a database file read-only with memory-mapped I/O.
+
+    `immutable=True` also tells SQLite that nothing, in this process or any other, writes
+    the file, so it skips file locking and change detection. Every process then maps the
+    same page-cache pages instead of holding its own copy.
+    """
+    uri = f"file:{os.path.abspath(db_file)}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    for pragma in READ_ONLY_PRAGMAS:
+        conn.execute(pragma)
+    if mmap_size is not None:
+        conn.execute(f"PRAGMA mmap_size = {int(mmap_size)};")
+    return conn
+
+
+# Idle connections kept per database, busier threads open (and later close) extra ones
+THREAD_POOL_SIZE = 16
+
+
+def memdb_uri(name):
+    return f"file:/{name}?vfs=memdb"
+
+
+def load_memdb(db_file, name):
+    """Copies a database file into the process-wide in-memory image `name`.
+
+    Returns the connection that keeps the image alive. Unlike shared-cache memory
+    databases, the connections to a memdb image take ordinary database locks, so
+    readers on different connections never block each other.
+    """
+    memory_connection = sqlite3.connect(memdb_uri(name), uri=True, check_same_thread=False)
+    disk_connection = connect_read_only(db_file)
+    disk_connection.backup(memory_connection)
+    disk_connection.close()
+    return memory_connection
+
+
+def connect_memdb(name):
+    """Opens a read-only connection to the in-memory image `name`."""
+    conn = sqlite3.connect(memdb_uri(name), uri=True, check_same_thread=False)
+    conn.execute("PRAGMA query_only = ON;")
+    return conn
+
+
+def create_pooled_engine(connect, pool_size=THREAD_POOL_SIZE):
+    """Returns an engine that hands every concurrent query its own connection from `connect()`.
+
+    `SingletonThreadPool`, SQLAlchemy's default for memory databases, closes the
+    connections of other threads once more than `pool_size` threads use it, which can
+    close a connection in the middle of a query.
+    """
+    return create_sql_engine("sqlite://", creator=connect, poolclass=QueuePool, pool_size=pool_size, max_overflow=-1)
+
+
+def get_pooled_sql_database(connect, pool_size=THREAD_POOL_SIZE, **kwargs):
+    """Returns a `SQLDatabase` whose concurrent queries each run on their own `connect()` connection."""
+    return SQLDatabase(create_pooled_engine(connect, pool_size=pool_size), **kwargs)
+
+
+def get_mmap_sql_database(db_file, mmap_size=None, **kwargs):
+    """Returns a `SQLDatabase` over an immutable, memory-mapped, read-only database file.
+
+    `mmap_size` defaults to the file size, so the whole image is mapped.
+    """
+    mmap_size = mmap_size if mmap_size is not None else os.path.getsize(db_file)
+    return get_pooled_sql_database(lambda: connect_read_only(db_file, immutable=True, mmap_size=mmap_size), **kwargs)
+
+
+def stage_database_file(db_file, stage_dir):
+    """Copies a database file into `stage_dir` (e.g. a tmpfs such as /dev/shm) once and returns the copy.
+
+    The copy is named after the file's inode, size and modification time, so a rebuilt
+    database is staged again while concurrent processes reuse the copy of the current
+    one, and partitions hard-linked to one file are staged once.
+    """
+    stat = os.stat(db_file)
+    staged_file = os.path.join(stage_dir, f"pdk_{stat.st_dev}_{stat.st_ino}.{stat.st_size}.{stat.st_mtime_ns}.db")
+    if not os.path.exists(staged_file):
+        os.makedirs(stage_dir, exist_ok=True)
+        tmp_file = f"{staged_file}.{os.getpid()}.tmp"
+        shutil.copyfile(db_file, tmp_file)
+        os.replace(tmp_file, staged_file)
+    return staged_file
+
+
+class PartitionCache:
+    """Opens partitioned PDK databases on first use and keeps the hottest ones in memory.
+
+    `db_files` maps each partition key to its database file. A requested partition is
+    copied into an in-memory image (see `load_memdb`); once more than `max_partitions`
+    partitions or `max_bytes` bytes of database files are in memory, the least recently
+    used copies are dropped and their partitions fall back to read-only, memory-mapped
+    access to the file until they are requested again. Partitions whose files are hard
+    links of one file (identical partitions, see `sql.py`) share one image, and
+    `max_partitions` counts images. Each partition has a single
+    `SQLDatabase` whose connections follow the partition between memory and disk, so
+    handles returned earlier stay valid. `on_open(key, database)` is called once per
+    partition when its `SQLDatabase` is created. With `max_partitions=0` and
+    `immutable=True` every partition is served from its shared, memory-mapped file.
+    Concurrent questions share the cache, its state is only changed under `lock`.
+    """
+
+    def __init__(self, db_files, max_partitions=None, max_bytes=None, on_open=None, immutable=False, **kwargs):
+        self.db_files = db_files
+        self.max_partitions = max_partitions
+        self.max_bytes = max_bytes
+        self.on_open = on_open
+        self.immutable = immutable
+        self.kwargs = kwargs
+        # key -> (SQLDatabase, engine)
+        self.databases = {}
+        # key -> name of the in-memory image of its file
+        self.images = {}
+        # image -> (memory connection, size in bytes), least recently used first
+        self.memory = OrderedDict()
+        # Reentrant, opening a partition runs `on_open` queries that connect on the same thread
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.db_files
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def keys(self):
+        return self.db_files.keys()
+
+    def get(self, key):
+        if key not in self.db_files:
+            raise KeyError(f"Unknown partition {key}")
+
+        with self.lock:
+            if key not in self.databases:
+                engine = create_pooled_engine(lambda: self.connect(key))
+                self.databases[key] = (SQLDatabase(engine, **self.kwargs), engine)
+                if self.on_open:
+                    self.on_open(key, self.databases[key][0])
+
+            image = self.get_image(key)
+            if image in self.memory:
+                self.hits += 1
+                self.memory.move_to_end(image)
+            elif self.max_partitions != 0:
+                self.misses += 1
+                self.load(key)
+                self.evict()
+
+            return self.databases[key][0]
+
+    def get_image(self, key):
+        """Returns the name of the in-memory image of a partition, the same for every key linked to its file."""
+        if key not in self.images:
+            stat = os.stat(self.db_files[key])
+            self.images[key] = f"pdk_{stat.st_dev}_{stat.st_ino}_memdb"
+        return self.images[key]
+
+    def dispose(self, image):
+        """Drops the pooled connections of every opened partition served by `image`."""
+        for key, (_, engine) in self.databases.items():
+            if self.images.get(key) == image:
+                engine.dispose()
+
+    def connect(self, key):
+        with self.lock:
+            image = self.get_image(key)
+            if image in self.memory:
+                return connect_memdb(image)
+        return connect_read_only(self.db_files[key], immutable=self.immutable)
+
+    def load(self, key):
+        db_file = self.db_files[key]
+        image = self.get_image(key)
+        memory_connection = load_memdb(db_file, image)
+        self.memory[image] = (memory_connection, os.path.getsize(db_file))
+        # Drop the pooled disk connections so the next queries go to the memory copy
+        self.dispose(image)
+
+    def memory_bytes(self):
+        return sum(size for _, size in self.memory.values())
+
+    def evict(self):
+        while self.memory and (
+            (self.max_partitions is not None and len(self.memory) > self.max_partitions) or
+            (self.max_bytes is not None and self.memory_bytes() > self.max_bytes)
+        ):
+            image, (memory_connection, _) = self.memory.popitem(last=False)
+            # Close the pooled memory connections first, the copy is freed with its last connection
+            self.dispose(image)
+            memory_connection.close()
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'opened': len(self.databases),
+                'in_memory': len(self.memory),
+                'memory_bytes': self.memory_bytes(),
+            }
+
+    def close(self):
+        with self.lock:
+            for image, (memory_connection, _) in self.memory.items():
+                self.dispose(image)
+                memory_connection.close()
+            self.memory = OrderedDict()
+            for _, engine in self.databases.values():
+                engine.dispose()
+
+
+# SQLite's default SQLITE_MAX_ATTACHED, used when the attach limit cannot be queried
+DEFAULT_MAX_ATTACHED = 10
+
+
+def quote_literal(value):
+    return "NULL" if value is None else "'" + str(value).replace("'", "''") + "'"
+
+
+class FederatedDatabase:
+    """Attaches partitioned PDK databases to one connection so a single statement can span corners and variants.
+
+    `partitions` maps each partition key to `(db_file, labels)`, where `labels` are the
+    columns that tell its rows apart once merged, e.g. {'Cell_Library': 'sky130_fd_sc_hd',
+    'Corner': 'tt_025C_1v80'}. `attach(keys)` returns a `SQLDatabase` over exactly those
+    partitions: each of its pooled connections attaches them with their key as schema name,
+    and each of their tables and views is also a TEMP view of the same name, the UNION ALL
+    of it over the partitions with the label columns in front. The databases are cached per
+    key set, at most `max_databases` of them, least recently used dropped first. A question
+    therefore only sees the partitions it asked for, and questions on other key sets, on
+    this thread or another, never change its views. At most `max_attached` partitions
+    (SQLite's attach limit by default) can be requested at once.
+    """
+
+    def __init__(self, partitions, max_attached=None, max_databases=8, immutable=False, pool_size=THREAD_POOL_SIZE, **kwargs):
+        self.partitions = partitions
+        self.immutable = immutable
+        probe = sqlite3.connect(":memory:")
+        limit = probe.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(probe, "getlimit") else DEFAULT_MAX_ATTACHED
+        probe.close()
+        self.max_attached = min(max_attached, limit) if max_attached else limit
+        self.max_databases = max_databases
+        self.pool_size = pool_size
+        self.kwargs = kwargs
+        # key set -> (SQLDatabase, engine), least recently used first
+        self.databases = OrderedDict()
+        # SQLDatabase -> key set, evicted handles stay federated while a question still uses them
+        self.database_keys = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.partitions
+
+    def connect(self, keys):
+        # URI filenames let ATTACH open the partitions read-only
+        conn = sqlite3.connect("file::memory:", uri=True, check_same_thread=False)
+        for key in keys:
+            db_file, _ = self.partitions[key]
+            uri = f"file:{os.path.abspath(db_file)}?mode=ro" + ("&immutable=1" if self.immutable else "")
+            conn.execute(f'ATTACH DATABASE ? AS "{key}"', (uri,))
+        # Partition views such as the blob Timing_Values call nldm_value, reflecting them needs it before the engine's connect event
+        register_sql_functions(conn)
+        self.create_views(conn, keys)
+        return conn
+
+    def attach(self, keys):
+        """Returns the federated `SQLDatabase` of the partitions `keys`."""
+        keys = tuple(dict.fromkeys(keys))
+        if len(keys) > self.max_attached:
+            raise ValueError(f"{len(keys)} partitions requested, at most {self.max_attached} can be attached")
+        for key in keys:
+            if key not in self.partitions:
+                raise KeyError(f"Unknown partition {key}")
+
+        with self.lock:
+            if keys in self.databases:
+                self.hits += 1
+                self.databases.move_to_end(keys)
+                return self.databases[keys][0]
+
+            self.misses += 1
+            engine = create_pooled_engine(lambda: self.connect(keys), pool_size=self.pool_size)
+            self.databases[keys] = (SQLDatabase(engine, **self.kwargs), engine)
+            self.database_keys[self.databases[keys][0]] = keys
+            while len(self.databases) > self.max_databases:
+                # Queries still running keep their connection, a later use of the handle reconnects
+                _, (_, evicted_engine) = self.databases.popitem(last=False)
+                evicted_engine.dispose()
+                self.evictions += 1
+            return self.databases[keys][0]
+
+    def get_keys(self, database):
+        """Returns the partition keys of a database returned by `attach`, or None for any other database."""
+        with self.lock:
+            try:
+                return self.database_keys.get(database)
+            except TypeError:
+                # Not weak-referenceable, so not one of ours
+                return None
+
+    def create_views(self, conn, keys):
+        tables = OrderedDict()
+        for key in keys:
+            for _, name, table_type, *_ in conn.execute(f'PRAGMA "{key}".table_list'):
+                # Virtual tables and their shadow tables are left out, their indexes would not survive the union.
+                # Views are stacked too, e.g. Timing_Values of blob timing storage, or the first partition's would answer alone
+                if table_type in ("table", "view") and not name.startswith("sqlite_"):
+                    columns = [row[1] for row in conn.execute(f'PRAGMA "{key}".table_info("{name}")')]
+                    tables.setdefault(name, []).append((key, columns))
+
+        for name, sources in tables.items():
+            labels = list(OrderedDict.fromkeys(label for key, _ in sources for label in self.partitions[key][1]))
+            columns = [column for column in sources[0][1] if column not in labels and all(column in source_columns for _, source_columns in sources)]
+            selects = []
+            for key, _ in sources:
+                partition_labels = self.partitions[key][1]
+                label_columns = [f"{quote_literal(partition_labels.get(label))} AS {label}" for label in labels]
+                selects.append(f"SELECT {', '.join(label_columns + columns)} FROM \"{key}\".\"{name}\"")
+            conn.execute(f'CREATE TEMP VIEW "{name}" AS ' + " UNION ALL ".join(selects))
+
+    def describe(self, database):
+        """Describes the partitions of a federated database and its union views for the generator prompt."""
+        keys = self.get_keys(database)
+        if not keys:
+            return ""
+        labels = list(OrderedDict.fromkeys(label for key in keys for label in self.partitions[key][1]))
+        lines = [
+            "\n# Federated partitions",
+            "Several partitions are attached, each under its own schema name. Every table is also a view of the same name that stacks",
+            f"the table of all attached partitions with {', '.join(labels)} columns in front telling them apart:",
+        ]
+        for key in keys:
+            lines.append(f"- {key}: " + ", ".join(f"{label} = {quote_literal(value)}" for label, value in self.partitions[key][1].items()))
+        lines += [
+            f"Compare partitions by filtering or grouping the views on {', '.join(labels)}. Ids repeat across partitions, so when joining",
+            f"views also join on {', '.join(labels)}. Joins over large tables are much faster within one schema, e.g.",
+            f"`SELECT ... FROM {keys[0]}.<table> JOIN {keys[0]}.<other table> ON ...`, with one such SELECT per partition combined by UNION ALL.",
+            f"nldm_lookup takes the schema name of the cell's partition as 7th argument, e.g. nldm_lookup(Cell_ID, 'X', 'A', 'rise_delay', 0.05, 0.01, '{keys[0]}').",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'databases': len(self.databases),
+            'max_attached': self.max_attached,
+        }
+
+    def close(self):
+        with self.lock:
+            for _, engine in self.databases.values():
+                engine.dispose()
+            self.databases = OrderedDict()
+
+
+def get_file_fingerprint(db_file):
+    """Returns `(path, size, mtime)` of a database file, which changes whenever the file is rewritten.
+
+    For a directory, e.g. the Parquet export of the DuckDB backend, the size is the total
+    size and number of the files under it and the mtime the newest of theirs, since
+    rewriting a file does not touch the mtime of its directory.
+    """
+    if not os.path.isdir(db_file):
+        stat = os.stat(db_file)
+        return os.path.abspath(db_file), stat.st_size, stat.st_mtime_ns
+    size, count, mtime = 0, 0, 0
+    for root, _, files in os.walk(db_file):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            size += stat.st_size
+            count += 1
+            mtime = max(mtime, stat.st_mtime_ns)
+    return os.path.abspath(db_file), (size, count), mtime
+
+
+class TableInfoCache:
+    """Caches `SQLDatabase.get_table_info` (schema reflection plus sample rows) per table set.
+
+    Each database is registered with the file or Parquet directory it was loaded from, and
+    entries are keyed by its fingerprint and the sorted table names, so they are dropped
+    only when a file changes. Databases that were not registered are not cached.
+    """
+
+    def __init__(self):
+        self.db_files = {}
+        self.table_info = {}
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, database, db_file):
+        self.db_files[id(database)] = (database, db_file)
+
+    def get_table_info(self, database, table_names=None):
+        if id(database) not in self.db_files:
+            return database.get_table_info(table_names=table_names)
+
+        _, db_file = self.db_files[id(database)]
+        fingerprint = get_file_fingerprint(db_file)
+        key = (fingerprint, tuple(sorted(table_names)) if table_names is not None else None)
+        if key not in self.table_info:
+            self.misses += 1
+            # Drop the entries of a previous version of the file
+            for stale_key in [k for k in self.table_info if k[0][0] == fingerprint[0] and k[0] != fingerprint]:
+                del self.table_info[stale_key]
+            self.table_info[key] = database.get_table_info(table_names=table_names)
+        else:
+            self.hits += 1
+        return self.table_info[key]
 
 
 def delete_database(db_file):
@@ -11,6 +462,218 @@ def delete_database(db_file):
     else:
         print(f"The file does not exist {db_file}.")
 
+BUILD_PRAGMAS = [
+    "PRAGMA journal_mode = OFF;",
+    "PRAGMA synchronous = OFF;",
+    "PRAGMA temp_store = MEMORY;",
+]
+
+
+def set_build_pragmas(conn, cache_size_mb=256):
+    """Applies build-only pragmas: no journal, no fsync and a larger page cache.
+
+    Only meant for databases that are built in one go and discarded on failure.
+    """
+    for pragma in BUILD_PRAGMAS:
+        conn.execute(pragma)
+    conn.execute(f"PRAGMA cache_size = -{cache_size_mb * 1024};")
+
+
+class RowBuilder:
+    """Accumulates row tuples per table and assigns their integer primary keys.
+
+    `table_columns` maps each table to its insert columns, the first one being the
+    primary key. Ids start at `next_ids` (the next free id per table, 1 by default)
+    so rows can be built away from the database connection, e.g. in a worker process.
+    """
+
+    def __init__(self, table_columns, next_ids=None):
+        self.table_columns = table_columns
+        self.next_ids = {table: 1 for table in table_columns}
+        if next_ids:
+            self.next_ids.update(next_ids)
+        self.rows = {table: [] for table in table_columns}
+
+    def new_id(self, table):
+        row_id = self.next_ids[table]
+        self.next_ids[table] += 1
+        return row_id
+
+    def take(self):
+        """Returns the rows built so far and starts a new batch."""
+        rows = self.rows
+        self.rows = {table: [] for table in self.table_columns}
+        return rows
+
+
+def get_next_ids(conn, table_columns):
+    """Returns the next free primary key of every table in `table_columns`."""
+    cursor = conn.cursor()
+    next_ids = {}
+    for table, columns in table_columns.items():
+        cursor.execute(f"SELECT COALESCE(MAX({columns[0]}), 0) + 1 FROM {table}")
+        next_ids[table] = cursor.fetchone()[0]
+    return next_ids
+
+
+def write_rows(conn, table_columns, rows):
+    """Writes `{table: [row tuples]}` as-is with one `executemany` per table."""
+    cursor = conn.cursor()
+    for table, columns in table_columns.items():
+        if rows.get(table):
+            cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                rows[table]
+            )
+
+
+def insert_rows(conn, table_columns, row_ids, rows):
+    """Inserts rows built with ids starting at 1, shifting them past the rows already in the database.
+
+    `row_ids` maps each table to `{column position: table whose ids that column holds}`.
+    """
+    offsets = {table: next_id - 1 for table, next_id in get_next_ids(conn, table_columns).items()}
+
+    shifted = {}
+    for table, table_rows in rows.items():
+        id_columns = [(position, offsets[id_table]) for position, id_table in row_ids[table].items() if offsets[id_table]]
+        if not id_columns:
+            shifted[table] = table_rows
+            continue
+        shifted_rows = []
+        for row in table_rows:
+            row = list(row)
+            for position, offset in id_columns:
+                row[position] += offset
+            shifted_rows.append(tuple(row))
+        shifted[table] = shifted_rows
+
+    write_rows(conn, table_columns, shifted)
+    conn.commit()
+
+
+# A column-level primary key, `Cell_ID INTEGER PRIMARY KEY AUTOINCREMENT`, but not a `PRIMARY KEY (...)` table constraint
+_COLUMN_PRIMARY_KEY = re.compile(r'\s+PRIMARY\s+KEY(?:\s+(?:ASC|DESC))?(?:\s+AUTOINCREMENT)?(?!\s*\()', re.I)
+_TABLE_PRIMARY_KEY = re.compile(r'\bPRIMARY\s+KEY\s*\([^)]*\)', re.I)
+
+
+def get_referenced_columns(conn, table):
+    """Returns the columns of `table` that foreign keys of any table of `conn` reference, in first reference order."""
+    primary_key = [name for _, name, _, _, _, pk in sorted(conn.execute(f"PRAGMA table_info({table})"), key=lambda row: row[5]) if pk]
+    referenced = []
+    for (child,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+        for _, seq, parent, _, parent_column, *_ in conn.execute(f"PRAGMA foreign_key_list({child})"):
+            if parent != table:
+                continue
+            # Without a parent column the foreign key references the primary key
+            column = parent_column if parent_column is not None else primary_key[seq]
+            if column not in referenced:
+                referenced.append(column)
+    return referenced
+
+
+def cluster_table(conn, table, primary_key):
+    """Rebuilds `table` as a WITHOUT ROWID table whose rows are stored in `primary_key` order.
+
+    The table is recreated from its own CREATE TABLE statement, so column types, defaults,
+    CHECK, UNIQUE and foreign key clauses are kept, and so are its indexes and ids: every
+    column another table's foreign key references is declared UNIQUE, since it is no
+    longer the primary key on its own. The ids are no longer AUTOINCREMENT, which the
+    builders never relied on since they assign them with `get_next_ids`. Returns False if
+    `table` is not a table of `conn`.
+    """
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if not row:
+        return False
+    key = ', '.join(primary_key)
+    unique = [f"UNIQUE ({column})" for column in get_referenced_columns(conn, table) if [column] != list(primary_key)]
+    indexes = [sql for (sql,) in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))]
+
+    sql = row[0]
+    body = sql[sql.index('(') + 1:sql.rindex(')')]
+    if _TABLE_PRIMARY_KEY.search(body):
+        body = _TABLE_PRIMARY_KEY.sub(f"PRIMARY KEY ({key})", body)
+        constraints = unique
+    else:
+        body = _COLUMN_PRIMARY_KEY.sub('', body)
+        constraints = [f"PRIMARY KEY ({key})"] + unique
+    # The body may end in a `--` comment, the constraints go on their own line
+    body = body.rstrip() + "".join(f"\n    , {constraint}" for constraint in constraints)
+
+    conn.execute(f"CREATE TABLE {table}_clustered ({body}\n) WITHOUT ROWID")
+    conn.execute(f"INSERT INTO {table}_clustered SELECT * FROM {table} ORDER BY {key}")
+    conn.execute(f"DROP TABLE {table}")
+    # Views over the table, like Timing_Values over Timing_Arcs, dangle until the rename
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    conn.execute(f"ALTER TABLE {table}_clustered RENAME TO {table}")
+    conn.execute("PRAGMA legacy_alter_table = OFF")
+    for sql in indexes:
+        conn.execute(sql)
+    conn.commit()
+    return True
+
+
+def check_foreign_keys(conn):
+    """Raises `sqlite3.IntegrityError` if `PRAGMA foreign_key_check` reports violations.
+
+    A foreign key whose parent columns are not unique makes SQLite raise a "foreign key
+    mismatch" `sqlite3.OperationalError` instead.
+    """
+    violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        raise sqlite3.IntegrityError(f"{len(violations)} foreign key violations, e.g. {violations[:5]}")
+
+
+def timed_call(function, *args):
+    """Calls `function(*args)` and returns `(result, elapsed seconds)`."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run_build_tasks(tasks, write, jobs=1):
+    """Runs the parse step of every build task and hands each result to `write(task, result)`.
+
+    A task is a dict with at least `stage`, `parse` (a module level function) and `args`.
+    With `jobs > 1` the parse functions run in a process pool while this process stays
+    the only writer; results are written in task order so ids do not depend on which
+    worker finishes first. Returns the per-stage timings printed by `print_build_report`.
+    """
+    stats = {}
+    start = time.perf_counter()
+
+    def write_results(results):
+        for task, (result, parse_time) in zip(tasks, results):
+            write_start = time.perf_counter()
+            write(task, result)
+            now = time.perf_counter()
+
+            stage = stats.setdefault(task['stage'], {'tasks': 0, 'parse': 0.0, 'write': 0.0, 'done': 0.0})
+            stage['tasks'] += 1
+            stage['parse'] += parse_time
+            stage['write'] += now - write_start
+            stage['done'] = now - start
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(timed_call, task['parse'], *task['args']) for task in tasks]
+            write_results(future.result() for future in futures)
+    else:
+        write_results(timed_call(task['parse'], *task['args']) for task in tasks)
+
+    print_build_report(stats, time.perf_counter() - start, jobs)
+    return stats
+
+
+def print_build_report(stats, total_time, jobs):
+    """Prints the wall-clock report of `run_build_tasks`."""
+    print(f"\nBuild report ({jobs} job{'s' if jobs > 1 else ''})")
+    print(f"{'Stage':<15}{'Tasks':>7}{'Parse (s)':>12}{'Write (s)':>12}{'Done at (s)':>13}")
+    for stage, stage_stats in stats.items():
+        print(f"{stage:<15}{stage_stats['tasks']:>7}{stage_stats['parse']:>12.2f}{stage_stats['write']:>12.2f}{stage_stats['done']:>13.2f}")
+    print(f"{'Total':<15}{sum(s['tasks'] for s in stats.values()):>7}{sum(s['parse'] for s in stats.values()):>12.2f}{sum(s['write'] for s in stats.values()):>12.2f}{total_time:>13.2f}")
+
+
 def create_views(source, db, variant, corner=None, condition_id=None):
     if source == 'lib':
         create_vritaul_lib_tables(db, variant, condition_id)
@@ -6,6 +6,7 @@ import csv
 import time 
 import tempfile
 import subprocess
+from functools import lru_cache
 from neo4j import GraphDatabase
 
 # Usage
@@ -479,6 +480,12 @@ class Neo4jConnection:
 
 
 def get_node_descr(selected_nodes=None):
+    """Returns the description of the selected nodes, memoized per selection."""
+    return _cached_node_descr(frozenset(selected_nodes) if selected_nodes else None)
+
+
+@lru_cache(maxsize=None)
+def _cached_node_descr(selected_nodes=None):
 
     design_descr = """
 # Node: Design
@@ -591,10 +598,16 @@ Defines wire segments (metal layers) used for routing the net node.
 
     if not selected_nodes:
         selected_nodes = list(descr_dict.keys())
-        
+
+    unknown_nodes = set(selected_nodes) - set(descr_dict)
+    if unknown_nodes:
+        raise KeyError(f"Unknown nodes {sorted(unknown_nodes)}")
+
+    # Nodes are described in schema order so that the cache key can ignore the selection order
     descr = ""
-    for node in selected_nodes: 
-        descr += descr_dict[node]
+    for node in descr_dict: 
+        if node in selected_nodes:
+            descr += descr_dict[node]
     return descr 
 
 
@@ -665,6 +678,12 @@ Relationship: Various (as specified in the CASE statement)
 
 
 def get_relationship_descr_verbose(selected_nodes=None):
+    """Returns the verbose description of the relationships between the selected nodes, memoized per selection."""
+    return _cached_relationship_descr_verbose(frozenset(selected_nodes) if selected_nodes else None)
+
+
+@lru_cache(maxsize=None)
+def _cached_relationship_descr_verbose(selected_nodes=None):
     design_cell_conn = """
 (:Design)-[:CONTAINS_CELL]->(:Cell)
 This relationship links a design to its cells.
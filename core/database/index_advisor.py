@@ -0,0 +1,318 @@
+"""Workload-driven index advisor for the PDK databases.
+
+Replays the ground-truth SQL of the test set and the cases, plus any logged queries, on
+an in-memory copy of a database. It proposes composite indexes from the columns the
+queries filter and join on, and covering variants that also hold the columns they read.
+It keeps the indexes the planner picks and reports per-query latency before and after.
+With `--apply` the kept indexes are created in the database, the single-column indexes
+they make redundant are dropped, and ANALYZE and PRAGMA optimize are run.
+
+    python -m core.database.index_advisor --db dbs/sky130_index.db --queries output/chipquery/gpt-4o/gpt-4o.log --apply
+"""
+
+import re
+import time
+import sqlite3
+import argparse
+from collections import defaultdict
+
+from core.database.sql_functions import register_sql_functions
+
+# Indexes wider than this are not proposed as covering indexes
+MAX_INDEX_COLUMNS = 6
+
+_LOGGED_SQL = re.compile(r'(?:SQL is|Subquery,)\s+((?:SELECT|WITH)\b[^\n]*)', re.I)
+_TABLE = re.compile(r'(?:\bFROM|\bJOIN|,)\s*(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.I)
+_PREDICATE = re.compile(r'(?:(\w+)\.)?(\w+)\s*(==|=|<=|>=|<|>|\bIN\b|\bBETWEEN\b)', re.I)
+_JOIN_RIGHT = re.compile(r'=\s*(\w+)\.(\w+)')
+_COLUMN = re.compile(r'(?:(\w+)\.)?(\w+)')
+_USED_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+_KEYWORDS = {'WHERE', 'JOIN', 'ON', 'INNER', 'LEFT', 'CROSS', 'NATURAL', 'GROUP', 'ORDER', 'LIMIT', 'UNION', 'USING', 'HAVING', 'AS', 'SELECT'}
+
+
+def load_workload(query_files=()):
+    """Returns the distinct ground-truth SQL of the test set and the cases, followed by the
+    queries of `query_files`. `.sql` files hold statements separated by `;`, other files
+    are chipquery logs whose generated, refined and ground-truth SQL is replayed.
+    """
+    from core.eval.test_set import test_queries
+    from core.eval.cases import pdk_cases, pdk_design_cases
+
+    queries = [query for test_query in test_queries + pdk_cases for query in test_query['ground_truth']]
+    queries += [query for case in pdk_design_cases for query in case.get('sql_query', [])]
+    for query_file in query_files:
+        with open(query_file) as f:
+            text = f.read()
+        if query_file.endswith(".sql"):
+            queries += [statement for statement in text.split(";") if statement.strip()]
+        else:
+            queries += _LOGGED_SQL.findall(text)
+
+    workload = {}
+    for query in queries:
+        query = query.strip().rstrip(";").strip()
+        if re.match(r'(SELECT|WITH)\b', query, re.I):
+            workload.setdefault(query, None)
+    return list(workload)
+
+
+def get_columns(conn):
+    """Returns the columns of every table (views cannot be indexed) and the rowid alias of each table."""
+    columns, rowid = {}, {}
+    for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"):
+        info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        columns[table] = [row[1] for row in info]
+        pk = [row for row in info if row[5]]
+        if len(pk) == 1 and pk[0][2].upper() == "INTEGER":
+            rowid[table] = pk[0][1]
+    return columns, rowid
+
+
+def get_indexes(conn, table):
+    """Returns `{name: columns}` of the indexes created with CREATE INDEX on `table`."""
+    indexes = {}
+    for _, name, _, origin, _ in conn.execute(f"PRAGMA index_list({table})"):
+        if origin == "c":
+            indexes[name] = tuple(row[2] for row in conn.execute(f"PRAGMA index_info({name})"))
+    return indexes
+
+
+def get_referenced_columns(query, columns):
+    """Returns `{table: (equality columns, range columns, read columns)}` for the tables of `query`."""
+    tables, aliases = [], {}
+    for table, alias in _TABLE.findall(query):
+        if table in columns:
+            tables.append(table)
+            aliases[table] = table
+            if alias and alias.upper() not in _KEYWORDS:
+                aliases[alias] = table
+
+    def resolve(qualifier, column):
+        if qualifier:
+            table = aliases.get(qualifier)
+            return table if table and column in columns[table] else None
+        owners = [table for table in tables if column in columns[table]]
+        return owners[0] if len(owners) == 1 else None
+
+    referenced = {table: ([], [], set()) for table in tables}
+    for qualifier, column, op in _PREDICATE.findall(query):
+        table = resolve(qualifier, column)
+        if table:
+            equality, ranges, _ = referenced[table]
+            target = equality if op.upper() in ("=", "==", "IN") else ranges
+            if column not in target:
+                target.append(column)
+    for qualifier, column in _JOIN_RIGHT.findall(query):
+        table = resolve(qualifier, column)
+        if table and column not in referenced[table][0]:
+            referenced[table][0].append(column)
+    for qualifier, column in _COLUMN.findall(query):
+        table = resolve(qualifier, column)
+        if table:
+            referenced[table][2].add(column)
+    return referenced
+
+
+def propose_indexes(conn, queries):
+    """Returns candidate `(table, columns)` indexes for the queries.
+
+    Each query gets, per table, an index on its equality columns (most selective first)
+    followed by its first range column, and a covering variant that appends the other
+    columns it reads. Candidates already served by an existing index or the rowid are skipped.
+    """
+    columns, rowid = get_columns(conn)
+    distinct = {}
+
+    def selectivity(table, column):
+        if (table, column) not in distinct:
+            distinct[(table, column)] = conn.execute(f"SELECT COUNT(DISTINCT {column}) FROM {table}").fetchone()[0]
+        return distinct[(table, column)]
+
+    candidates = {}
+    for query in queries:
+        for table, (equality, ranges, read) in get_referenced_columns(query, columns).items():
+            key = sorted(equality, key=lambda column: -selectivity(table, column)) + [column for column in ranges[:1] if column not in equality]
+            if not key or key[0] == rowid.get(table):
+                continue
+            existing = get_indexes(conn, table).values()
+            if not any(index[:len(key)] == tuple(key) for index in existing):
+                candidates.setdefault((table, tuple(key)), None)
+            extra = sorted(read - set(key) - {rowid.get(table)}, key=columns[table].index)
+            if extra and len(key) + len(extra) <= MAX_INDEX_COLUMNS:
+                covering = tuple(key + extra)
+                if not any(index[:len(covering)] == covering for index in existing):
+                    candidates.setdefault((table, covering), None)
+    return list(candidates)
+
+
+def index_name(table, index_columns):
+    return f"idx_{table.lower()}_{'_'.join(column.lower() for column in index_columns)}"
+
+
+def get_redundant_indexes(conn, kept):
+    """Returns the created indexes on a rowid alias, or whose columns are a prefix of a kept index."""
+    columns, rowid = get_columns(conn)
+    redundant = []
+    for table in columns:
+        for name, index_columns in get_indexes(conn, table).items():
+            if name in kept:
+                continue
+            on_rowid = index_columns == (rowid.get(table),)
+            covered = any(kept_table == table and kept_columns[:len(index_columns)] == index_columns and kept_columns != index_columns for kept_table, kept_columns in kept.values())
+            if on_rowid or covered:
+                redundant.append(name)
+    return redundant
+
+
+def time_query(conn, query, repeats=5):
+    """Returns the best of `repeats` wall times of `query`, in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        conn.execute(query).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_plan(conn, query):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}")]
+
+
+def advise(db_file, queries, repeats=10, drop_redundant=True, tolerance=0.05):
+    """Proposes indexes for `queries` on an in-memory copy of `db_file`.
+
+    All candidates are created and analyzed, and the ones the planner never picks or that
+    are a prefix of another candidate are dropped. Each remaining candidate is then dropped
+    again if the queries that used it do not get more than `tolerance` slower without it. Existing
+    indexes on a rowid or on a prefix of a kept index are redundant.
+
+    Returns a dict with the CREATE INDEX statements to apply, the indexes to drop and,
+    per query, its latency and plan before and after. Queries that fail are skipped.
+    """
+    conn = sqlite3.connect(":memory:")
+    with sqlite3.connect(db_file) as disk_conn:
+        disk_conn.backup(conn)
+    register_sql_functions(conn)
+
+    runnable = []
+    for query in queries:
+        try:
+            conn.execute(query).fetchall()
+            runnable.append(query)
+        except sqlite3.Error:
+            pass
+
+    def measure():
+        return {query: (time_query(conn, query, repeats), get_plan(conn, query)) for query in runnable}
+
+    def total(results):
+        return sum(latency for latency, _ in results.values())
+
+    before = measure()
+    # Statistics alone can change the plans, report them apart from the new indexes
+    conn.execute("ANALYZE")
+    analyzed = total(measure())
+
+    candidates = {index_name(table, index_columns): (table, index_columns) for table, index_columns in propose_indexes(conn, runnable)}
+    for name, (table, index_columns) in candidates.items():
+        conn.execute(f"CREATE INDEX {name} ON {table} ({', '.join(index_columns)})")
+    conn.execute("ANALYZE")
+
+    results = measure()
+    uses = defaultdict(int)
+    for _, plan in results.values():
+        for detail in plan:
+            for name in _USED_INDEX.findall(detail):
+                uses[name] += 1
+    for name in [name for name in candidates if not uses[name]]:
+        conn.execute(f"DROP INDEX {name}")
+        del candidates[name]
+
+    # A candidate that is a prefix of another one serves no lookup the longer one cannot
+    for name, (table, index_columns) in list(candidates.items()):
+        if any(other != name and other_table == table and other_columns[:len(index_columns)] == index_columns for other, (other_table, other_columns) in candidates.items()):
+            conn.execute(f"DROP INDEX {name}")
+            del candidates[name]
+    results = measure()
+
+    # Least used first, so the indexes many queries share are judged last
+    kept = dict(candidates)
+    for name in sorted(candidates, key=lambda name: uses[name]):
+        users = [query for query, (_, plan) in results.items() if any(name in _USED_INDEX.findall(detail) for detail in plan)]
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()[0]
+        conn.execute(f"DROP INDEX {name}")
+        without = measure()
+        if sum(without[query][0] for query in users) <= sum(results[query][0] for query in users) * (1 + tolerance):
+            del kept[name]
+            results = without
+        else:
+            conn.execute(sql)
+            conn.execute(f"ANALYZE {name}")
+
+    drop = get_redundant_indexes(conn, kept) if drop_redundant else []
+    for name in drop:
+        conn.execute(f"DROP INDEX {name}")
+
+    after = measure()
+    conn.close()
+
+    return {
+        'create': [f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(index_columns)});" for name, (table, index_columns) in kept.items()],
+        'drop': drop,
+        'skipped': len(queries) - len(runnable),
+        'analyzed': analyzed,
+        'queries': [(query, before[query][0], after[query][0], before[query][1], after[query][1]) for query in runnable],
+    }
+
+
+def apply_advice(db_file, advice):
+    """Creates and drops the advised indexes in `db_file`, then runs ANALYZE and PRAGMA optimize."""
+    with sqlite3.connect(db_file) as conn:
+        for statement in advice['create']:
+            conn.execute(statement)
+        for name in advice['drop']:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+    conn.close()
+
+
+def print_report(advice, verbose=False):
+    print(f"{len(advice['queries'])} queries replayed, {advice['skipped']} skipped (not runnable on this database)")
+    print(f"{'before ms':>10} {'after ms':>10} {'speedup':>8}  query")
+    for query, before, after, plan_before, plan_after in advice['queries']:
+        print(f"{before * 1e3:10.3f} {after * 1e3:10.3f} {before / after:7.2f}x  {' '.join(query.split())[:100]}")
+        if verbose and plan_before != plan_after:
+            print(f"{'':31}before: {'; '.join(plan_before)}")
+            print(f"{'':31}after:  {'; '.join(plan_after)}")
+
+    total_before = sum(query[1] for query in advice['queries'])
+    total_after = sum(query[2] for query in advice['queries'])
+    if total_after:
+        print(f"total {total_before * 1e3:.3f} ms -> {total_after * 1e3:.3f} ms ({total_before / total_after:.2f}x), {advice['analyzed'] * 1e3:.3f} ms with ANALYZE alone")
+    print("create:" if advice['create'] else "create: none")
+    for statement in advice['create']:
+        print(f"  {statement}")
+    print(f"drop: {', '.join(advice['drop']) if advice['drop'] else 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Propose composite and covering indexes for a PDK database from the query workload.')
+    parser.add_argument('--db', type=str, help='Path to a built PDK database', required=True)
+    parser.add_argument('--queries', type=str, nargs='*', help='Extra .sql files or chipquery logs to replay', default=[])
+    parser.add_argument('--repeats', type=int, help='Runs per query, the best time is reported', default=10)
+    parser.add_argument('--keep_redundant', help='Keep the existing indexes made redundant by the proposed ones.', action='store_true', default=False)
+    parser.add_argument('--apply', help='Create the proposed indexes in the database and run ANALYZE and PRAGMA optimize.', action='store_true', default=False)
+    parser.add_argument('--verbose', help='Print the query plans that changed.', action='store_true', default=False)
+    args = parser.parse_args()
+
+    advice = advise(args.db, load_workload(args.queries), repeats=args.repeats, drop_redundant=not args.keep_redundant)
+    print_report(advice, verbose=args.verbose)
+
+    if args.apply:
+        apply_advice(args.db, advice)
+        print(f"Applied to {args.db}")
+
+
+if __name__ == '__main__':
+    main()
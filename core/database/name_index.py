@@ -0,0 +1,272 @@
+"""Full-text name index of the PDK databases and a resolver from question words to exact names.
+
+`create_name_index` stores the distinct cell, pin, layer and via names of a database in
+Name_Index_Names with a trigram FTS5 index over them. `NameResolver` maps the words of a
+question ("nand2 x1 in high density", "metal 2") to the literals the SQL has to use
+(sky130_fd_sc_hd__nand2_1, met2), so the generator does not have to guess them.
+
+    python -m core.database.name_index --db dbs/sky130_index.db --build --question "nand2 x1 in high density"
+"""
+
+import re
+import time
+import sqlite3
+import argparse
+
+from config.sky130 import SCLVariants
+
+# (table, name column, kind) of every name that is indexed, tables missing from a database are skipped
+NAME_SOURCES = [
+    ('Cells', 'Name', 'cell'),
+    ('Macros', 'Name', 'cell'),
+    ('Input_Pins', 'Input_Pin_Name', 'pin'),
+    ('Output_Pins', 'Output_Pin_Name', 'pin'),
+    ('Pins', 'Name', 'pin'),
+    ('Routing_Layers', 'Name', 'layer'),
+    ('Cut_Layers', 'Name', 'layer'),
+    ('Vias', 'Name', 'via'),
+]
+
+# Phrases rewritten to the spelling used in the PDK names before matching
+NAME_ALIASES = [
+    (re.compile(r'\bmetal\s*(\d)\b'), r'met\1'),
+    (re.compile(r'\blocal\s+interconnect\b'), 'li1'),
+    (re.compile(r'\b([a-z]\w*\d)\s+(?:x|drive\s+strength\s+|size\s+)(\d+)\b'), r'\1_\2'),
+]
+
+_WORD = re.compile(r'\w+')
+_STOPWORDS = {
+    'the', 'a', 'an', 'of', 'in', 'on', 'for', 'to', 'and', 'or', 'with', 'what', 'which', 'is', 'are',
+    'how', 'many', 'much', 'does', 'do', 'its', 'it', 'from', 'by', 'at', 'as', 'all', 'each', 'per',
+    'cell', 'cells', 'pin', 'pins', 'layer', 'layers', 'via', 'vias', 'library', 'value', 'values'
+}
+
+
+def get_library_aliases():
+    """Returns `(phrase, variant)` pairs like ("high density", "sky130_fd_sc_hd") from `SCLVariants`, longest first."""
+    aliases = []
+    for variant in SCLVariants:
+        words = re.findall(r'[A-Z][a-z]*', variant.name)
+        aliases.append((' '.join(word.lower() for word in words), variant.value))
+        aliases.append((variant.value.split('_')[-1], variant.value))
+    return sorted(aliases, key=lambda alias: -len(alias[0]))
+
+
+def create_name_index(conn):
+    """(Re)builds Name_Index_Names and its trigram FTS5 index Name_Index from the tables of `conn`."""
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS Name_Index;")
+    cursor.execute("DROP TABLE IF EXISTS Name_Index_Names;")
+    cursor.execute('''
+    CREATE TABLE Name_Index_Names (
+        Name_ID INTEGER PRIMARY KEY,
+        Name TEXT NOT NULL,
+        Kind TEXT NOT NULL,
+        Source TEXT NOT NULL,
+        UNIQUE (Name, Source)
+    );
+    ''')
+
+    tables = {name for (name,) in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, column, kind in NAME_SOURCES:
+        if table in tables:
+            cursor.execute(f"""
+            INSERT OR IGNORE INTO Name_Index_Names (Name, Kind, Source)
+            SELECT DISTINCT {column}, ?, ? FROM {table} WHERE {column} IS NOT NULL
+            """, (kind, table))
+
+    cursor.execute('''
+    CREATE VIRTUAL TABLE Name_Index USING fts5(
+        Name,
+        content='Name_Index_Names',
+        content_rowid='Name_ID',
+        tokenize='trigram'
+    );
+    ''')
+    cursor.execute("INSERT INTO Name_Index (Name_Index) VALUES ('rebuild');")
+    conn.commit()
+
+
+def get_trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def quote_match(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+class NameResolver:
+    """Maps the words of a question to exact names through the name index of a database.
+
+    `resolve` returns `(term, name, kind, sources)` tuples, at most `limit` names per term.
+    Terms of three or more characters are matched as case-insensitive substrings of the
+    names, falling back to trigram similarity for misspellings. Shorter words only resolve
+    to pin or layer names they equal exactly, e.g. A1 or X. `schema` is the attached
+    database whose index is read, see `resolve_names`.
+    """
+
+    def __init__(self, conn, limit=5, min_similarity=0.5, schema="main"):
+        self.conn = conn
+        self.schema = schema
+        self.limit = limit
+        self.min_similarity = min_similarity
+        self.library_aliases = get_library_aliases()
+        self.library_names = {variant.value for variant in SCLVariants}
+
+    def has_index(self):
+        return self.conn.execute(f"""SELECT 1 FROM "{self.schema}".sqlite_master WHERE name = 'Name_Index'""").fetchone() is not None
+
+    def get_terms(self, question):
+        """Returns the name terms and the cell libraries mentioned in `question`."""
+        text = question.lower()
+        for pattern, replacement in NAME_ALIASES:
+            text = pattern.sub(replacement, text)
+
+        libraries = []
+        for phrase, variant in self.library_aliases:
+            pattern = re.compile(rf'\b{re.escape(phrase)}\b')
+            if pattern.search(text):
+                libraries.append(variant)
+                text = pattern.sub(' ', text)
+
+        terms = []
+        for word in _WORD.findall(text):
+            if word in _STOPWORDS or word.isdigit() or word in self.library_names:
+                continue
+            if word not in terms:
+                terms.append(word)
+        return terms, libraries
+
+    def match(self, term):
+        return self.conn.execute(f"""
+            SELECT Name_Index_Names.Name, Kind, Source FROM "{self.schema}".Name_Index
+            JOIN "{self.schema}".Name_Index_Names ON Name_Index_Names.Name_ID = Name_Index.rowid
+            WHERE Name_Index MATCH ? ORDER BY rank LIMIT 200
+        """, (quote_match(term),)).fetchall()
+
+    def match_similar(self, term):
+        """Returns the names sharing at least `min_similarity` of their trigrams with `term`."""
+        trigrams = get_trigrams(term)
+        rows = self.conn.execute(f"""
+            SELECT Name_Index_Names.Name, Kind, Source FROM "{self.schema}".Name_Index
+            JOIN "{self.schema}".Name_Index_Names ON Name_Index_Names.Name_ID = Name_Index.rowid
+            WHERE Name_Index MATCH ? ORDER BY rank LIMIT 200
+        """, (' OR '.join(quote_match(trigram) for trigram in trigrams),)).fetchall()
+
+        similar = []
+        for name, kind, source in rows:
+            # Compare with the part of a cell name after its library prefix
+            short_name = name.lower().split('__')[-1]
+            similarity = len(trigrams & get_trigrams(short_name)) / len(trigrams | get_trigrams(short_name))
+            if similarity >= self.min_similarity:
+                similar.append((name, kind, source))
+        return similar
+
+    def score(self, term, name, libraries):
+        """Returns how well `name` matches `term`, names of the mentioned libraries rank first."""
+        name = name.lower()
+        short_name = name.split('__')[-1]
+        score = 0
+        if short_name == term or name == term:
+            score += 3
+        elif short_name.startswith(f"{term}_"):
+            score += 2
+        elif short_name.startswith(term):
+            score += 1
+        if libraries and any(name.startswith(f"{library}__") for library in libraries):
+            score += 4
+        return score
+
+    def resolve(self, question):
+        terms, libraries = self.get_terms(question)
+        resolved = []
+
+        for term in terms:
+            if len(term) < 3:
+                continue
+            rows = self.match(term) or self.match_similar(term)
+            names = {}
+            for name, kind, source in rows:
+                names.setdefault((name, kind), []).append(source)
+            if not names:
+                continue
+
+            # Keep the best matches only, shorter names first (nand2_1 before nand2b_1)
+            scores = {key: self.score(term, key[0], libraries) for key in names}
+            best = max(scores.values())
+            ranked = sorted((key for key in names if scores[key] == best), key=lambda key: (len(key[0]), key[0]))
+            for name, kind in ranked[:self.limit]:
+                resolved.append((term, name, kind, names[(name, kind)]))
+
+        # Short pin and layer names only resolve when written exactly
+        for position, word in enumerate(_WORD.findall(question)):
+            # A capitalized stopword is kept unless it starts the question, "pin A" but not "A cell"
+            if word.lower() in _STOPWORDS and (position == 0 or not word.isupper()):
+                continue
+            if len(word) < 3 and not word.isdigit():
+                rows = self.conn.execute(
+                    f"""SELECT Kind, Source FROM "{self.schema}".Name_Index_Names WHERE Name = ? AND Kind IN ('pin', 'layer')""", (word,)
+                ).fetchall()
+                for kind in dict.fromkeys(kind for kind, _ in rows):
+                    resolved.append((word, word, kind, [source for row_kind, source in rows if row_kind == kind]))
+
+        return resolved
+
+
+def resolve_names(database, question, limit=5):
+    """Resolves the names of `question` on a `SQLDatabase`, returns [] if it has no name index.
+
+    On a federated database (see `FederatedDatabase`) the main schema is empty and the
+    index tables are not part of the union views, so the index of every attached
+    partition is read and the names found in several of them are merged.
+    """
+    with database._engine.connect() as connection:
+        conn = connection.connection.dbapi_connection
+        schemas = [name for _, name, *_ in conn.execute("PRAGMA database_list") if name != "temp"]
+        resolved = {}
+        for schema in schemas:
+            resolver = NameResolver(conn, limit=limit, schema=schema)
+            if not resolver.has_index():
+                continue
+            for term, name, kind, sources in resolver.resolve(question):
+                merged = resolved.setdefault((term, name, kind), [])
+                merged.extend(source for source in sources if source not in merged)
+        return [(term, name, kind, sources) for (term, name, kind), sources in resolved.items()]
+
+
+def format_resolved_names(resolved):
+    """Formats `NameResolver.resolve` results for the generator prompt."""
+    if not resolved:
+        return ""
+    lines = ["\n# Resolved names", "Exact names in the database that match words of the question, use them as literals:"]
+    for term, name, kind, sources in resolved:
+        lines.append(f"- {term}: {kind} '{name}' ({', '.join(sources)})")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the name index of a PDK database and resolve question words to exact names.')
+    parser.add_argument('--db', type=str, help='Path to a built PDK database', required=True)
+    parser.add_argument('--build', help='(Re)build the name index in the database first.', action='store_true', default=False)
+    parser.add_argument('--question', type=str, nargs='*', help='Questions to resolve', default=[])
+    parser.add_argument('--repeats', type=int, help='Runs per question for the latency', default=100)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.build:
+        create_name_index(conn)
+        print(f"Indexed {conn.execute('SELECT COUNT(*) FROM Name_Index_Names').fetchone()[0]} names in {args.db}")
+
+    resolver = NameResolver(conn)
+    for question in args.question:
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            resolved = resolver.resolve(question)
+        elapsed = (time.perf_counter() - start) / args.repeats
+        print(f"{question} ({elapsed * 1000:.3f} ms)")
+        print(format_resolved_names(resolved) or "  no names resolved")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Time, VM-step, row and plan budgets for LLM-generated SQL.
+
+`QueryGuard.run` executes a query on a `SQLDatabase` like `SQLDatabase.run`, but
+rejects plans that scan one of the large PDK tables without an index, unless a LIMIT or
+an aggregate bounds the result, or fully scan one inside another loop (the shape of an
+accidental cartesian join), aborts the query through the SQLite progress handler once it
+exceeds its deadline or VM-step budget, and stops fetching once the result exceeds
+`max_rows` rows. Every rejection raises `QueryTooExpensiveError`, whose message tells the
+refiner what to change.
+
+On the DuckDB backend (see `columnar`) only the deadline and `max_rows` apply, and DuckDB
+errors are raised as `sqlite3.OperationalError` so the refiner handles both backends alike.
+"""
+
+import re
+import time
+import sqlite3
+import threading
+
+from langchain_community.utilities.sql_database import truncate_word
+
+# Tables that hold one row per timing or power table point
+LARGE_TABLES = ['Timing_Values', 'Timing_Arcs', 'Input_Pin_Internal_Powers']
+
+_FULL_SCAN = re.compile(r'^SCAN \w+')
+_LOOP = re.compile(r'^(?:SCAN|SEARCH) ')
+# A scan through an index reads the rows of the constraint only
+_INDEXED = re.compile(r'\bUSING (?:COVERING )?INDEX\b|\bUSING (?:INTEGER )?PRIMARY KEY\b')
+# A LIMIT or an aggregate keeps the result of a scan small
+_BOUNDED = re.compile(r'\bLIMIT\b|\b(?:COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(', re.I)
+# `FROM Timing_Values tv`, `JOIN Timing_Values AS tv` or `, Timing_Values tv`, the plan names tables by alias
+_ALIAS = re.compile(r'(?:\bFROM|\bJOIN|,)\s*(\w+)\s+(?:AS\s+)?(\w+)', re.I)
+
+
+class QueryTooExpensiveError(Exception):
+    """Raised when a query is rejected before or aborted during execution.
+
+    `reason` is one of full_scan, nested_scan, timeout, vm_steps or max_rows.
+    """
+
+    def __init__(self, reason, detail):
+        self.reason = reason
+        self.detail = detail
+        super().__init__(f"Query too expensive ({reason}): {detail}")
+
+
+class QueryGuard:
+
+    def __init__(self, timeout=10.0, max_vm_steps=None, max_rows=10000, large_tables=None, check_plan=True, progress_interval=10000):
+        self.timeout = timeout
+        self.max_vm_steps = max_vm_steps
+        self.max_rows = max_rows
+        self.large_tables = set(LARGE_TABLES if large_tables is None else large_tables)
+        self.check_plan = check_plan
+        self.progress_interval = progress_interval
+
+    def explain(self, conn, query):
+        """Raises `QueryTooExpensiveError` if the plan fully scans a large table without an index or in a nested loop."""
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        # Loops sharing a parent are nested in plan order; remember which of them were large full scans
+        loops = {}
+        aliases = {alias: table for table, alias in _ALIAS.findall(query) if table in self.large_tables}
+        for _, parent, _, detail in plan:
+            if not _LOOP.match(detail):
+                continue
+            table = detail.split()[1]
+            table = aliases.get(table, table)
+            full_scan = _FULL_SCAN.match(detail) is not None
+            outer_loops = loops.setdefault(parent, [])
+            large_outer = [outer for outer, large_scan in outer_loops if large_scan]
+
+            if full_scan and table in self.large_tables and outer_loops:
+                raise QueryTooExpensiveError(
+                    "nested_scan",
+                    f"{table} is fully scanned once per row of {outer_loops[-1][0]}. "
+                    f"Join it on an indexed column (Cell_ID, Output_Pin_ID) or filter both tables first."
+                )
+            if full_scan and large_outer:
+                raise QueryTooExpensiveError(
+                    "nested_scan",
+                    f"{table} is fully scanned once per row of {large_outer[0]}, the join has no usable join condition. "
+                    f"Join the tables on their ID columns."
+                )
+            # Decided per scan from the plan: a WHERE on an unindexed column still reads every row
+            if full_scan and table in self.large_tables and not _INDEXED.search(detail) and not _BOUNDED.search(query):
+                raise QueryTooExpensiveError(
+                    "full_scan",
+                    f"{table} is scanned without an index. Restrict it by Cell_ID, Output_Pin_ID or Related_Input_Pin "
+                    f"to the cells, pins or corner the question asks about, or aggregate or LIMIT the result."
+                )
+            outer_loops.append((table, full_scan and table in self.large_tables))
+
+    def run(self, database, query):
+        """Runs `query` on a `SQLDatabase` within the budgets and returns the result formatted like `SQLDatabase.run`."""
+        with database._engine.connect() as connection:
+            conn = connection.connection.dbapi_connection
+            if database._engine.dialect.name == "duckdb":
+                rows = self.fetch_duckdb(conn, query)
+            else:
+                if self.check_plan:
+                    self.explain(conn, query)
+                rows = self.fetch(conn, query)
+
+        rows = [tuple(truncate_word(value, length=database._max_string_length) for value in row) for row in rows]
+        return str(rows) if rows else ""
+
+    def fetch(self, conn, query):
+        deadline = time.perf_counter() + self.timeout if self.timeout else None
+        steps = [0]
+        aborted = []
+
+        def progress():
+            steps[0] += self.progress_interval
+            if deadline is not None and time.perf_counter() > deadline:
+                aborted.append("timeout")
+            elif self.max_vm_steps is not None and steps[0] > self.max_vm_steps:
+                aborted.append("vm_steps")
+            return 1 if aborted else 0
+
+        conn.set_progress_handler(progress, self.progress_interval)
+        try:
+            cursor = conn.execute(query)
+            rows = cursor.fetchmany(self.max_rows + 1) if self.max_rows is not None else cursor.fetchall()
+            cursor.close()
+        except sqlite3.OperationalError as e:
+            if aborted and aborted[0] == "timeout":
+                raise QueryTooExpensiveError("timeout", f"the query ran longer than {self.timeout}s. Add filters or avoid joins without join conditions.") from e
+            if aborted:
+                raise QueryTooExpensiveError("vm_steps", f"the query exceeded {self.max_vm_steps} SQLite VM steps. Add filters or avoid joins without join conditions.") from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+        if self.max_rows is not None and len(rows) > self.max_rows:
+            raise QueryTooExpensiveError("max_rows", f"the query returns more than {self.max_rows} rows. Aggregate, filter or add a LIMIT.")
+        return rows
+
+    def fetch_duckdb(self, conn, query):
+        """`fetch` on a DuckDB connection, which is interrupted at the deadline."""
+        import duckdb
+
+        timer = threading.Timer(self.timeout, conn.interrupt) if self.timeout else None
+        if timer is not None:
+            timer.start()
+        try:
+            conn.execute(query)
+            rows = conn.fetchmany(self.max_rows + 1) if self.max_rows is not None else conn.fetchall()
+        except duckdb.InterruptException as e:
+            raise QueryTooExpensiveError("timeout", f"the query ran longer than {self.timeout}s. Add filters or avoid joins without join conditions.") from e
+        except duckdb.Error as e:
+            raise sqlite3.OperationalError(str(e)) from e
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        if self.max_rows is not None and len(rows) > self.max_rows:
+            raise QueryTooExpensiveError("max_rows", f"the query returns more than {self.max_rows} rows. Aggregate, filter or add a LIMIT.")
+        return rows
+
+
+__all__ = [
+    'LARGE_TABLES',
+    'QueryTooExpensiveError',
+    'QueryGuard'
+]
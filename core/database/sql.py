@@ -2,23 +2,49 @@
 """
 
 import os 
+import sys
+import time
 import tqdm
 import sqlite3
 import argparse 
+import shutil
+import subprocess
+from functools import partial, lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 from config.pdks import get_techlef_corners, get_corner_path, get_scl_corners, get_scl, get_lef_paths, get_lib_paths, get_techlef_paths, get_pdk_path, cell_variant
 from config.sky130 import View
-from core.database.sql_lib import create_lib_tables, insert_lib_data, get_lib_description, get_lib_foreign_keys, get_lib_table_names
-from core.database.sql_lef import create_lef_tables, insert_lef_data, get_lef_description, get_compact_lef_description, get_lef_foreign_keys, get_lef_table_names
-from core.database.sql_tlef import create_tlef_tables, insert_tlef_data, get_tlef_description, get_compact_tlef_description, get_tlef_foreign_keys, get_tlef_table_names
+from core.database.sql_lib import get_lib_row_columns, create_lib_tables, create_lib_indexes, create_timing_summaries, cluster_lib_tables, insert_lib_data, insert_lib_rows, parse_liberty_rows, get_lib_description, get_lib_foreign_keys, get_lib_table_names
+from core.database.sql_lef import LEF_ROW_COLUMNS, create_lef_tables, create_lef_indexes, cluster_lef_tables, insert_lef_data, insert_lef_rows, parse_lef_rows, get_lef_description, get_compact_lef_description, get_lef_foreign_keys, get_lef_table_names
+from core.database.sql_tlef import TLEF_ROW_COLUMNS, create_tlef_tables, create_tlef_indexes, insert_tlef_data, insert_tlef_rows, parse_techlef_rows, get_tlef_description, get_compact_tlef_description, get_tlef_foreign_keys, get_tlef_table_names
 from core.parsers.lib.lib_parser import parse_liberty_file
-from core.parsers.lef.lef_parser import LefParser
+from core.parsers.lef.lef_parser import parse_lef
 from core.database.sql_lef import drop_cell_library_column
 from core.database.sql_tlef import drop_cell_library_corner_columns
 from core.database.sql_lib import drop_cell_library_corner_column
+from core.database.db_utils import run_build_tasks, check_foreign_keys, set_build_pragmas, get_next_ids, connect_read_only, create_pooled_engine, load_memdb, connect_memdb
+from core.database.sql_functions import register_sql_functions
+from core.database.name_index import create_name_index
+from core.database.build_manifest import BuildManifest, get_builder_version, get_content_key, get_row_ranges, delete_row_ranges
 
 
-def get_desc(source, selected_schema=None, compact=False, partition=False):    
+def schema_key(selected_schema):
+    """Returns a hashable cache key for a table or node selection, None meaning no selection."""
+    return None if selected_schema is None else frozenset(selected_schema)
+
+
+def get_desc(source, selected_schema=None, compact=False, partition=False):
+    """Returns the description of the selected tables of a view, memoized per selection."""
+    return _cached_desc(source, schema_key(selected_schema), compact, partition)
+
+
+def get_fk(source, selected_schema=None, partition=False):
+    """Returns the foreign keys of the selected tables of a view, memoized per selection."""
+    return _cached_fk(source, schema_key(selected_schema), partition)
+
+
+@lru_cache(maxsize=None)
+def _cached_desc(source, selected_schema=None, compact=False, partition=False):
 
     if source == View.Liberty.value:
         descr = get_lib_description(
@@ -45,7 +71,8 @@ def get_desc(source, selected_schema=None, compact=False, partition=False):
     return descr 
 
 
-def get_fk(source, selected_schema=None, partition=False):    
+@lru_cache(maxsize=None)
+def _cached_fk(source, selected_schema=None, partition=False):
     if source == View.Liberty.value:
         fk_str = get_lib_foreign_keys(selected_schema, partition=partition)
     elif source == View.Lef.value:
@@ -75,6 +102,406 @@ def get_table_names(source, partition=False):
         raise Exception(f"Invalid Source {source}")
 
 
+FEW_SHOT_MODULES = [
+    "core.agents.few_shot.sql",
+    "core.agents.few_shot.sql_partitioned",
+    "core.agents.few_shot.selector",
+    "core.agents.few_shot.selector_partitioned",
+]
+
+
+def time_import(modules, preload=()):
+    """Imports `preload` and then `modules` in a fresh interpreter, returns the seconds spent on `modules`."""
+    code = "; ".join([f"import {module}" for module in preload] + [
+        "import time",
+        "start = time.perf_counter()",
+        f"import {', '.join(modules)}",
+        "print(time.perf_counter() - start)"
+    ])
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def benchmark_descriptions(repeats=1000):
+    """Times the schema descriptions built per question, without and with memoization, and the
+    import cost of the few-shot demos that the agents now defer to their construction.
+    """
+    questions = []
+    for view in [View.Liberty.value, View.Lef.value, View.TechLef.value]:
+        for partition in [False, True]:
+            table_names = get_table_names(view, partition=partition)
+            questions.append((view, None, partition))
+            questions.append((view, table_names[:2], partition))
+
+    def ask(desc, fk):
+        for view, tables, partition in questions:
+            desc(view, schema_key(tables), False, partition)
+            fk(view, schema_key(tables), partition)
+
+    results = {}
+    for mode, desc, fk in [("uncached", _cached_desc.__wrapped__, _cached_fk.__wrapped__), ("cached", _cached_desc, _cached_fk)]:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            ask(desc, fk)
+        results[mode] = (time.perf_counter() - start) / (repeats * len(questions)) * 1e6
+        print(f"{mode:<8} {results[mode]:.2f} us per question")
+    print(f"speedup: {results['uncached'] / results['cached']:.1f}x")
+
+    demos = time_import(FEW_SHOT_MODULES, preload=["core.database.sql"])
+    print(f"SQL few-shot demos: {demos * 1e3:.1f} ms, no longer paid when importing the agents")
+
+    return results
+
+
+SERVING_QUERIES = {
+    'Cells': "SELECT COUNT(*), AVG(Area) FROM Cells",
+    'Output_Pins': "SELECT Cells.Name, Output_Pins.Max_Capacitance FROM Cells JOIN Output_Pins ON Cells.Cell_ID = Output_Pins.Cell_ID WHERE Cells.Name = (SELECT MIN(Name) FROM Cells)",
+    'Timing_Values': "SELECT AVG(Rise_Delay) FROM Timing_Values WHERE Cell_ID = (SELECT MIN(Cell_ID) FROM Cells)",
+    'Macros': "SELECT COUNT(*) FROM Macros",
+    'Routing_Layers': "SELECT Name FROM Routing_Layers",
+}
+
+
+def benchmark_serving(db_file, repeats=100):
+    """Compares the current serving mode, a shared-cache in-memory copy of the database per
+    process, with an immutable memory-mapped open of the file shared by all processes.
+    """
+    with sqlite3.connect(f"file:{db_file}?mode=ro", uri=True) as conn:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+    queries = [query for table, query in SERVING_QUERIES.items() if table in tables]
+
+    results = {}
+    for mode in ["memory", "mmap"]:
+        start = time.perf_counter()
+        if mode == "memory":
+            conn = sqlite3.connect("file:benchmark_memdb?mode=memory&cache=shared", uri=True)
+            with sqlite3.connect(db_file) as disk_conn:
+                disk_conn.backup(conn)
+        else:
+            conn = connect_read_only(db_file, immutable=True, mmap_size=os.path.getsize(db_file))
+        register_sql_functions(conn)
+        startup = time.perf_counter() - start
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                conn.execute(query).fetchall()
+            latencies.append((time.perf_counter() - start) / repeats)
+        conn.close()
+
+        results[mode] = {'startup': startup, 'latencies': latencies}
+        print(f"{mode:<6} startup {startup * 1e3:8.2f} ms, query latency " + ", ".join(f"{latency * 1e3:.3f}" for latency in latencies) + " ms")
+
+    print(f"queries: {queries}")
+    return results
+
+
+def get_runnable_test_queries(db_file):
+    """Returns the first ground-truth SQL of every test set question that runs on `db_file`."""
+    from core.eval.test_set import test_queries
+
+    conn = connect_read_only(db_file)
+    register_sql_functions(conn)
+    queries = []
+    for test_query in test_queries:
+        try:
+            conn.execute(test_query['ground_truth'][0]).fetchall()
+            queries.append(test_query['ground_truth'][0])
+        except sqlite3.Error:
+            pass
+    conn.close()
+    print(f"{len(queries)} of {len(test_queries)} ground-truth queries run on {db_file}")
+    return queries
+
+
+def benchmark_concurrency(db_file, thread_counts=(1, 4, 16), repeats=5):
+    """Runs the ground-truth SQL of the test set from 1, 4 and 16 threads against a
+    shared-cache memory database (table locks shared by all readers) and against a memdb
+    image, both with one connection per thread. Queries that fail on `db_file` are skipped.
+    """
+    queries = get_runnable_test_queries(db_file)
+
+    shared_connection = sqlite3.connect("file:benchmark_shared?mode=memory&cache=shared", uri=True, check_same_thread=False)
+    with sqlite3.connect(db_file) as disk_conn:
+        disk_conn.backup(shared_connection)
+    memdb_connection = load_memdb(db_file, "benchmark_memdb")
+    engines = {
+        'shared_cache': create_pooled_engine(lambda: sqlite3.connect("file:benchmark_shared?mode=memory&cache=shared", uri=True, check_same_thread=False)),
+        'memdb': create_pooled_engine(lambda: connect_memdb("benchmark_memdb")),
+    }
+
+    def worker(engine):
+        with engine.connect() as conn:
+            for _ in range(repeats):
+                for query in queries:
+                    conn.exec_driver_sql(query).fetchall()
+
+    results = {}
+    for mode, engine in engines.items():
+        for thread_count in thread_counts:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=thread_count) as executor:
+                list(executor.map(worker, [engine] * thread_count))
+            elapsed = time.perf_counter() - start
+            results[(mode, thread_count)] = thread_count * repeats * len(queries) / elapsed
+            print(f"{mode:<12} {thread_count:>2} threads: {results[(mode, thread_count)]:,.0f} queries/s")
+        engine.dispose()
+
+    shared_connection.close()
+    memdb_connection.close()
+    return results
+
+
+def cluster_database(db_file, clustered_file):
+    """Writes a copy of a single database with the clustered lib and lef layout."""
+    with sqlite3.connect(clustered_file) as conn:
+        with sqlite3.connect(db_file) as disk_conn:
+            disk_conn.backup(conn)
+        cluster_lib_tables(conn)
+        cluster_lef_tables(conn)
+        check_foreign_keys(conn)
+        conn.execute("VACUUM")
+    conn.close()
+
+
+def benchmark_layout(db_file, repeats=20, cache_size_kb=2048):
+    """Runs the ground-truth SQL of the test set on a single database and on a clustered copy of it.
+
+    Every query runs on a fresh read-only connection with a `cache_size_kb` page cache, so
+    the latency follows the number of pages the query has to read.
+    """
+    queries = get_runnable_test_queries(db_file)
+    clustered_file = f"{db_file}.clustered"
+    cluster_database(db_file, clustered_file)
+
+    results = {}
+    for layout, layout_file in [('rowid', db_file), ('clustered', clustered_file)]:
+        latencies = []
+        for query in queries:
+            elapsed = 0
+            for _ in range(repeats):
+                conn = connect_read_only(layout_file)
+                register_sql_functions(conn)
+                conn.execute(f"PRAGMA cache_size = -{cache_size_kb};")
+                start = time.perf_counter()
+                conn.execute(query).fetchall()
+                elapsed += time.perf_counter() - start
+                conn.close()
+            latencies.append(elapsed / repeats)
+        results[layout] = latencies
+        print(f"{layout:<10} {os.path.getsize(layout_file) / 2**20:8.1f} MB, total {sum(latencies) * 1e3:8.3f} ms, median {sorted(latencies)[len(latencies) // 2] * 1e3:.3f} ms per query")
+
+    for query, rowid_latency, clustered_latency in sorted(zip(queries, results['rowid'], results['clustered']), key=lambda row: row[2] / row[1])[:5]:
+        print(f"{rowid_latency * 1e3:8.3f} -> {clustered_latency * 1e3:8.3f} ms  {' '.join(query.split())[:100]}")
+
+    os.remove(clustered_file)
+    return results
+
+
+def parse_lef_file(lef_path, lef_parser="lef"):
+    """Parses a LEF file and returns its macros."""
+    return parse_lef(lef_path, parser=lef_parser).macro_dict
+
+
+def parse_techlef_file(techlef_path, lef_parser="lef"):
+    """Parses a TechLEF file and returns `(layer_dict, via_dict)`."""
+    tlef_parser = parse_lef(techlef_path, parser=lef_parser)
+    return tlef_parser.layer_dict, tlef_parser.via_dict
+
+
+VIEW_CREATE_TABLES = {
+    View.Lef.value: create_lef_tables,
+    View.TechLef.value: create_tlef_tables,
+    View.Liberty.value: create_lib_tables,
+}
+
+VIEW_CREATE_INDEXES = {
+    View.Lef.value: create_lef_indexes,
+    View.TechLef.value: create_tlef_indexes,
+    View.Liberty.value: partial(create_lib_indexes, partition=True),
+}
+
+VIEW_DROP_COLUMNS = {
+    View.Lef.value: drop_cell_library_column,
+    View.TechLef.value: drop_cell_library_corner_columns,
+    View.Liberty.value: drop_cell_library_corner_column,
+}
+
+VIEW_INSERT_ROWS = {
+    View.Lef.value: insert_lef_rows,
+    View.TechLef.value: insert_tlef_rows,
+    View.Liberty.value: insert_lib_rows,
+}
+
+
+def get_view_row_columns(view, timing_storage="rows"):
+    """Returns the `{table: columns}` a build task of `view` writes, the first column being the id."""
+    if view == View.Liberty.value:
+        return get_lib_row_columns(timing_storage)
+    elif view == View.Lef.value:
+        return LEF_ROW_COLUMNS
+    elif view == View.TechLef.value:
+        return TLEF_ROW_COLUMNS
+    else:
+        raise Exception(f"Invalid View {view}")
+
+
+def get_partition_path(output_dir, key):
+    """Returns the file of a partition, named after its `{variant}_{view}[_{corner}]` key."""
+    return os.path.join(output_dir, f'{key}.db')
+
+
+def write_partition(conn, disk_file_path):
+    """Writes a partition through a temporary file, so a file linked to other partitions is never written in place."""
+    temp_path = f"{disk_file_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    disk_conn = sqlite3.connect(temp_path)
+    conn.backup(disk_conn)
+    disk_conn.close()
+    os.replace(temp_path, disk_file_path)
+
+
+def link_partition(source_path, disk_file_path):
+    """Stores a partition as a hard link of the identical partition `source_path`, or as a copy where links are not supported."""
+    temp_path = f"{disk_file_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source_path, temp_path)
+    except OSError:
+        shutil.copyfile(source_path, temp_path)
+    os.replace(temp_path, disk_file_path)
+
+
+def get_shared_rows(partition_files, table):
+    """Returns `(rows of table in the first partition, rows identical in every partition)`."""
+    # URI filenames, so ATTACH opens the other partitions read-only on any SQLite build
+    conn = sqlite3.connect(f"file:{os.path.abspath(partition_files[0])}?mode=ro", uri=True)
+    rows = conn.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0]
+    conn.execute(f"CREATE TEMP TABLE Shared AS SELECT * FROM main.{table}")
+    for other_file in partition_files[1:]:
+        conn.execute("ATTACH DATABASE ? AS other", (f"file:{os.path.abspath(other_file)}?mode=ro",))
+        conn.execute(f"CREATE TEMP TABLE Shared_Next AS SELECT * FROM temp.Shared INTERSECT SELECT * FROM other.{table}")
+        conn.execute("DROP TABLE temp.Shared")
+        conn.execute("ALTER TABLE temp.Shared_Next RENAME TO Shared")
+        conn.execute("DETACH DATABASE other")
+    shared = conn.execute("SELECT COUNT(*) FROM temp.Shared").fetchone()[0]
+    conn.close()
+    return rows, shared
+
+
+def get_table_bytes(db_file):
+    """Returns `{table: bytes}` of the pages of each table and its indexes, `{}` without the dbstat table."""
+    conn = sqlite3.connect(db_file)
+    try:
+        pages = conn.execute("""
+            SELECT schema.tbl_name, SUM(stat.pgsize) FROM dbstat AS stat
+            JOIN sqlite_schema AS schema ON schema.name = stat.name GROUP BY schema.tbl_name
+        """).fetchall()
+    except sqlite3.OperationalError:
+        pages = []
+    conn.close()
+    return dict(pages)
+
+
+def report_partition_storage(manifest, views=(View.Lef.value, View.TechLef.value)):
+    """Prints the bytes the partition files take and save through links, and the LEF/TechLEF rows shared across corners.
+
+    The rows identical in every corner of a variant are what a shared base database could
+    store once, and the pages of the tables that are identical in every corner bound what
+    it would save per corner.
+    """
+    partitions = {entry['key']: (entry['stage'], entry['partition']) for entry in manifest.inputs.values() if entry.get('partition')}
+    partitions = {key: (stage, path) for key, (stage, path) in partitions.items() if os.path.exists(path)}
+    inodes = {}
+    for _, path in partitions.values():
+        stat = os.stat(path)
+        inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    total = sum(os.path.getsize(path) for _, path in partitions.values())
+    print(f"Partition storage: {total:,} bytes in {len(partitions)} files, {sum(inodes.values()):,} stored, {total - sum(inodes.values()):,} saved by links")
+
+    # Partitions of one view and variant, whose keys differ in the corner only
+    groups = {}
+    for key, (stage, path) in sorted(partitions.items()):
+        if stage in views:
+            groups.setdefault(key[:key.index(stage) + len(stage)], []).append(path)
+    for group, partition_files in groups.items():
+        if len(partition_files) < 2:
+            continue
+        conn = sqlite3.connect(partition_files[0])
+        tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_schema WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name NOT LIKE 'Name_Index%'")]
+        conn.close()
+        table_bytes = get_table_bytes(partition_files[0])
+        rows, shared, shared_bytes = 0, 0, 0
+        for table in tables:
+            table_rows, table_shared = get_shared_rows(partition_files, table)
+            rows += table_rows
+            shared += table_shared
+            if table_shared == table_rows:
+                shared_bytes += table_bytes.get(table, 0)
+        print(f"{group}: {shared:,} of {rows:,} rows identical in all {len(partition_files)} corners, "
+              f"fully shared tables take {shared_bytes:,} of {os.path.getsize(partition_files[0]):,} bytes per corner")
+
+
+def get_manifest_path(output_dir, pdk_name, partition=False):
+    return os.path.join(output_dir, f"{pdk_name}_{'partitions' if partition else 'index'}.manifest.json")
+
+
+def get_build_tasks(pdk_name, jobs=1, stream=False, lib_parser="liberty", timing_storage="rows", lef_parser="lef"):
+    """Returns one build task per LEF file, TechLEF corner and Liberty corner of the PDK.
+
+    With `jobs > 1` files are turned into row tuples inside the worker, which are much
+    cheaper to send back to the writer than the parsed cells and macros.
+    """
+    techlef_corners = get_techlef_corners(pdk_name)
+    scl_corners = get_scl_corners(pdk_name)
+    tasks = []
+
+    for variant in get_scl(pdk_name):
+        variant_name = cell_variant(pdk_name, [variant.name])[0]
+
+        for lef_path in get_lef_paths(pdk_name, variant.value):
+            tasks.append({
+                'stage': View.Lef.value,
+                'key': f"{variant_name}_{View.Lef.value}",
+                'variant': variant_name,
+                'path': lef_path,
+                'parse': parse_lef_rows if jobs > 1 else parse_lef_file,
+                'args': (lef_path, variant_name, lef_parser) if jobs > 1 else (lef_path, lef_parser)
+            })
+
+        for tlef_corner in techlef_corners:
+            techlef_path = get_techlef_paths(pdk_name, variant.value, tlef_corner.value)
+            tasks.append({
+                'stage': View.TechLef.value,
+                'key': f"{variant_name}_{View.TechLef.value}_{tlef_corner.value}",
+                'variant': variant_name,
+                'corner': tlef_corner.value,
+                'path': techlef_path,
+                'parse': parse_techlef_rows if jobs > 1 else parse_techlef_file,
+                'args': (techlef_path, tlef_corner.value, variant_name, lef_parser) if jobs > 1 else (techlef_path, lef_parser)
+            })
+
+        for liberty_corner in scl_corners[variant]:
+            corner_path = get_corner_path(pdk_name, variant_name, liberty_corner.value)
+            task = {
+                'stage': View.Liberty.value,
+                'key': f"{variant_name}_{View.Liberty.value}_{liberty_corner.value}",
+                'variant': variant_name,
+                'corner': liberty_corner.value,
+                'path': corner_path,
+            }
+            if jobs > 1:
+                task.update(parse=parse_liberty_rows, args=(corner_path, variant_name, lib_parser, timing_storage))
+            else:
+                task.update(parse=parse_liberty_file, args=(corner_path, stream, lib_parser))
+            tasks.append(task)
+
+    return tasks
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--pdk_path', type=str, help='Path to the sky130 pdk', default='/home/manar/.volare/sky130A/libs.ref')
@@ -82,105 +509,226 @@ def main():
     parser.add_argument('--output_dir', type=str, help='Path to output director', default='./dbs/sky130')
     parser.add_argument('--csv',  help='Improt database from CSV files (faster)', action='store_true', default=False)
     parser.add_argument('--partition', help='Partition the database by standard cells and operating conditions.', action='store_true', default=False)
+    parser.add_argument('--stream', help='Parse and insert the Liberty files cell by cell to bound memory usage.', action='store_true', default=False)
+    parser.add_argument('--lib_parser', type=str, help='Liberty parser to use: liberty (generic grammar) or fast (purpose-built tokenizer).', choices=['liberty', 'fast'], default='liberty')
+    parser.add_argument('--lef_parser', type=str, help='LEF and TechLEF parser to use: lef (statement stack) or fast (single pass with array-backed rectangles).', choices=['lef', 'fast'], default='lef')
+    parser.add_argument('--timing_storage', type=str, help='Store NLDM tables as one row per point (rows) or as packed float32 arcs behind a Timing_Values view (blob).', choices=['rows', 'blob'], default='rows')
+    parser.add_argument('--jobs', type=int, help='Number of worker processes parsing LEF, TechLEF and Liberty files in parallel.', default=1)
+    parser.add_argument('--incremental', help='Only re-parse the LEF, TechLEF and Liberty files whose content changed since the last build, replacing just their rows or partition files (see build_manifest).', action='store_true', default=False)
+    parser.add_argument('--parquet_dir', type=str, help='Also export the single database to partitioned Parquet files for the DuckDB backend (needs duckdb).', default=None)
+    parser.add_argument('--clustered', help='Store the lib and lef tables of the single database as WITHOUT ROWID tables keyed by corner and cell, or variant and macro.', action='store_true', default=False)
+    parser.add_argument('--benchmark_descriptions', help='Time the memoized schema descriptions and the few-shot demo imports instead of building the database.', action='store_true', default=False)
+
+    parser.add_argument('--benchmark_serving', type=str, help='Path to a built database; compares the in-memory copy with the shared mmap serving mode instead of building the database.', default=None)
+
+    parser.add_argument('--benchmark_concurrency', type=str, help='Path to a built database; runs the test set queries from 1, 4 and 16 threads instead of building the database.', default=None)
+
+    parser.add_argument('--benchmark_layout', type=str, help='Path to a built single database; compares the test set query latency of the rowid and clustered layouts instead of building the database.', default=None)
 
     args = parser.parse_args()
 
+    if args.benchmark_concurrency:
+        benchmark_concurrency(args.benchmark_concurrency)
+        return
+
+    if args.benchmark_layout:
+        benchmark_layout(args.benchmark_layout)
+        return
+
+    if args.benchmark_descriptions:
+        benchmark_descriptions()
+        return
+
+    if args.benchmark_serving:
+        benchmark_serving(args.benchmark_serving)
+        return
+
     pdk_name = args.pdk_name
     output_dir = args.output_dir
     os.makedirs(output_dir, exist_ok=True)
     
     pdk_name = args.pdk_name
     partition = args.partition
+    stream = args.stream
+    lib_parser = args.lib_parser
+    lef_parser = args.lef_parser
+    jobs = args.jobs
+    timing_storage = args.timing_storage
+
+    tasks = get_build_tasks(pdk_name, jobs=jobs, stream=stream, lib_parser=lib_parser, timing_storage=timing_storage, lef_parser=lef_parser)
+
+    # Inputs are compared with the manifest of the last build, a build with other options starts over
+    options = {
+        'pdk_name': pdk_name,
+        'partition': partition,
+        'lib_parser': lib_parser,
+        'lef_parser': lef_parser,
+        'timing_storage': timing_storage,
+        'clustered': args.clustered,
+        'builder': get_builder_version(),
+    }
+    single_file_path = os.path.join(output_dir, f"{pdk_name}_index.db")
+    manifest_path = get_manifest_path(output_dir, pdk_name, partition)
+    if args.incremental and (partition or os.path.exists(single_file_path)):
+        manifest = BuildManifest.load(manifest_path, options)
+    else:
+        manifest = BuildManifest(manifest_path, options)
+    update = bool(manifest.inputs)
+    changed, removed = manifest.get_changes(tasks)
+    removed = {path: manifest.inputs.pop(path) for path in removed}
+    num_inputs = len(tasks)
+    # Partitions identical to one already stored, as {key: stored partition path}
+    linked = {}
+    linked_tasks = []
 
-    scl_variants = get_scl(pdk_name)
-    techlef_corners = get_techlef_corners(pdk_name)
-    scl_corners = get_scl_corners(pdk_name)
+    if partition:
+        # A partition is rebuilt from all of its inputs when one of them changed, was removed or its file is missing
+        current_keys = {task['key'] for task in tasks}
+        rebuild_keys = {task['key'] for task in changed}
+        rebuild_keys.update(entry['key'] for entry in removed.values() if entry['key'] in current_keys)
+        rebuild_keys.update(key for key in current_keys if not os.path.exists(get_partition_path(output_dir, key)))
+        for entry in removed.values():
+            if entry['key'] not in current_keys and os.path.exists(entry['partition']):
+                os.remove(entry['partition'])
+                print(f"Removed partition {entry['partition']}")
+        tasks = [task for task in tasks if task['key'] in rebuild_keys]
+
+        # Partitions drop their library and corner columns, so partitions built from the same
+        # input contents are identical: each content is built once and the others are hard links
+        key_hashes = {}
+        for task in tasks:
+            key_hashes.setdefault(task['key'], (task['stage'], []))[1].append(manifest.get_hash(task['path']))
+        contents = {key: get_content_key(stage, hashes) for key, (stage, hashes) in key_hashes.items()}
+        stored = {
+            entry['content']: entry['partition'] for entry in manifest.inputs.values()
+            if entry.get('content') and entry['key'] not in rebuild_keys and os.path.exists(entry['partition'])
+        }
+        for key, content in contents.items():
+            if content not in stored:
+                stored[content] = get_partition_path(output_dir, key)
+            else:
+                linked[key] = stored[content]
+        linked_tasks = [task for task in tasks if task['key'] in linked]
+        tasks = [task for task in tasks if task['key'] not in linked]
+    else:
+        tasks = changed
+
+    if update:
+        print(f"Incremental build: {len(changed)} of {num_inputs} inputs changed, {len(removed)} removed, {len(tasks)} to parse")
+        if not tasks and not removed and not linked:
+            manifest.save()
+            print("Database is up to date")
+            return
 
     db_conn = dict()
 
     if not partition:
         conn = sqlite3.connect(":memory:")
         db_conn["single"] = conn
-        create_lib_tables(conn)
-        create_lef_tables(conn)
-        create_tlef_tables(conn)
+        if update:
+            # Start from the last build and drop the rows of the changed and removed inputs
+            with sqlite3.connect(single_file_path) as disk_conn:
+                disk_conn.backup(conn)
+            stale_inputs = list(removed.values()) + [manifest.inputs.pop(task['path']) for task in changed if task['path'] in manifest.inputs]
+            for entry in stale_inputs:
+                delete_row_ranges(conn, get_view_row_columns(entry['stage'], timing_storage), entry['rows'])
+            conn.commit()
+        else:
+            stale_inputs = []
+            create_lib_tables(conn, indexes=False, timing_storage=timing_storage)
+            create_lef_tables(conn, indexes=False)
+            create_tlef_tables(conn, indexes=False)
     else:
-        for variant in scl_variants:
-            variant_name = cell_variant(pdk_name, [variant.name])[0]
-
-            for tlef_corner in techlef_corners:
-                    key = f"{variant_name}_{View.TechLef.value}_{tlef_corner.value}"
-                    db_conn[key] = sqlite3.connect(":memory:")  
-                    create_tlef_tables(db_conn[key])
-
-            key = f"{variant_name}_{View.Lef.value}"
-            db_conn[key] = sqlite3.connect(":memory:")  
-            create_lef_tables(db_conn[key])
-
-            for liberty_corner in scl_corners[variant]:
-                key = f"{variant_name}_{View.Liberty.value}_{liberty_corner.value}"
-                db_conn[key] = sqlite3.connect(":memory:")  
-                create_lib_tables(db_conn[key])
-
-    for variant in scl_variants:
-        variant_name = cell_variant(pdk_name, [variant.name])[0]
-        lef_paths = get_lef_paths(pdk_name, variant.value)
-
-        for lef_path in lef_paths: 
-            lef_parser = LefParser(lef_path)
-            lef_parser.parse()
+        create_tables = dict(VIEW_CREATE_TABLES)
+        create_tables[View.Liberty.value] = partial(create_lib_tables, timing_storage=timing_storage)
+        for task in tasks:
+            if task['key'] not in db_conn:
+                db_conn[task['key']] = sqlite3.connect(":memory:")
+                create_tables[task['stage']](db_conn[task['key']], indexes=False)
 
-            if partition:
-                key = f"{variant_name}_{View.Lef.value}"
-                insert_lef_data(db_conn[key], lef_parser.macro_dict, scl_variant=variant_name)
-                drop_cell_library_column(db_conn[key])
-            else:
-                insert_lef_data(db_conn["single"], lef_parser.macro_dict, scl_variant=variant_name)
-
-        for tlef_corner in techlef_corners:
-            techlef_path = get_techlef_paths(pdk_name, variant.value, tlef_corner.value)
-            tlef_parser = LefParser(techlef_path)
-            tlef_parser.parse()
-
-            if partition:
-                key = f"{variant_name}_{View.TechLef.value}_{tlef_corner.value}"
-                insert_tlef_data(db_conn[key], tlef_parser.layer_dict, tlef_parser.via_dict, corner=tlef_corner.value, scl_variant=variant_name)
-                drop_cell_library_corner_columns(db_conn[key])
-            else:
-                insert_tlef_data(db_conn["single"], tlef_parser.layer_dict, tlef_parser.via_dict, corner=tlef_corner.value, scl_variant=variant_name)
-
-        for liberty_corner in scl_corners[variant.value]:
-            print(liberty_corner)
-            corner_path = get_corner_path(pdk_name, variant_name, liberty_corner.value)
-
-            print(corner_path)
-            cells, operating_conditions = parse_liberty_file(corner_path)
-
-            if partition: 
-                key = f"{variant_name}_{View.Liberty.value}_{liberty_corner.value}"
-                insert_lib_data(db_conn[key], cells, operating_conditions, cell_varaint=variant_name)
-                drop_cell_library_corner_column(db_conn[key])
-            else: 
-                insert_lib_data(db_conn['single'], cells, operating_conditions, cell_varaint=variant_name)
+    for conn in db_conn.values():
+        set_build_pragmas(conn)
+
+    def write(task, result):
+        conn = db_conn[task['key']] if partition else db_conn["single"]
+        if not partition:
+            row_columns = get_view_row_columns(task['stage'], timing_storage)
+            first_ids = get_next_ids(conn, row_columns)
+
+        if jobs > 1:
+            VIEW_INSERT_ROWS[task['stage']](conn, result)
+        elif task['stage'] == View.Lef.value:
+            insert_lef_data(conn, result, scl_variant=task['variant'])
+        elif task['stage'] == View.TechLef.value:
+            layer_dict, via_dict = result
+            insert_tlef_data(conn, layer_dict, via_dict, corner=task['corner'], scl_variant=task['variant'])
+        else:
+            cells, operating_conditions = result
+            insert_lib_data(conn, cells, operating_conditions, cell_varaint=task['variant'])
+
+        # Ids are assigned one input at a time, so the rows of an input are one id range per table
+        if not partition:
+            manifest.record(task, rows=get_row_ranges(first_ids, get_next_ids(conn, row_columns)))
+
+    run_build_tasks(tasks, write, jobs=jobs)
+
+    # Drop the library/corner columns and build the indexes once every file of a database is written
+    if partition:
+        finished = set()
+        for task in tasks:
+            if task['key'] not in finished:
+                VIEW_DROP_COLUMNS[task['stage']](db_conn[task['key']])
+                VIEW_CREATE_INDEXES[task['stage']](db_conn[task['key']])
+                if task['stage'] == View.Liberty.value:
+                    create_timing_summaries(db_conn[task['key']])
+                create_name_index(db_conn[task['key']])
+                finished.add(task['key'])
+    else:
+        create_lib_indexes(db_conn["single"])
+        if not update or View.Liberty.value in {item['stage'] for item in tasks + stale_inputs}:
+            create_timing_summaries(db_conn["single"])
+        create_lef_indexes(db_conn["single"])
+        create_tlef_indexes(db_conn["single"])
+        create_name_index(db_conn["single"])
+        # WITHOUT ROWID tables stay in key order, so an update keeps the clustered layout
+        if args.clustered and not update:
+            cluster_lib_tables(db_conn["single"])
+            cluster_lef_tables(db_conn["single"])
+            check_foreign_keys(db_conn["single"])
 
     if partition:
         for key, conn in db_conn.items():
-            variant, tlef_corner, liberty_corner = key.split('_', 2)
-            disk_file_path = os.path.join(output_dir, f'{variant}_{tlef_corner}_{liberty_corner}.db')
-            with sqlite3.connect(disk_file_path) as disk_conn:
-                conn.backup(disk_conn)
+            disk_file_path = get_partition_path(output_dir, key)
+            write_partition(conn, disk_file_path)
+            for task in tasks:
+                if task['key'] == key:
+                    manifest.record(task, partition=disk_file_path, content=contents[key])
             print(f"Partitioned database for {key} written to {disk_file_path}")
+        for key, source_path in linked.items():
+            disk_file_path = get_partition_path(output_dir, key)
+            link_partition(source_path, disk_file_path)
+            for task in linked_tasks:
+                if task['key'] == key:
+                    manifest.record(task, partition=disk_file_path, content=contents[key])
+            print(f"Partitioned database for {key} is identical to {source_path}, linked to {disk_file_path}")
     else:
-        disk_file_path = os.path.join(output_dir, f"{pdk_name}_index.db")
-        with sqlite3.connect(disk_file_path) as disk_conn:
+        with sqlite3.connect(single_file_path) as disk_conn:
             db_conn["single"].backup(disk_conn)
-        print(f"Single in-memory database written to {disk_file_path}")
+        print(f"Single in-memory database written to {single_file_path}")
 
     for conn in db_conn.values():
         conn.commit()
         conn.close()
 
-   
+    manifest.save()
+    print(f"Build manifest written to {manifest_path}")
+    if partition:
+        report_partition_storage(manifest)
+
+    if args.parquet_dir and not partition:
+        from core.database.columnar import export_parquet
+        export_parquet(single_file_path, args.parquet_dir)
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,215 @@
+"""Scalar SQL functions registered on every PDK database connection.
+
+`nldm_value(blob, i)` reads one value of a packed float32 NLDM grid, which is how
+the `Timing_Values` view expands the `Timing_Arcs` of a database built with
+`timing_storage="blob"`.
+
+`nldm_lookup(cell, out_pin, in_pin, metric, slew, load[, partition])` interpolates an
+NLDM table of a Liberty database at an input transition and output load.
+
+`npn_signature(function)` is the Output_Pins.Function_Signature of a Liberty function
+expression, see `boolean_functions`.
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from core.database.boolean_functions import npn_signature
+
+NLDM_DTYPE = np.dtype('<f4')
+
+
+def pack_floats(values):
+    """Packs a sequence of floats into a little-endian float32 BLOB."""
+    return np.asarray(values, dtype=NLDM_DTYPE).tobytes()
+
+
+@lru_cache(maxsize=16384)
+def unpack_floats(blob):
+    """Unpacks a float32 BLOB into Python floats.
+
+    Each value is the shortest decimal that round-trips through float32, so Liberty
+    values with up to 6 significant digits come back exactly (0.01, not 0.00999999977).
+    """
+    return tuple(float(str(value)) for value in np.frombuffer(blob, dtype=NLDM_DTYPE))
+
+
+def nldm_value(blob, i):
+    if blob is None or i is None:
+        return None
+    values = unpack_floats(bytes(blob))
+    if 0 <= i < len(values):
+        return values[i]
+    return None
+
+
+NLDM_METRICS = ['fall_delay', 'rise_delay', 'average_delay', 'fall_transition', 'rise_transition']
+
+
+def interpolate_grid(index_1, index_2, values, slew, load):
+    """Bilinear interpolation of `values[i, j]` at `(slew, load)` over the grid `index_1 x index_2`.
+
+    `slew` and `load` may be scalars or arrays; points outside the grid are clamped to
+    its edges. Single-point axes are constant along that axis.
+    """
+    index_1 = np.asarray(index_1, dtype=np.float64)
+    index_2 = np.asarray(index_2, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(index_1), len(index_2))
+    slew = np.clip(np.asarray(slew, dtype=np.float64), index_1[0], index_1[-1])
+    load = np.clip(np.asarray(load, dtype=np.float64), index_2[0], index_2[-1])
+
+    def bracket(index, x):
+        if len(index) == 1:
+            return np.zeros_like(x, dtype=int), np.zeros_like(x)
+        i = np.clip(np.searchsorted(index, x, side='right') - 1, 0, len(index) - 2)
+        return i, (x - index[i]) / (index[i + 1] - index[i])
+
+    i, t = bracket(index_1, slew)
+    j, u = bracket(index_2, load)
+    i1 = np.minimum(i + 1, len(index_1) - 1)
+    j1 = np.minimum(j + 1, len(index_2) - 1)
+
+    return (
+        (1 - t) * (1 - u) * values[i, j] +
+        t * (1 - u) * values[i1, j] +
+        (1 - t) * u * values[i, j1] +
+        t * u * values[i1, j1]
+    )
+
+
+def points_to_grids(points):
+    """Turns Timing_Values rows `(Input_Transition, Output_Capacitance, *NLDM_METRICS)` of one
+    arc into `(index_1, index_2, {metric: grid})`; missing points are NaN.
+    """
+    index_1, index_2 = np.unique(points[:, 0]), np.unique(points[:, 1])
+    grids = [np.full((len(index_1), len(index_2)), np.nan) for _ in NLDM_METRICS]
+    rows, cols = np.searchsorted(index_1, points[:, 0]), np.searchsorted(index_2, points[:, 1])
+    for k, grid in enumerate(grids):
+        grid[rows, cols] = points[:, 2 + k]
+    return index_1, index_2, dict(zip(NLDM_METRICS, grids))
+
+
+class NldmLookup:
+    """The `nldm_lookup(cell, out_pin, in_pin, metric, slew, load[, partition])` SQL function of one connection.
+
+    `cell` is a Cell_ID or a cell name; a name must match a single row of Cells, so
+    databases holding several corners or libraries need the Cell_ID. `metric` is one of
+    fall_delay, rise_delay, average_delay, fall_transition or rise_transition. Returns
+    NULL when the cell, pins or arc do not exist. Grids are cached per arc.
+
+    Cell_IDs repeat across the partitions of a federated connection, so there `partition`,
+    the schema name of the partition the cell belongs to, is required and the lookup reads
+    only that partition's tables.
+    """
+
+    def __init__(self, conn, cache_size=4096):
+        # sqlite3 drops the function, and with it this reference, when the connection is closed
+        self.conn = conn
+        self.cache_size = cache_size
+        self.grids = OrderedDict()
+        # Schemas attached to the connection, read on the first call
+        self.schemas = None
+
+    def get_schema(self, cursor, partition):
+        if self.schemas is None:
+            self.schemas = [name for _, name, *_ in cursor.execute("PRAGMA database_list") if name not in ("main", "temp")]
+        if partition is not None:
+            if str(partition) not in self.schemas + ["main"]:
+                raise ValueError(f"Unknown partition {partition}, expected one of {self.schemas or ['main']}")
+            return str(partition)
+        if self.schemas:
+            raise ValueError(f"nldm_lookup on several partitions needs the partition of the cell as 7th argument, one of {self.schemas}")
+        return "main"
+
+    def resolve_cell(self, cursor, schema, cell):
+        if isinstance(cell, (int, float)):
+            return int(cell)
+        cursor.execute(f'SELECT Cell_ID FROM "{schema}".Cells WHERE Name = ? LIMIT 2', (str(cell),))
+        cell_ids = cursor.fetchall()
+        if len(cell_ids) > 1:
+            raise ValueError(f"Cell name {cell} is ambiguous, pass its Cell_ID")
+        return cell_ids[0][0] if cell_ids else None
+
+    def load_grid(self, cursor, schema, cell_id, out_pin, in_pin):
+        cursor.execute(f"""SELECT 1 FROM "{schema}".sqlite_master WHERE type = 'table' AND name = 'Timing_Arcs'""")
+        if cursor.fetchone():
+            cursor.execute(f"""
+                SELECT Index_1, Index_2, Fall_Delay, Rise_Delay, Average_Delay, Fall_Transition, Rise_Transition
+                FROM "{schema}".Timing_Arcs AS Timing_Arcs
+                JOIN "{schema}".Output_Pins AS Output_Pins ON Output_Pins.Output_Pin_ID = Timing_Arcs.Output_Pin_ID
+                WHERE Timing_Arcs.Cell_ID = ? AND Output_Pins.Output_Pin_Name = ? AND Timing_Arcs.Related_Input_Pin = ?
+                LIMIT 1""", (cell_id, out_pin, in_pin))
+            arc = cursor.fetchone()
+            if arc is None:
+                return None
+            index_1, index_2 = np.array(unpack_floats(bytes(arc[0]))), np.array(unpack_floats(bytes(arc[1])))
+            grids = [np.array(unpack_floats(bytes(blob))) for blob in arc[2:]]
+        else:
+            cursor.execute(f"""
+                SELECT Input_Transition, Output_Capacitance, Fall_Delay, Rise_Delay, Average_Delay, Fall_Transition, Rise_Transition
+                FROM "{schema}".Timing_Values AS Timing_Values
+                JOIN "{schema}".Output_Pins AS Output_Pins ON Output_Pins.Output_Pin_ID = Timing_Values.Output_Pin_ID
+                WHERE Timing_Values.Cell_ID = ? AND Output_Pins.Output_Pin_Name = ? AND Timing_Values.Related_Input_Pin = ?
+                ORDER BY Timing_Values.Timing_Value_ID""", (cell_id, out_pin, in_pin))
+            points = np.array(cursor.fetchall(), dtype=np.float64)
+            if len(points) == 0:
+                return None
+            return points_to_grids(points)
+
+        return index_1, index_2, dict(zip(NLDM_METRICS, grids))
+
+    def __call__(self, cell, out_pin, in_pin, metric, slew, load, partition=None):
+        if None in (cell, out_pin, in_pin, metric, slew, load):
+            return None
+        metric = str(metric).lower()
+        if metric not in NLDM_METRICS:
+            raise ValueError(f"Invalid NLDM metric {metric}, expected one of {NLDM_METRICS}")
+
+        cursor = self.conn.cursor()
+        schema = self.get_schema(cursor, partition)
+        cell_id = self.resolve_cell(cursor, schema, cell)
+        if cell_id is None:
+            return None
+
+        key = (schema, cell_id, str(out_pin), str(in_pin))
+        if key in self.grids:
+            self.grids.move_to_end(key)
+        else:
+            self.grids[key] = self.load_grid(cursor, *key)
+            if len(self.grids) > self.cache_size:
+                self.grids.popitem(last=False)
+
+        grid = self.grids[key]
+        if grid is None:
+            return None
+        index_1, index_2, values = grid
+        return float(interpolate_grid(index_1, index_2, values[metric], slew, load))
+
+
+SQL_FUNCTIONS = [
+    ("nldm_value", 2, nldm_value),
+    ("npn_signature", 1, npn_signature),
+]
+
+
+def register_sql_functions(conn):
+    """Registers the PDK SQL functions on a sqlite3 connection."""
+    for name, num_params, function in SQL_FUNCTIONS:
+        conn.create_function(name, num_params, function, deterministic=True)
+    # Deterministic for the lifetime of the connection, the PDK databases are not edited while served
+    nldm_lookup = NldmLookup(conn)
+    conn.create_function("nldm_lookup", 6, nldm_lookup, deterministic=True)
+    conn.create_function("nldm_lookup", 7, nldm_lookup, deterministic=True)
+    return conn
+
+
+__all__ = [
+    'pack_floats',
+    'unpack_floats',
+    'interpolate_grid',
+    'points_to_grids',
+    'NldmLookup',
+    'register_sql_functions'
+]
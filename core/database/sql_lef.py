@@ -9,106 +9,186 @@ import sqlite3
 import argparse
 
 from config.pdks import get_scl, get_lef_paths
-from core.parsers.lef.lef_parser import LefParser
-from core.database.db_utils import delete_database
-
-
-def insert_lef_data(conn, macros, scl_variant):
-    
-    cursor = conn.cursor()
-    
-    for _, macro in macros.items():
-        # Insert macro details
-        macro.info['SYMMETRY'].remove(';')
-        symmetry = ', '.join( macro.info['SYMMETRY'])
-    
-        cursor.execute('''
-        INSERT INTO Macros (Name, Class, Foreign_Name, Origin_X, Origin_Y, Size_Width, Size_Height, Symmetry, Site, Cell_Library)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            macro.name, 
-            macro.info['CLASS'], 
-            macro.info['FOREIGN'][0],  
-            float(macro.info['ORIGIN'][0]),  
-            float(macro.info['ORIGIN'][1]),  
-            float(macro.info['SIZE'][0]), 
-            float(macro.info['SIZE'][1]),  
-            symmetry, 
+from core.parsers.lef.lef_parser import LefParser, parse_lef
+from core.parsers.lef.fast_lef_parser import get_layer_rects
+from core.database.db_utils import delete_database, set_build_pragmas, RowBuilder, get_next_ids, write_rows, insert_rows, cluster_table
+
+
+LEF_ROW_COLUMNS = {
+    'Macros': ('Macro_ID', 'Name', 'Class', 'Foreign_Name', 'Origin_X', 'Origin_Y', 'Size_Width', 'Size_Height', 'Symmetry', 'Site', 'Cell_Library'),
+    'Obstructions': ('Obstruction_ID', 'Macro_ID', 'Layer'),
+    'Obstruction_Rectangles': ('Obstruction_Rect_ID', 'Obstruction_ID', 'Rect_X1', 'Rect_Y1', 'Rect_X2', 'Rect_Y2'),
+    'Pins': ('Pin_ID', 'Macro_ID', 'Name', 'Direction', 'Use', 'Antenna_Gate_Area', 'Antenna_Diff_Area'),
+    'Pin_Ports': ('Port_ID', 'Pin_ID', 'Layer'),
+    'Pin_Port_Rectangles': ('Rect_ID', 'Port_ID', 'Rect_X1', 'Rect_Y1', 'Rect_X2', 'Rect_Y2'),
+    'Pin_Geometries': ('Pin_ID', 'Macro_ID', 'Total_Area', 'BBox_X1', 'BBox_Y1', 'BBox_X2', 'BBox_Y2', 'Layers', 'Num_Rectangles'),
+    'Macro_Obstruction_Areas': ('Obstruction_Area_ID', 'Macro_ID', 'Layer', 'Total_Area', 'Num_Rectangles'),
+    'Macro_Pin_Counts': ('Pin_Count_ID', 'Macro_ID', 'Direction', 'Use', 'Num_Pins'),
+    'Pin_Rect_RTree': ('Rect_ID', 'Min_X', 'Max_X', 'Min_Y', 'Max_Y', 'Pin_ID', 'Macro_ID', 'Layer'),
+    'Obstruction_Rect_RTree': ('Obstruction_Rect_ID', 'Min_X', 'Max_X', 'Min_Y', 'Max_Y', 'Macro_ID', 'Layer'),
+}
+
+# Positions of the id columns in each row tuple and the table whose ids they hold
+LEF_ROW_IDS = {
+    'Macros': {0: 'Macros'},
+    'Obstructions': {0: 'Obstructions', 1: 'Macros'},
+    'Obstruction_Rectangles': {0: 'Obstruction_Rectangles', 1: 'Obstructions'},
+    'Pins': {0: 'Pins', 1: 'Macros'},
+    'Pin_Ports': {0: 'Pin_Ports', 1: 'Pins'},
+    'Pin_Port_Rectangles': {0: 'Pin_Port_Rectangles', 1: 'Pin_Ports'},
+    'Pin_Geometries': {0: 'Pins', 1: 'Macros'},
+    'Macro_Obstruction_Areas': {0: 'Macro_Obstruction_Areas', 1: 'Macros'},
+    'Macro_Pin_Counts': {0: 'Macro_Pin_Counts', 1: 'Macros'},
+    'Pin_Rect_RTree': {0: 'Pin_Port_Rectangles', 5: 'Pins', 6: 'Macros'},
+    'Obstruction_Rect_RTree': {0: 'Obstruction_Rectangles', 5: 'Macros'},
+}
+
+# Rollups derived from the rows above while a macro is built, so the common geometry
+# questions are answered from one row per pin, layer or pin kind instead of joining
+# and aggregating the rectangle tables
+LEF_DERIVED_TABLES = ['Pin_Geometries', 'Macro_Obstruction_Areas', 'Macro_Pin_Counts']
+
+
+def get_rectangle_area(rect):
+    return abs(rect[2] - rect[0]) * abs(rect[3] - rect[1])
+
+
+def get_rtree_box(rect):
+    """Returns (Min_X, Max_X, Min_Y, Max_Y), the column order of the R*Tree tables."""
+    return (min(rect[0], rect[2]), max(rect[0], rect[2]), min(rect[1], rect[3]), max(rect[1], rect[3]))
+
+
+def get_bounding_box(rects):
+    return (
+        min(min(rect[0], rect[2]) for rect in rects),
+        min(min(rect[1], rect[3]) for rect in rects),
+        max(max(rect[0], rect[2]) for rect in rects),
+        max(max(rect[1], rect[3]) for rect in rects)
+    )
+
+
+class LefRowBuilder(RowBuilder):
+    """Converts parsed LEF macros into row tuples for the lef tables."""
+
+    def __init__(self, next_ids=None):
+        super().__init__(LEF_ROW_COLUMNS, next_ids)
+
+    def add_rectangles(self, table, parent_id, layer, rtree_table, rtree_aux):
+        """Adds the rectangles of a layer and their R*Tree entries, returns their (x1, y1, x2, y2) coordinates."""
+        rects = get_layer_rects(layer)
+        for coords in rects:
+            rect_id = self.new_id(table)
+            self.rows[table].append((rect_id, parent_id) + coords)
+            self.rows[rtree_table].append((rect_id,) + get_rtree_box(coords) + rtree_aux)
+        return rects
+
+    def add_macro(self, macro, scl_variant):
+        symmetry = ', '.join(item for item in macro.info['SYMMETRY'] if item != ';')
+
+        macro_id = self.new_id('Macros')
+        self.rows['Macros'].append((
+            macro_id,
+            macro.name,
+            macro.info['CLASS'],
+            macro.info['FOREIGN'][0],
+            float(macro.info['ORIGIN'][0]),
+            float(macro.info['ORIGIN'][1]),
+            float(macro.info['SIZE'][0]),
+            float(macro.info['SIZE'][1]),
+            symmetry,
             macro.info['SITE'],
             scl_variant
         ))
-                
-        macro_id = cursor.lastrowid  # Retrieve the ID of the inserted macro
 
-        # Insert Macro obstruction
+        # Macro obstructions, a layer can appear in several OBS LAYER statements
+        obs_rects = {}
         if 'OBS' in macro.info.keys():
-            for obs_layer in macro.info['OBS'].info['LAYER']:      
-                cursor.execute('''
-                INSERT INTO Obstructions (Macro_ID, Layer)
-                VALUES (?, ?)
-                ''', (
-                    macro_id, 
-                    obs_layer.name, 
-                ))
-                
-                obs_layer_id = cursor.lastrowid
-                
-                for rect in obs_layer.shapes:
-                    cursor.execute('''
-                    INSERT INTO Obstruction_Rectangles (Obstruction_ID, Rect_X1, Rect_Y1, Rect_X2, Rect_Y2)
-                    VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        obs_layer_id, 
-                        float(rect.points[0][0]),  
-                        float(rect.points[0][1]),
-                        float(rect.points[1][0]),
-                        float(rect.points[1][1])                
-                    ))
-            
-        # Insert pin details
+            for obs_layer in macro.info['OBS'].info['LAYER']:
+                obs_layer_id = self.new_id('Obstructions')
+                self.rows['Obstructions'].append((obs_layer_id, macro_id, obs_layer.name))
+                rects = self.add_rectangles('Obstruction_Rectangles', obs_layer_id, obs_layer,
+                                            'Obstruction_Rect_RTree', (macro_id, obs_layer.name))
+                obs_rects.setdefault(obs_layer.name, []).extend(rects)
+
+        for layer_name, rects in obs_rects.items():
+            self.rows['Macro_Obstruction_Areas'].append((
+                self.new_id('Macro_Obstruction_Areas'),
+                macro_id,
+                layer_name,
+                sum(get_rectangle_area(rect) for rect in rects),
+                len(rects)
+            ))
+
+        # Pins and their ports
+        pin_counts = {}
         for pin_name, pin in macro.pin_dict.items():
-            cursor.execute('''
-                INSERT INTO Pins (Macro_ID, Name, Direction, Use, Antenna_Gate_Area, Antenna_Diff_Area)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
+            pin_id = self.new_id('Pins')
+            self.rows['Pins'].append((
+                pin_id,
                 macro_id,
-                pin_name,  
-                pin.info['DIRECTION'], 
-                pin.info['USE'] if 'USE' in pin.info.keys() else None,  
-                float(pin.info.get('ANTENNAGATEAREA', None)) if pin.info.get('ANTENNAGATEAREA') is not None else None ,  
-                float(pin.info.get('ANTENNADIFFAREA', None)) if pin.info.get('ANTENNADIFFAREA') is not None else None 
+                pin_name,
+                pin.info['DIRECTION'],
+                pin.info['USE'] if 'USE' in pin.info.keys() else None,
+                float(pin.info.get('ANTENNAGATEAREA', None)) if pin.info.get('ANTENNAGATEAREA') is not None else None,
+                float(pin.info.get('ANTENNADIFFAREA', None)) if pin.info.get('ANTENNADIFFAREA') is not None else None
             ))
-           
-            pin_id = cursor.lastrowid  # Retrieve the ID of the inserted pin
-            
-            # Insert port details
+
             port = pin.info['PORT']
-            for layer in port.info['LAYER']: 
-                cursor.execute('''
-                    INSERT INTO Pin_Ports (Pin_ID, Layer)
-                    VALUES (?, ?)
-                ''', (
-                    pin_id,   
-                    layer.name  
-                ))
-                
-                port_id = cursor.lastrowid  # Retrieve the ID of the inserted port
-
-                # Insert rectangle details for each port
-                for rect in layer.shapes:
-                    cursor.execute('''
-                        INSERT INTO Pin_Port_Rectangles (Port_ID, Rect_X1, Rect_Y1, Rect_X2, Rect_Y2)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        port_id, 
-                        float(rect.points[0][0]),  
-                        float(rect.points[0][1]),
-                        float(rect.points[1][0]),
-                        float(rect.points[1][1])
-                    ))
-                                    
-        macro_id = cursor.lastrowid  # Retrieve the ID of the inserted macro
-        conn.commit()
+            pin_rects = []
+            layers = []
+            for layer in port.info['LAYER']:
+                port_id = self.new_id('Pin_Ports')
+                self.rows['Pin_Ports'].append((port_id, pin_id, layer.name))
+                pin_rects.extend(self.add_rectangles('Pin_Port_Rectangles', port_id, layer,
+                                                     'Pin_Rect_RTree', (pin_id, macro_id, layer.name)))
+                if layer.name not in layers:
+                    layers.append(layer.name)
+
+            # Total_Area sums the rectangles, overlapping ones are counted twice
+            self.rows['Pin_Geometries'].append((
+                pin_id,
+                macro_id,
+                sum(get_rectangle_area(rect) for rect in pin_rects),
+                *(get_bounding_box(pin_rects) if pin_rects else (None, None, None, None)),
+                ', '.join(sorted(layers)),
+                len(pin_rects)
+            ))
+
+            pin_kind = (pin.info['DIRECTION'], pin.info['USE'] if 'USE' in pin.info.keys() else None)
+            pin_counts[pin_kind] = pin_counts.get(pin_kind, 0) + 1
+
+        for (direction, use), num_pins in pin_counts.items():
+            self.rows['Macro_Pin_Counts'].append((self.new_id('Macro_Pin_Counts'), macro_id, direction, use, num_pins))
+
+        return macro_id
+
+
+def build_lef_rows(macros, scl_variant):
+    """Returns the rows of one LEF file as `{table: [row tuples]}` with ids starting at 1."""
+    builder = LefRowBuilder()
+    for _, macro in macros.items():
+        builder.add_macro(macro, scl_variant)
+    return builder.take()
+
+
+def parse_lef_rows(lef_path, scl_variant, lef_parser="lef"):
+    """Parses a LEF file into compact row tuples, see `build_lef_rows`."""
+    return build_lef_rows(parse_lef(lef_path, parser=lef_parser).macro_dict, scl_variant)
+
+
+def insert_lef_rows(conn, rows):
+    """Inserts rows from `build_lef_rows`, shifting their ids past the rows already in the database."""
+    insert_rows(conn, LEF_ROW_COLUMNS, LEF_ROW_IDS, rows)
+
+
+def insert_lef_data(conn, macros, scl_variant):
+    """Inserts the macros of a LEF file with one `executemany` per table."""
+    builder = LefRowBuilder(get_next_ids(conn, LEF_ROW_COLUMNS))
+    for _, macro in macros.items():
+        builder.add_macro(macro, scl_variant)
+
+    write_rows(conn, LEF_ROW_COLUMNS, builder.take())
+    conn.commit()
 
 
 def get_lef_description(selected_schema=None, partition=False):
@@ -197,6 +277,85 @@ Coordinates for each obstruction rectangle.
     (Rect_X2, the x-coordinate of the upper-right corner of the rectangle. Value examples: [5.390, 5.700, 4.420]),
     (Rect_Y2, the y-coordinate of the upper-right corner of the rectangle. Value examples: [1.765, 1.290, 1.275])
 ]
+"""
+
+    pin_geometry_table = """
+# Table: Pin_Geometries
+Precomputed geometry of each pin, one row per pin. Use it instead of aggregating Pin_Ports and Pin_Port_Rectangles.
+[
+    (Pin_ID, the identifier of the pin. Value examples: [501, 502, 503]),
+    (Macro_ID, the identifier of the macro to which the pin belongs. Value examples: [101, 102, 103]),
+    (Total_Area, the sum of the areas of all rectangles of the pin over all layers. Value examples: [0.3542, 0.1265, 1.8972]),
+    (BBox_X1, the smallest x-coordinate of the pin rectangles. Value examples: [0.085, 1.325, 0.525]),
+    (BBox_Y1, the smallest y-coordinate of the pin rectangles. Value examples: [0.765, 1.035, -0.240]),
+    (BBox_X2, the largest x-coordinate of the pin rectangles. Value examples: [0.435, 1.625, 2.300]),
+    (BBox_Y2, the largest y-coordinate of the pin rectangles. Value examples: [1.325, 1.765, 0.240]),
+    (Layers, the sorted, comma-separated names of the layers the pin is drawn on. Value examples: [li1, "li1, met1", "met1, nwell"]),
+    (Num_Rectangles, the number of rectangles of the pin. Value examples: [1, 3, 12])
+]
+"""
+
+    pin_count_table = """
+# Table: Macro_Pin_Counts
+Precomputed number of pins of each macro per direction and use. Use it instead of counting Pins.
+[
+    (Pin_Count_ID, the unique identifier for each count. Value examples: [1, 2, 3]),
+    (Macro_ID, the identifier of the macro. Value examples: [101, 102, 103]),
+    (Direction, the direction of the counted pins. Value examples: [INPUT, OUTPUT, INOUT]),
+    (Use, the use of the counted pins. Value examples: [SIGNAL, POWER, GROUND, CLOCK]),
+    (Num_Pins, the number of pins of the macro with this direction and use. Value examples: [1, 2, 4])
+]
+"""
+
+    obs_area_table = """
+# Table: Macro_Obstruction_Areas
+Precomputed obstruction area of each macro per layer. Use it instead of aggregating Obstructions and Obstruction_Rectangles.
+[
+    (Obstruction_Area_ID, the unique identifier for each macro and layer. Value examples: [1, 2, 3]),
+    (Macro_ID, the identifier of the macro. Value examples: [101, 102, 103]),
+    (Layer, the obstructed layer. Value examples: [li1, met1]),
+    (Total_Area, the sum of the areas of the obstruction rectangles of the macro on this layer. Value examples: [0.8823, 2.1410, 0.0529]),
+    (Num_Rectangles, the number of obstruction rectangles of the macro on this layer. Value examples: [1, 4, 9])
+]
+"""
+    
+    pin_rtree_table = """
+# Table: Pin_Rect_RTree
+R*Tree spatial index over Pin_Port_Rectangles, one entry per rectangle. Use it for overlap and window queries on pin shapes.
+Coordinates are relative to the macro origin, so always match Macro_ID when comparing shapes of the same cell. Bounds are stored as 32-bit floats and may be widened by about 1e-7.
+[
+    (Rect_ID, the identifier of the rectangle in Pin_Port_Rectangles. Value examples: [2501, 2502, 2503]),
+    (Min_X, the smallest x-coordinate of the rectangle. Value examples: [4.245, 5.220, 4.025]),
+    (Max_X, the largest x-coordinate of the rectangle. Value examples: [5.390, 5.700, 4.420]),
+    (Min_Y, the smallest y-coordinate of the rectangle. Value examples: [1.595, 1.055, 1.010]),
+    (Max_Y, the largest y-coordinate of the rectangle. Value examples: [1.765, 1.290, 1.275]),
+    (Pin_ID, the identifier of the pin the rectangle belongs to. Value examples: [501, 502, 503]),
+    (Macro_ID, the identifier of the macro the rectangle belongs to. Value examples: [101, 102, 103]),
+    (Layer, the layer of the rectangle. Value examples: [li1, met1])
+]
+Example, pins of a cell within 0.2 of its left or right boundary:
+SELECT DISTINCT Pins.Name FROM Pin_Rect_RTree JOIN Pins ON Pins.Pin_ID = Pin_Rect_RTree.Pin_ID JOIN Macros ON Macros.Macro_ID = Pin_Rect_RTree.Macro_ID
+WHERE Macros.Name = 'sky130_fd_sc_hd__and2_1' AND (Pin_Rect_RTree.Min_X < 0.2 OR Pin_Rect_RTree.Max_X > Macros.Size_Width - 0.2)
+"""
+
+    obs_rtree_table = """
+# Table: Obstruction_Rect_RTree
+R*Tree spatial index over Obstruction_Rectangles, one entry per rectangle. Use it for overlap and window queries on obstructions.
+Coordinates are relative to the macro origin, so always match Macro_ID when comparing shapes of the same cell. Bounds are stored as 32-bit floats and may be widened by about 1e-7.
+[
+    (Obstruction_Rect_ID, the identifier of the rectangle in Obstruction_Rectangles. Value examples: [2501, 2502, 2503]),
+    (Min_X, the smallest x-coordinate of the rectangle. Value examples: [4.245, 5.220, 4.025]),
+    (Max_X, the largest x-coordinate of the rectangle. Value examples: [5.390, 5.700, 4.420]),
+    (Min_Y, the smallest y-coordinate of the rectangle. Value examples: [1.595, 1.055, 1.010]),
+    (Max_Y, the largest y-coordinate of the rectangle. Value examples: [1.765, 1.290, 1.275]),
+    (Macro_ID, the identifier of the macro the rectangle belongs to. Value examples: [101, 102, 103]),
+    (Layer, the obstructed layer. Value examples: [li1, met1])
+]
+Example, pins overlapping an obstruction on li1:
+SELECT DISTINCT Pin_Rect_RTree.Pin_ID FROM Pin_Rect_RTree JOIN Obstruction_Rect_RTree ON Obstruction_Rect_RTree.Macro_ID = Pin_Rect_RTree.Macro_ID
+AND Obstruction_Rect_RTree.Min_X <= Pin_Rect_RTree.Max_X AND Obstruction_Rect_RTree.Max_X >= Pin_Rect_RTree.Min_X
+AND Obstruction_Rect_RTree.Min_Y <= Pin_Rect_RTree.Max_Y AND Obstruction_Rect_RTree.Max_Y >= Pin_Rect_RTree.Min_Y
+WHERE Pin_Rect_RTree.Layer = 'li1' AND Obstruction_Rect_RTree.Layer = 'li1'
 """
     
     desc = """The LEF file database has the following tables: \n"""
@@ -219,9 +378,25 @@ Coordinates for each obstruction rectangle.
             
         if 'Obstruction_Rectangles' in selected_schema:
             desc += obs_rect_table
+
+        # The rollups go with the tables they summarize
+        if set(['Pins', 'Pin_Ports', 'Pin_Port_Rectangles', 'Pin_Geometries']) & set(selected_schema):
+            desc += pin_geometry_table
+
+        if set(['Pins', 'Macro_Pin_Counts']) & set(selected_schema):
+            desc += pin_count_table
+
+        if set(['Obstructions', 'Obstruction_Rectangles', 'Macro_Obstruction_Areas']) & set(selected_schema):
+            desc += obs_area_table
+
+        if set(['Pin_Port_Rectangles', 'Pin_Rect_RTree']) & set(selected_schema):
+            desc += pin_rtree_table
+
+        if set(['Obstruction_Rectangles', 'Obstruction_Rect_RTree']) & set(selected_schema):
+            desc += obs_rtree_table
    
     else:
-        desc  = macros_table + pins_table + ports_table + rect_table + obs_table + obs_rect_table
+        desc  = macros_table + pins_table + ports_table + rect_table + obs_table + obs_rect_table + pin_geometry_table + pin_count_table + obs_area_table + pin_rtree_table + obs_rtree_table
          
     return desc 
 
@@ -263,6 +438,36 @@ Obstruction layers for each macro.
 ## Obstruction_Rectangles
 Coordinates for each obstruction rectangle.
 - Columns: Rect_ID, Obstruction_ID, Rect_X1, Rect_Y1, Rect_X2, Rect_Y2
+"""
+
+    pin_geometry_table = """
+## Pin_Geometries
+Precomputed total area, bounding box and layers of each pin.
+- Columns: Pin_ID, Macro_ID, Total_Area, BBox_X1, BBox_Y1, BBox_X2, BBox_Y2, Layers, Num_Rectangles
+"""
+
+    pin_count_table = """
+## Macro_Pin_Counts
+Precomputed pin counts of each macro per direction and use.
+- Columns: Pin_Count_ID, Macro_ID, Direction, Use, Num_Pins
+"""
+
+    obs_area_table = """
+## Macro_Obstruction_Areas
+Precomputed obstruction area of each macro per layer.
+- Columns: Obstruction_Area_ID, Macro_ID, Layer, Total_Area, Num_Rectangles
+"""
+
+    pin_rtree_table = """
+## Pin_Rect_RTree
+R*Tree index over pin rectangles for overlap and window queries, coordinates are per macro.
+- Columns: Rect_ID, Min_X, Max_X, Min_Y, Max_Y, Pin_ID, Macro_ID, Layer
+"""
+
+    obs_rtree_table = """
+## Obstruction_Rect_RTree
+R*Tree index over obstruction rectangles for overlap and window queries, coordinates are per macro.
+- Columns: Obstruction_Rect_ID, Min_X, Max_X, Min_Y, Max_Y, Macro_ID, Layer
 """
     
     desc = "# LEF Database Tables\n"
@@ -280,13 +485,24 @@ Coordinates for each obstruction rectangle.
             desc += obs_table
         if 'Obstruction_Rectangles' in selected_schema:
             desc += obs_rect_table
+        if set(['Pins', 'Pin_Ports', 'Pin_Port_Rectangles', 'Pin_Geometries']) & set(selected_schema):
+            desc += pin_geometry_table
+        if set(['Pins', 'Macro_Pin_Counts']) & set(selected_schema):
+            desc += pin_count_table
+        if set(['Obstructions', 'Obstruction_Rectangles', 'Macro_Obstruction_Areas']) & set(selected_schema):
+            desc += obs_area_table
+        if set(['Pin_Port_Rectangles', 'Pin_Rect_RTree']) & set(selected_schema):
+            desc += pin_rtree_table
+        if set(['Obstruction_Rectangles', 'Obstruction_Rect_RTree']) & set(selected_schema):
+            desc += obs_rtree_table
     else:
-        desc += macros_table + pins_table + ports_table + rect_table + obs_table + obs_rect_table
+        desc += macros_table + pins_table + ports_table + rect_table + obs_table + obs_rect_table + pin_geometry_table + pin_count_table + obs_area_table + pin_rtree_table + obs_rtree_table
          
     return desc.strip()
 
 
-def create_lef_tables(conn):
+def create_lef_tables(conn, indexes=True):
+    """Creates the lef tables; pass `indexes=False` to defer `create_lef_indexes` until after a bulk load."""
     
     cursor = conn.cursor()
     
@@ -366,7 +582,80 @@ def create_lef_tables(conn):
         FOREIGN KEY (Obstruction_ID) REFERENCES Obstructions(Obstruction_ID)
     );
     ''')
+
+    # Derived rollups, see LEF_DERIVED_TABLES
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Pin_Geometries (
+        Pin_ID INTEGER PRIMARY KEY,
+        Macro_ID INTEGER NOT NULL,
+        Total_Area REAL,
+        BBox_X1 REAL,
+        BBox_Y1 REAL,
+        BBox_X2 REAL,
+        BBox_Y2 REAL,
+        Layers TEXT,
+        Num_Rectangles INTEGER,
+        FOREIGN KEY (Pin_ID) REFERENCES Pins(Pin_ID),
+        FOREIGN KEY (Macro_ID) REFERENCES Macros(Macro_ID)
+    );
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Macro_Obstruction_Areas (
+        Obstruction_Area_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        Macro_ID INTEGER NOT NULL,
+        Layer TEXT,
+        Total_Area REAL,
+        Num_Rectangles INTEGER,
+        FOREIGN KEY (Macro_ID) REFERENCES Macros(Macro_ID)
+    );
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Macro_Pin_Counts (
+        Pin_Count_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        Macro_ID INTEGER NOT NULL,
+        Direction TEXT,
+        Use TEXT,
+        Num_Pins INTEGER,
+        FOREIGN KEY (Macro_ID) REFERENCES Macros(Macro_ID)
+    );
+    ''')
+
+    # R*Tree indexes over the rectangles, filled alongside them so window and overlap
+    # queries search the tree instead of scanning the rectangle tables
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS Pin_Rect_RTree USING rtree(
+        Rect_ID,
+        Min_X, Max_X,
+        Min_Y, Max_Y,
+        +Pin_ID,
+        +Macro_ID,
+        +Layer
+    );
+    ''')
+
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS Obstruction_Rect_RTree USING rtree(
+        Obstruction_Rect_ID,
+        Min_X, Max_X,
+        Min_Y, Max_Y,
+        +Macro_ID,
+        +Layer
+    );
+    ''')
     
+    if indexes:
+        create_lef_indexes(conn)
+
+    conn.commit()
+
+
+
+def create_lef_indexes(conn):
+    """Creates the secondary indexes of the lef tables."""
+    cursor = conn.cursor()
+
     index_queries = [
         "CREATE INDEX IF NOT EXISTS idx_macro_id ON Macros (Macro_ID);",
         "CREATE INDEX IF NOT EXISTS idx_macro_name ON Macros (Name);",
@@ -376,6 +665,9 @@ def create_lef_tables(conn):
         "CREATE INDEX IF NOT EXISTS idx_port_rect_id ON Pin_Port_Rectangles (Rect_ID);",
         "CREATE INDEX IF NOT EXISTS idx_obs_id ON Obstructions (Obstruction_ID);",
         "CREATE INDEX IF NOT EXISTS idx_obs_rect_id ON Obstruction_Rectangles (Obstruction_Rect_ID);",
+        "CREATE INDEX IF NOT EXISTS idx_pin_geometry_macro_id ON Pin_Geometries (Macro_ID);",
+        "CREATE INDEX IF NOT EXISTS idx_obs_area_macro_layer ON Macro_Obstruction_Areas (Macro_ID, Layer);",
+        "CREATE INDEX IF NOT EXISTS idx_pin_count_macro_id ON Macro_Pin_Counts (Macro_ID, Direction);",
     ]
 
     for query in index_queries:
@@ -384,6 +676,95 @@ def create_lef_tables(conn):
     conn.commit()
 
 
+def populate_lef_rtrees(conn):
+    """Refills the R*Tree tables from the rectangle tables, for databases whose rectangles were not inserted by `LefRowBuilder`."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Pin_Rect_RTree;")
+    cursor.execute("""
+    INSERT INTO Pin_Rect_RTree (Rect_ID, Min_X, Max_X, Min_Y, Max_Y, Pin_ID, Macro_ID, Layer)
+    SELECT Rect_ID, MIN(Rect_X1, Rect_X2), MAX(Rect_X1, Rect_X2), MIN(Rect_Y1, Rect_Y2), MAX(Rect_Y1, Rect_Y2),
+           Pins.Pin_ID, Pins.Macro_ID, Pin_Ports.Layer
+    FROM Pin_Port_Rectangles
+    JOIN Pin_Ports ON Pin_Ports.Port_ID = Pin_Port_Rectangles.Port_ID
+    JOIN Pins ON Pins.Pin_ID = Pin_Ports.Pin_ID;
+    """)
+    cursor.execute("DELETE FROM Obstruction_Rect_RTree;")
+    cursor.execute("""
+    INSERT INTO Obstruction_Rect_RTree (Obstruction_Rect_ID, Min_X, Max_X, Min_Y, Max_Y, Macro_ID, Layer)
+    SELECT Obstruction_Rect_ID, MIN(Rect_X1, Rect_X2), MAX(Rect_X1, Rect_X2), MIN(Rect_Y1, Rect_Y2), MAX(Rect_Y1, Rect_Y2),
+           Obstructions.Macro_ID, Obstructions.Layer
+    FROM Obstruction_Rectangles
+    JOIN Obstructions ON Obstructions.Obstruction_ID = Obstruction_Rectangles.Obstruction_ID;
+    """)
+    conn.commit()
+
+
+def populate_lef_rollups(conn):
+    """Refills the LEF_DERIVED_TABLES from the pin and obstruction tables, like `populate_lef_rtrees`."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Pin_Geometries;")
+    cursor.execute("""
+    INSERT INTO Pin_Geometries (Pin_ID, Macro_ID, Total_Area, BBox_X1, BBox_Y1, BBox_X2, BBox_Y2, Layers, Num_Rectangles)
+    SELECT Pins.Pin_ID, Pins.Macro_ID,
+           COALESCE(SUM(ABS(Rect_X2 - Rect_X1) * ABS(Rect_Y2 - Rect_Y1)), 0),
+           MIN(MIN(Rect_X1, Rect_X2)), MIN(MIN(Rect_Y1, Rect_Y2)), MAX(MAX(Rect_X1, Rect_X2)), MAX(MAX(Rect_Y1, Rect_Y2)),
+           COALESCE((SELECT GROUP_CONCAT(Layer, ', ') FROM (
+               SELECT DISTINCT Layer FROM Pin_Ports AS Ports WHERE Ports.Pin_ID = Pins.Pin_ID ORDER BY Layer
+           )), ''),
+           COUNT(Pin_Port_Rectangles.Rect_ID)
+    FROM Pins
+    LEFT JOIN Pin_Ports ON Pin_Ports.Pin_ID = Pins.Pin_ID
+    LEFT JOIN Pin_Port_Rectangles ON Pin_Port_Rectangles.Port_ID = Pin_Ports.Port_ID
+    GROUP BY Pins.Pin_ID;
+    """)
+    cursor.execute("DELETE FROM Macro_Obstruction_Areas;")
+    cursor.execute("""
+    INSERT INTO Macro_Obstruction_Areas (Macro_ID, Layer, Total_Area, Num_Rectangles)
+    SELECT Obstructions.Macro_ID, Obstructions.Layer,
+           COALESCE(SUM(ABS(Rect_X2 - Rect_X1) * ABS(Rect_Y2 - Rect_Y1)), 0),
+           COUNT(Obstruction_Rectangles.Obstruction_Rect_ID)
+    FROM Obstructions
+    LEFT JOIN Obstruction_Rectangles ON Obstruction_Rectangles.Obstruction_ID = Obstructions.Obstruction_ID
+    GROUP BY Obstructions.Macro_ID, Obstructions.Layer
+    ORDER BY Obstructions.Macro_ID, MIN(Obstructions.Obstruction_ID);
+    """)
+    cursor.execute("DELETE FROM Macro_Pin_Counts;")
+    cursor.execute("""
+    INSERT INTO Macro_Pin_Counts (Macro_ID, Direction, Use, Num_Pins)
+    SELECT Macro_ID, Direction, Use, COUNT(*)
+    FROM Pins
+    GROUP BY Macro_ID, Direction, Use
+    ORDER BY Macro_ID, MIN(Pin_ID);
+    """)
+    conn.commit()
+
+
+LEF_CLUSTER_KEYS = {
+    'Macros': ['Cell_Library', 'Macro_ID'],
+    'Pins': ['Macro_ID', 'Pin_ID'],
+    'Pin_Ports': ['Pin_ID', 'Port_ID'],
+    'Pin_Port_Rectangles': ['Port_ID', 'Rect_ID'],
+    'Obstructions': ['Macro_ID', 'Obstruction_ID'],
+    'Obstruction_Rectangles': ['Obstruction_ID', 'Obstruction_Rect_ID'],
+    'Pin_Geometries': ['Macro_ID', 'Pin_ID'],
+    'Macro_Obstruction_Areas': ['Macro_ID', 'Obstruction_Area_ID'],
+    'Macro_Pin_Counts': ['Macro_ID', 'Pin_Count_ID'],
+}
+
+
+def cluster_lef_tables(conn):
+    """Stores the lef tables of a single database as WITHOUT ROWID tables led by the cell library.
+
+    Macro ids are assigned one LEF file at a time, so the child tables keyed by their
+    parent id follow the variant order of Macros. Partitions have no Cell_Library column
+    and are left as they are.
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(Macros)")]
+    if 'Cell_Library' not in columns:
+        return
+    for table, primary_key in LEF_CLUSTER_KEYS.items():
+        cluster_table(conn, table, primary_key)
+
 
 def drop_cell_library_column(conn):
     conn.execute("""
@@ -433,6 +814,26 @@ def get_lef_foreign_keys(selected_schema):
 
         if set(['Obstructions', 'Obstruction_Rectangles']).issubset(set(selected_schema)):
             fk_str+=obs_rect
+
+        # The rollups are described with the tables they summarize, see get_lef_description
+        if set(['Pins', 'Pin_Ports', 'Pin_Port_Rectangles', 'Pin_Geometries']) & set(selected_schema):
+            fk_str += 'Pins.`Pin_ID` = Pin_Geometries.`Pin_ID` \n'
+            if 'Macros' in selected_schema:
+                fk_str += 'Macros.`Macro_ID` = Pin_Geometries.`Macro_ID` \n'
+
+        if set(['Pins', 'Macro_Pin_Counts']) & set(selected_schema) and 'Macros' in selected_schema:
+            fk_str += 'Macros.`Macro_ID` = Macro_Pin_Counts.`Macro_ID` \n'
+
+        if set(['Obstructions', 'Obstruction_Rectangles', 'Macro_Obstruction_Areas']) & set(selected_schema) and 'Macros' in selected_schema:
+            fk_str += 'Macros.`Macro_ID` = Macro_Obstruction_Areas.`Macro_ID` \n'
+
+        if set(['Pin_Port_Rectangles', 'Pin_Rect_RTree']) & set(selected_schema):
+            fk_str += 'Pin_Port_Rectangles.`Rect_ID` = Pin_Rect_RTree.`Rect_ID` \n'
+            if 'Pins' in selected_schema:
+                fk_str += 'Pins.`Pin_ID` = Pin_Rect_RTree.`Pin_ID` \n'
+
+        if set(['Obstruction_Rectangles', 'Obstruction_Rect_RTree']) & set(selected_schema):
+            fk_str += 'Obstruction_Rectangles.`Obstruction_Rect_ID` = Obstruction_Rect_RTree.`Obstruction_Rect_ID` \n'
             
     else: 
         fk_str = """
@@ -441,6 +842,15 @@ Pins.Pin_ID = Pin_Ports.Pin_ID
 Pin_Ports.Port_ID = Pin_Port_Rectangles.Port_ID
 Macros.Macro_ID = Obstructions.Macro_ID
 Obstructions.Obstruction_ID = Obstruction_Rectangles.Obstruction_ID
+Pins.Pin_ID = Pin_Geometries.Pin_ID
+Macros.Macro_ID = Pin_Geometries.Macro_ID
+Macros.Macro_ID = Macro_Pin_Counts.Macro_ID
+Macros.Macro_ID = Macro_Obstruction_Areas.Macro_ID
+Pin_Port_Rectangles.Rect_ID = Pin_Rect_RTree.Rect_ID
+Pins.Pin_ID = Pin_Rect_RTree.Pin_ID
+Obstruction_Rectangles.Obstruction_Rect_ID = Obstruction_Rect_RTree.Obstruction_Rect_ID
+Macros.Macro_ID = Pin_Rect_RTree.Macro_ID
+Macros.Macro_ID = Obstruction_Rect_RTree.Macro_ID
 """
     return fk_str 
 
@@ -468,13 +878,16 @@ def main():
     if not partition:
         conn = sqlite3.connect(":memory:")
         db_conn["single"] = conn
-        create_lef_tables(conn) 
+        create_lef_tables(conn, indexes=False) 
 
     for variant in scl_variants:
         if partition:
             conn = sqlite3.connect(":memory:")
             db_conn[variant.value] = conn
-            create_lef_tables(conn)
+            create_lef_tables(conn, indexes=False)
+
+    for conn in db_conn.values():
+        set_build_pragmas(conn)
 
     for variant in tqdm.tqdm(scl_variants):
         lef_paths = get_lef_paths(pdk_name, variant.value)
@@ -486,10 +899,13 @@ def main():
 
             if partition:
                 insert_lef_data(db_conn[variant.value], lef_parser.macro_dict, scl_variant=variant.value)
-                drop_cell_library_column(db_conn[variant.value])
             else:
                 insert_lef_data(db_conn["single"], lef_parser.macro_dict, scl_variant=variant.value)
 
+    for conn in db_conn.values():
+        if partition:
+            drop_cell_library_column(conn)
+        create_lef_indexes(conn)
 
     if partition:
         for variant_name, conn in db_conn.items():
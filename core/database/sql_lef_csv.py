@@ -6,7 +6,7 @@ from enum import Enum
 from tqdm import tqdm
 
 from core.parsers.lef.lef_parser import LefParser
-from core.database.sql_lef import create_lef_tables
+from core.database.sql_lef import create_lef_tables, populate_lef_rtrees, populate_lef_rollups
 from core.database.db_utils import delete_database, import_csv_to_sql, write_to_csv, write_to_csv_header
 
 
@@ -205,6 +205,8 @@ def main():
     ]:
         import_csv_to_sql(conn, os.path.join(output_dir, file_name), table, columns)
 
+    populate_lef_rtrees(conn)
+    populate_lef_rollups(conn)
     
     validate_foreign_keys(conn)
 
@@ -2,160 +2,328 @@
 """
 import os
 import sys
+import time
 import tqdm
 import sqlite3
 import argparse 
+from itertools import groupby
+
+import numpy as np
 
 from config.pdks import get_scl, get_pdk_path, get_lib_paths
 from config.sky130 import SCLVariants, View, get_sky130_pdk_path, get_sky130_lib_paths
 from config.asap7nm import ASAP7nmSCLVariants, get_asap7nm_pdk_path, get_asap7nm_lib_paths
 from core.parsers.lib.lib_parser import parse_liberty_file
-from core.database.db_utils import delete_database
+from core.database.boolean_functions import get_function_signature
+from core.database.sql_functions import NLDM_METRICS, pack_floats, register_sql_functions, interpolate_grid, points_to_grids
+from core.database.db_utils import delete_database, run_build_tasks, set_build_pragmas, RowBuilder, get_next_ids, write_rows, insert_rows, cluster_table
 
 
-def insert_lib_data(conn, cells, operating_conditions, cell_varaint, separate_timing_tables=False, unified_timing_tables=True):
-    """Inserts cell data into the database."""
-    
+LIB_ROW_COLUMNS = {
+    'Operating_Conditions': ('Condition_ID', 'Name', 'Voltage', 'Process', 'Temperature', 'Tree_Type', 'Cell_Library'),
+    'Cells': ('Cell_ID', 'Name', 'Drive_Strength', 'Area', 'Cell_Footprint', 'Leakage_Power', 'Driver_Waveform_Fall', 'Driver_Waveform_Rise', 'Is_Buffer', 'Is_Inverter', 'Is_Flip_Flop', 'Is_Scan_Enabled_Flip_Flop', 'Condition_ID'),
+    'Input_Pins': ('Input_Pin_ID', 'Cell_ID', 'Input_Pin_Name', 'Clock', 'Capacitance', 'Fall_Capacitance', 'Rise_Capacitance', 'Max_Transition', 'Related_Power_Pin', 'Related_Ground_Pin'),
+    'Output_Pins': ('Output_Pin_ID', 'Cell_ID', 'Output_Pin_Name', 'Function', 'Function_Signature', 'Function_Inputs', 'Max_Capacitance', 'Max_Transition', 'Power_Down_Function', 'Related_Power_Pin', 'Related_Ground_Pin'),
+    'Timing_Values': ('Timing_Value_ID', 'Cell_ID', 'Output_Pin_ID', 'Related_Input_Pin', 'Input_Transition', 'Output_Capacitance', 'Fall_Delay', 'Rise_Delay', 'Average_Delay', 'Fall_Transition', 'Rise_Transition'),
+}
+
+# With timing_storage="blob" every NLDM arc is one Timing_Arcs row holding its index vectors
+# and value grids as packed float32 BLOBs, Timing_Values is then a view over Timing_Arcs
+TIMING_ARC_COLUMNS = ('Timing_Arc_ID', 'Cell_ID', 'Output_Pin_ID', 'Related_Input_Pin', 'Index_1_Size', 'Index_2_Size', 'Index_1', 'Index_2', 'Fall_Delay', 'Rise_Delay', 'Average_Delay', 'Fall_Transition', 'Rise_Transition')
+
+TIMING_STORAGES = ['rows', 'blob']
+
+# Largest NLDM grid (points per arc) the Timing_Values view can expand
+MAX_NLDM_POINTS = 1024
+
+# Positions of the id columns in each row tuple and the table whose ids they hold
+LIB_ROW_IDS = {
+    'Operating_Conditions': {0: 'Operating_Conditions'},
+    'Cells': {0: 'Cells', 12: 'Operating_Conditions'},
+    'Input_Pins': {0: 'Input_Pins', 1: 'Cells'},
+    'Output_Pins': {0: 'Output_Pins', 1: 'Cells'},
+    'Timing_Values': {0: 'Timing_Values', 1: 'Cells', 2: 'Output_Pins'},
+    'Timing_Arcs': {0: 'Timing_Arcs', 1: 'Cells', 2: 'Output_Pins'},
+}
+
+
+def get_lib_row_columns(timing_storage="rows"):
+    """Returns the insert columns of the lib tables for the given timing storage."""
+    if timing_storage == "rows":
+        return LIB_ROW_COLUMNS
+    elif timing_storage == "blob":
+        columns = {table: table_columns for table, table_columns in LIB_ROW_COLUMNS.items() if table != 'Timing_Values'}
+        columns['Timing_Arcs'] = TIMING_ARC_COLUMNS
+        return columns
+    else:
+        raise ValueError(f"Invalid timing storage {timing_storage}, expected one of {TIMING_STORAGES}")
+
+
+def get_timing_storage(conn):
+    """Returns the timing storage ("rows" or "blob") a lib database was created with."""
     cursor = conn.cursor()
-    
-    # Insert the given operating condition into the 'OperatingConditions' table
-    cursor.execute("""
-        INSERT INTO Operating_Conditions (Name, Voltage, Process, Temperature, Tree_Type, Cell_Library) 
-        VALUES (?, ?, ?, ?, ?, ?)""", 
-        (operating_conditions['name'], operating_conditions['voltage'], operating_conditions['process'], operating_conditions['temperature'], 
-        operating_conditions['tree_type'], cell_varaint)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Timing_Arcs'")
+    return "blob" if cursor.fetchone() else "rows"
+
+
+def pack_timing_arc(timing_rows):
+    """Packs the unified rows of one NLDM arc into `(index_1_size, index_2_size, blobs...)`.
+
+    The rows are ordered index_1-major, so the index_2 vector is the first run of rows
+    sharing the same index_1 value.
+    """
+    index_2_size = 1
+    while index_2_size < len(timing_rows) and timing_rows[index_2_size]['index_1'] == timing_rows[0]['index_1']:
+        index_2_size += 1
+    index_1_size = len(timing_rows) // index_2_size
+    if index_1_size * index_2_size != len(timing_rows):
+        raise ValueError(f"Cannot pack a ragged NLDM table of {len(timing_rows)} points")
+    if len(timing_rows) > MAX_NLDM_POINTS:
+        raise ValueError(f"NLDM table of {len(timing_rows)} points exceeds {MAX_NLDM_POINTS}")
+
+    return (
+        index_1_size,
+        index_2_size,
+        pack_floats([row['index_1'] for row in timing_rows[::index_2_size]]),
+        pack_floats([row['index_2'] for row in timing_rows[:index_2_size]]),
+        pack_floats([row['fall_delay'] for row in timing_rows]),
+        pack_floats([row['rise_delay'] for row in timing_rows]),
+        pack_floats([row['average_delay'] for row in timing_rows]),
+        pack_floats([row['fall_transition'] for row in timing_rows]),
+        pack_floats([row['rise_transition'] for row in timing_rows]),
     )
 
-    cond_id = cursor.lastrowid
-    
 
-    for cell in tqdm.tqdm(cells): 
-   
-        cursor.execute("""
-            INSERT INTO Cells (Name, Drive_Strength, Area, Cell_Footprint, Leakage_Power, Driver_Waveform_Fall, Driver_Waveform_Rise, Is_Buffer, Is_Inverter, Is_Flip_Flop, Is_Scan_Enabled_Flip_Flop,  Condition_ID)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (str(cell['name']), cell['drive'], float(cell['area']), str(cell['cell_footprint']), float(cell['cell_leakage_power']), str(cell['driver_waveform_fall']), str(cell['driver_waveform_rise']), bool(cell['is_buffer']), bool(cell['is_inverter']), bool(cell['is_flip_flop']), bool(cell['is_scan_enabled_flip_flop']), cond_id))
+def get_output_pin_signature(pin, input_pins):
+    """Returns the `(Function_Signature, Function_Inputs)` of an output pin, see `get_function_signature`.
 
-        # Get the last inserted cell ID to use as foreign key for pins
-        cell_id = cursor.lastrowid
-        
-        # Insert the pins data associated with this cell
-        for pin in tqdm.tqdm(cell['pins']):
+    Three-state outputs get none, their `function` leaves out the enable.
+    """
+    if 'three_state' in pin:
+        return None, None
+    return get_function_signature(pin.get('function'), input_pins)
+
+
+class LibRowBuilder(RowBuilder):
+    """Converts parsed Liberty cells into row tuples for the lib tables."""
+
+    def __init__(self, next_ids=None, timing_storage="rows"):
+        super().__init__(get_lib_row_columns(timing_storage), next_ids)
+        self.timing_storage = timing_storage
+
+    def add_operating_conditions(self, operating_conditions, cell_varaint):
+        cond_id = self.new_id('Operating_Conditions')
+        self.rows['Operating_Conditions'].append((
+            cond_id, operating_conditions['name'], operating_conditions['voltage'], operating_conditions['process'],
+            operating_conditions['temperature'], operating_conditions['tree_type'], cell_varaint
+        ))
+        return cond_id
+
+    def add_cell(self, cell, cond_id):
+        cell_id = self.new_id('Cells')
+        input_pins = tuple(sorted(pin['name'] for pin in cell['pins'] if pin['direction'] in ("input", "inout")))
+        self.rows['Cells'].append((
+            cell_id, str(cell['name']), cell['drive'], float(cell['area']), str(cell['cell_footprint']), float(cell['cell_leakage_power']),
+            str(cell['driver_waveform_fall']), str(cell['driver_waveform_rise']), bool(cell['is_buffer']), bool(cell['is_inverter']),
+            bool(cell['is_flip_flop']), bool(cell['is_scan_enabled_flip_flop']), cond_id
+        ))
+
+        for pin in cell['pins']:
             if pin['direction'] == "input":
                 is_clock = True if pin.get('clock', 'false').lower() == "true" else False
-                related_power_pin = pin.get('related_power_pin', "")
-                related_ground_pin =  pin.get('related_ground_pin', "")
-                cursor.execute("""
-                    INSERT INTO Input_Pins (Cell_ID, Input_Pin_Name, Clock, Capacitance, Fall_Capacitance, Rise_Capacitance, Max_Transition, Related_Power_Pin, Related_Ground_Pin)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+                self.rows['Input_Pins'].append((
+                    self.new_id('Input_Pins'),
                     cell_id,
                     str(pin['name']),
                     bool(is_clock),
                     float(pin['capacitance']),
                     float(pin['fall_capacitance']) if 'fall_capacitance' in pin.keys() else None,
-                    float(pin['rise_capacitance'])  if 'rise_capacitance' in pin.keys() else None,
+                    float(pin['rise_capacitance']) if 'rise_capacitance' in pin.keys() else None,
                     float(pin['max_transition']) if 'max_transition' in pin.keys() else None,
-                    str(related_power_pin),
-                    str(related_ground_pin)
+                    str(pin.get('related_power_pin', "")),
+                    str(pin.get('related_ground_pin', ""))
                 ))
-                
-                pin_id = cursor.lastrowid
-
-                # if 'internal_power' in pin.keys(): 
-                #     for power_type in pin['internal_power'].keys(): 
-                #         indicies =  pin['internal_power'][power_type]['index_1']
-                #         values = pin['internal_power'][power_type]['values']
-                                                
-                #         for idx, value in zip(indicies, values):
-                #             cursor.execute("""
-                #             INSERT INTO Input_Pin_Internal_Powers (Input_Pin_ID, Power_Type, Index_1, Value)
-                #             VALUES (?, ?, ?, ?)               
-                #             """, (
-                #                 pin_id, 
-                #                 power_type,
-                #                 idx, 
-                #                 value
-                #             )) 
-                                    
-            elif pin['direction'] == "output": 
-                related_power_pin = pin.get('related_power_pin', "")
-                related_ground_pin =  pin.get('related_ground_pin', "")
-                cursor.execute("""
-                    INSERT INTO Output_Pins (Cell_ID, Output_Pin_Name, Function, Max_Capacitance, Max_Transition, Power_Down_Function, Related_Power_Pin, Related_Ground_Pin)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+
+            elif pin['direction'] == "output":
+                pin_id = self.new_id('Output_Pins')
+                function_signature, function_inputs = get_output_pin_signature(pin, input_pins)
+                self.rows['Output_Pins'].append((
+                    pin_id,
                     cell_id,
                     str(pin['name']),
                     str(pin.get('function', None)),
+                    function_signature,
+                    function_inputs,
                     float(pin['max_capacitance']) if 'max_capacitance' in pin.keys() else None,
                     float(pin['max_transition']) if 'max_transition' in pin.keys() else None,
                     str(pin['power_down_function']) if 'power_down_function' in pin.keys() else None,
-                    str(related_power_pin),
-                    str(related_ground_pin)    
+                    str(pin.get('related_power_pin', "")),
+                    str(pin.get('related_ground_pin', ""))
                 ))
-           
-                pin_id = cursor.lastrowid
-
-            if 'timing' in pin.keys():
-                for related_pin in tqdm.tqdm(pin['timing'].keys()):
-                    if unified_timing_tables: 
-                        for row in pin['timing'][related_pin]: 
-                            cursor.execute("""
-                            INSERT INTO Timing_Values (Cell_ID, Output_Pin_ID, Related_Input_Pin, Input_Transition, Output_Capacitance, Fall_Delay, Rise_Delay, Average_Delay, Fall_Transition, Rise_Transition)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            """, (
-                                cell_id,
-                                pin_id,
-                                str(related_pin),
-                                float(row['index_1']),
-                                float(row['index_2']),
-                                float(row['fall_delay']),
-                                float(row['rise_delay']),
-                                float(row['average_delay']),
-                                float(row['fall_transition']),
-                                float(row['rise_transition']),
-                            ))
-                    else: 
-                        for timing_type, table in tqdm.tqdm(pin['timing'][related_pin].items()):
-                            cursor.execute("""
-                            INSERT INTO Timing_Tables (Output_Pin_ID, Timing_Type, Related_Input_Pin, Index_1_Label, Index_2_Label)
-                            VALUES (?, ?, ?, ?, ?)
-                            """, (
-                                pin_id,
-                                str(timing_type),
-                                str(related_pin),
-                                str(table['index_1_label']),
-                                str(table['index_2_label'])
-                            ))
-    
-                            timing_id = cursor.lastrowid
-
-                            rows = len(table['data'])
-                            cols = len(table['data'][0])
-                            for i in range(len(table['index_1'][0])):
-                                for j in range(len(table['index_2'][0])):
-                                    index_1_value = table['index_1'][0][i]
-                                    index_2_value = table['index_2'][0][j]                                
-                                    if j < rows and i < cols:
-                                        timing_value =  table['data'][j][i]
-
-                                        cursor.execute("""
-                                            INSERT INTO Timing_Table_Values (Timing_Table_ID, Index_1, Index_2, Value)
-                                            VALUES (?, ?, ?, ?)
-                                        """, (
-                                            timing_id,
-                                            float(index_1_value),
-                                            float(index_2_value),
-                                            float(timing_value)
-                                        ))
-                                    # else:
-                                    #     print(f"Warning: Indices out of bounds: j={j}, i={i}. Skipping this entry.")
 
+                for related_pin, timing_rows in pin.get('timing', {}).items():
+                    if self.timing_storage == "blob":
+                        if timing_rows:
+                            self.rows['Timing_Arcs'].append((self.new_id('Timing_Arcs'), cell_id, pin_id, str(related_pin)) + pack_timing_arc(timing_rows))
+                        continue
+
+                    for row in timing_rows:
+                        self.rows['Timing_Values'].append((
+                            self.new_id('Timing_Values'),
+                            cell_id,
+                            pin_id,
+                            str(related_pin),
+                            float(row['index_1']),
+                            float(row['index_2']),
+                            float(row['fall_delay']),
+                            float(row['rise_delay']),
+                            float(row['average_delay']),
+                            float(row['fall_transition']),
+                            float(row['rise_transition']),
+                        ))
+
+        return cell_id
+
+
+def build_lib_rows(cells, operating_conditions, cell_varaint, timing_storage="rows"):
+    """Returns the rows of one Liberty corner as `{table: [row tuples]}` with ids starting at 1."""
+    builder = LibRowBuilder(timing_storage=timing_storage)
+    cond_id = builder.add_operating_conditions(operating_conditions, cell_varaint)
+    for cell in cells:
+        builder.add_cell(cell, cond_id)
+    return builder.take()
+
+
+def parse_liberty_rows(corner_path, variant_name, lib_parser="liberty", timing_storage="rows"):
+    """Parses a Liberty corner into compact row tuples, see `build_lib_rows`."""
+    cells, operating_conditions = parse_liberty_file(corner_path, stream=True, parser=lib_parser)
+    return build_lib_rows(cells, operating_conditions, variant_name, timing_storage=timing_storage)
+
+
+def insert_lib_rows(conn, rows):
+    """Inserts rows from `build_lib_rows`, shifting their ids past the rows already in the database."""
+    insert_rows(conn, get_lib_row_columns(get_timing_storage(conn)), LIB_ROW_IDS, rows)
+
+
+def insert_lib_data(conn, cells, operating_conditions, cell_varaint, separate_timing_tables=False, unified_timing_tables=True, batch_size=64):
+    """Inserts cell data into the database.
+
+    `cells` can be any iterable of cell dicts, including the generator returned by
+    `parse_liberty_file(..., stream=True)`; rows are written every `batch_size` cells
+    so a streamed corner is never held in memory as a whole.
+    """
+    if not unified_timing_tables:
+        raise ValueError("The Liberty parser only produces unified timing tables (Timing_Values)")
+
+    timing_storage = get_timing_storage(conn)
+    row_columns = get_lib_row_columns(timing_storage)
+    builder = LibRowBuilder(get_next_ids(conn, row_columns), timing_storage=timing_storage)
+    cond_id = builder.add_operating_conditions(operating_conditions, cell_varaint)
+
+    for i, cell in enumerate(tqdm.tqdm(cells), start=1):
+        builder.add_cell(cell, cond_id)
+        if i % batch_size == 0:
+            write_rows(conn, row_columns, builder.take())
+
+    write_rows(conn, row_columns, builder.take())
     conn.commit()
 
 
-def create_lib_tables(conn, partition=False):
+def benchmark_lib_insert(corner_path, lib_parser="liberty", db_path=":memory:"):
+    """Times loading one Liberty corner row by row (indexes first, default pragmas) and in bulk
+    (`executemany`, build pragmas, indexes after the load). Returns rows per second of both.
+    """
+    cells, operating_conditions = parse_liberty_file(corner_path, parser=lib_parser)
+    rows = build_lib_rows(cells, operating_conditions, os.path.basename(corner_path))
+    row_count = sum(len(table_rows) for table_rows in rows.values())
+
+    results = {}
+    for mode in ["per_row", "bulk"]:
+        if db_path != ":memory:" and os.path.exists(db_path):
+            os.remove(db_path)
+        conn = sqlite3.connect(db_path)
+
+        start = time.perf_counter()
+        if mode == "per_row":
+            create_lib_tables(conn)
+            cursor = conn.cursor()
+            for table, columns in LIB_ROW_COLUMNS.items():
+                query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+                for row in rows[table]:
+                    cursor.execute(query, row)
+            conn.commit()
+        else:
+            create_lib_tables(conn, indexes=False)
+            set_build_pragmas(conn)
+            write_rows(conn, LIB_ROW_COLUMNS, rows)
+            conn.commit()
+            create_lib_indexes(conn)
+        elapsed = time.perf_counter() - start
+        conn.close()
+
+        results[mode] = row_count / elapsed
+        print(f"{mode:<8} {row_count} rows in {elapsed:.3f}s ({results[mode]:,.0f} rows/s)")
+
+    print(f"speedup: {results['bulk'] / results['per_row']:.2f}x")
+    return results
+
+
+def benchmark_timing_storage(corner_path, output_dir, lib_parser="liberty"):
+    """Compares the rows and blob timing storages on one Liberty corner: build time,
+    database size, cold `backup()` into memory and a per-cell Timing_Values query.
+    """
+    cells, operating_conditions = parse_liberty_file(corner_path, parser=lib_parser)
+    cell_name = cells[len(cells) // 2]['name']
+
+    for timing_storage in TIMING_STORAGES:
+        db_path = os.path.join(output_dir, f"benchmark_lib_{timing_storage}.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+        start = time.perf_counter()
+        conn = sqlite3.connect(":memory:")
+        create_lib_tables(conn, indexes=False, timing_storage=timing_storage)
+        set_build_pragmas(conn)
+        write_rows(conn, get_lib_row_columns(timing_storage), build_lib_rows(cells, operating_conditions, "benchmark", timing_storage=timing_storage))
+        conn.commit()
+        create_lib_indexes(conn)
+        build_time = time.perf_counter() - start
+
+        with sqlite3.connect(db_path) as disk_conn:
+            conn.backup(disk_conn)
+        conn.close()
+        db_size = os.path.getsize(db_path)
+
+        start = time.perf_counter()
+        disk_conn = sqlite3.connect(db_path)
+        memory_conn = register_sql_functions(sqlite3.connect(":memory:"))
+        disk_conn.backup(memory_conn)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        timing_rows = memory_conn.execute("""
+            SELECT Timing_Values.* FROM Timing_Values
+            JOIN Cells ON Cells.Cell_ID = Timing_Values.Cell_ID
+            WHERE Cells.Name = ?""", (cell_name,)).fetchall()
+        query_time = time.perf_counter() - start
+
+        disk_conn.close()
+        memory_conn.close()
+        os.remove(db_path)
+
+        print(f"{timing_storage:<5} build {build_time:.3f}s, size {db_size / 1e6:.2f} MB, backup() {load_time * 1e3:.1f} ms, "
+              f"{len(timing_rows)} Timing_Values rows of {cell_name} in {query_time * 1e3:.2f} ms")
+
+
+def create_lib_tables(conn, partition=False, indexes=True, timing_storage="rows"):
+    """Creates the lib tables; pass `indexes=False` to defer `create_lib_indexes` until after a bulk load.
+
+    With `timing_storage="blob"` the NLDM tables go to Timing_Arcs and Timing_Values is
+    created as a view expanding them, which needs `register_sql_functions` on every
+    connection that reads it.
+    """
+    if timing_storage not in TIMING_STORAGES:
+        raise ValueError(f"Invalid timing storage {timing_storage}, expected one of {TIMING_STORAGES}")
     
     cursor = conn.cursor()
     
@@ -214,6 +382,8 @@ def create_lib_tables(conn, partition=False):
         Cell_ID INTEGER,
         Output_Pin_Name TEXT,
         Function TEXT,
+        Function_Signature TEXT,  -- NPN-canonical truth table of Function, see boolean_functions
+        Function_Inputs INTEGER,
         Max_Capacitance REAL,
         Max_Transition REAL,
         Power_Down_Function TEXT,
@@ -235,24 +405,82 @@ def create_lib_tables(conn, partition=False):
     """)
     
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS Timing_Values  (
-        Timing_Value_ID INTEGER PRIMARY KEY AUTOINCREMENT,
-        Cell_ID INTEGER,             -- Foreign key referencing the cell
-        Output_Pin_ID INTEGER,       -- Foreign key referencing the output pin
-        Related_Input_Pin TEXT,      -- Name of the input pin
-        Input_Transition REAL,       -- The first index dimension (input transition)
-        Output_Capacitance REAL,     -- The second index dimension (output capacitance)
-        Fall_Delay REAL,             -- Fall propagation delay value
-        Rise_Delay REAL,             -- Rise propagation delay value
-        Average_Delay REAL,          -- Average propagation delay value
-        Fall_Transition REAL,        -- Fall transition time value
-        Rise_Transition REAL,        -- Rise transition time value
-        FOREIGN KEY (Cell_ID) REFERENCES Cells (Cell_ID),
-        FOREIGN KEY (Output_Pin_ID) REFERENCES Output_Pins (Output_Pin_ID)
-    );            
-    """)
-    
+    if timing_storage == "rows":
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Timing_Values  (
+            Timing_Value_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Cell_ID INTEGER,             -- Foreign key referencing the cell
+            Output_Pin_ID INTEGER,       -- Foreign key referencing the output pin
+            Related_Input_Pin TEXT,      -- Name of the input pin
+            Input_Transition REAL,       -- The first index dimension (input transition)
+            Output_Capacitance REAL,     -- The second index dimension (output capacitance)
+            Fall_Delay REAL,             -- Fall propagation delay value
+            Rise_Delay REAL,             -- Rise propagation delay value
+            Average_Delay REAL,          -- Average propagation delay value
+            Fall_Transition REAL,        -- Fall transition time value
+            Rise_Transition REAL,        -- Rise transition time value
+            FOREIGN KEY (Cell_ID) REFERENCES Cells (Cell_ID),
+            FOREIGN KEY (Output_Pin_ID) REFERENCES Output_Pins (Output_Pin_ID)
+        );            
+        """)
+    else:
+        register_sql_functions(conn)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Timing_Arcs (
+            Timing_Arc_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Cell_ID INTEGER,             -- Foreign key referencing the cell
+            Output_Pin_ID INTEGER,       -- Foreign key referencing the output pin
+            Related_Input_Pin TEXT,      -- Name of the input pin
+            Index_1_Size INTEGER,        -- Number of input transition points
+            Index_2_Size INTEGER,        -- Number of output capacitance points
+            Index_1 BLOB,                -- float32 input transition vector
+            Index_2 BLOB,                -- float32 output capacitance vector
+            Fall_Delay BLOB,             -- float32 grids, Index_1 major
+            Rise_Delay BLOB,
+            Average_Delay BLOB,
+            Fall_Transition BLOB,
+            Rise_Transition BLOB,
+            FOREIGN KEY (Cell_ID) REFERENCES Cells (Cell_ID),
+            FOREIGN KEY (Output_Pin_ID) REFERENCES Output_Pins (Output_Pin_ID)
+        );
+        """)
+
+        cursor.execute("CREATE TABLE IF NOT EXISTS Timing_Grid_Points (Point INTEGER PRIMARY KEY);")
+        cursor.executemany("INSERT OR IGNORE INTO Timing_Grid_Points (Point) VALUES (?)", [(point,) for point in range(MAX_NLDM_POINTS)])
+
+        cursor.execute(f"""
+        CREATE VIEW IF NOT EXISTS Timing_Values AS
+        SELECT
+            Timing_Arcs.Timing_Arc_ID * {MAX_NLDM_POINTS} + Timing_Grid_Points.Point AS Timing_Value_ID,
+            Timing_Arcs.Cell_ID AS Cell_ID,
+            Timing_Arcs.Output_Pin_ID AS Output_Pin_ID,
+            Timing_Arcs.Related_Input_Pin AS Related_Input_Pin,
+            nldm_value(Timing_Arcs.Index_1, Timing_Grid_Points.Point / Timing_Arcs.Index_2_Size) AS Input_Transition,
+            nldm_value(Timing_Arcs.Index_2, Timing_Grid_Points.Point % Timing_Arcs.Index_2_Size) AS Output_Capacitance,
+            nldm_value(Timing_Arcs.Fall_Delay, Timing_Grid_Points.Point) AS Fall_Delay,
+            nldm_value(Timing_Arcs.Rise_Delay, Timing_Grid_Points.Point) AS Rise_Delay,
+            nldm_value(Timing_Arcs.Average_Delay, Timing_Grid_Points.Point) AS Average_Delay,
+            nldm_value(Timing_Arcs.Fall_Transition, Timing_Grid_Points.Point) AS Fall_Transition,
+            nldm_value(Timing_Arcs.Rise_Transition, Timing_Grid_Points.Point) AS Rise_Transition
+        FROM Timing_Arcs
+        JOIN Timing_Grid_Points ON Timing_Grid_Points.Point < Timing_Arcs.Index_1_Size * Timing_Arcs.Index_2_Size;
+        """)
+
+    if indexes:
+        create_lib_indexes(conn, partition=partition)
+
+    conn.commit()
+
+
+def create_lib_indexes(conn, partition=False):
+    """Creates the secondary indexes of the lib tables.
+
+    With `partition` the Operating_Conditions indexes are skipped, since
+    `drop_cell_library_corner_column` removes that table and `Cells.Condition_ID`.
+    """
+    cursor = conn.cursor()
+
     index_queries = [
         "CREATE INDEX IF NOT EXISTS idx_op_cond_id ON Operating_Conditions (Condition_ID);",
         "CREATE INDEX IF NOT EXISTS idx_op_cond_volt ON Operating_Conditions (Voltage);",
@@ -267,18 +495,188 @@ def create_lib_tables(conn, partition=False):
         "CREATE INDEX IF NOT EXISTS idx_output_pin_id ON Output_Pins (Output_Pin_ID);",
         "CREATE INDEX IF NOT EXISTS idx_output_pin_name ON Output_Pins (Output_Pin_Name);",
         "CREATE INDEX IF NOT EXISTS idx_output_pin_cell_id ON Output_Pins (Cell_ID);",
+        "CREATE INDEX IF NOT EXISTS idx_output_pin_function_signature ON Output_Pins (Function_Signature);",
         "CREATE INDEX IF NOT EXISTS idx_timing_val_id ON Timing_Values (Timing_Value_ID);",
         "CREATE INDEX IF NOT EXISTS idx_timing_cell_id ON Timing_Values (Cell_ID);",
         "CREATE INDEX IF NOT EXISTS idx_timing_output_pin_id ON Timing_Values (Output_Pin_ID);",
         "CREATE INDEX IF NOT EXISTS idx_timing_related_input_pin ON Timing_Values (Related_Input_Pin);",
     ]
 
+    if get_timing_storage(conn) == "blob":
+        index_queries = [query for query in index_queries if "Timing_Values" not in query] + [
+            "CREATE INDEX IF NOT EXISTS idx_timing_arc_cell_id ON Timing_Arcs (Cell_ID);",
+            "CREATE INDEX IF NOT EXISTS idx_timing_arc_output_pin_id ON Timing_Arcs (Output_Pin_ID);",
+            "CREATE INDEX IF NOT EXISTS idx_timing_arc_related_input_pin ON Timing_Arcs (Related_Input_Pin);",
+        ]
+
     for query in index_queries:
+        if partition and ("Operating_Conditions" in query or "Condition_ID" in query):
+            continue
         cursor.execute(query)
 
     conn.commit()
 
 
+# Cell ids are assigned one Liberty file at a time, so keying the pins and timing rows by
+# Cell_ID keeps every corner of the single database in its own run of pages
+LIB_CLUSTER_KEYS = {
+    'Cells': ['Condition_ID', 'Cell_ID'],
+    'Input_Pins': ['Cell_ID', 'Input_Pin_ID'],
+    'Output_Pins': ['Cell_ID', 'Output_Pin_ID'],
+    'Timing_Values': ['Cell_ID', 'Output_Pin_ID', 'Timing_Value_ID'],
+    'Timing_Arcs': ['Cell_ID', 'Output_Pin_ID', 'Timing_Arc_ID'],
+}
+
+
+def cluster_lib_tables(conn):
+    """Stores the lib tables of a single database as WITHOUT ROWID tables led by (Condition_ID, Cell_ID).
+
+    Corner-restricted queries then read contiguous pages. Partitions hold a single corner
+    and no Condition_ID column, so they are left as they are.
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(Cells)")]
+    if 'Condition_ID' not in columns:
+        return
+    for table, primary_key in LIB_CLUSTER_KEYS.items():
+        cluster_table(conn, table, primary_key)
+
+
+# Rounds of the output transition fed back as input transition when computing FO4 delays
+FO4_ITERATIONS = 3
+
+
+def iter_timing_grids(conn, chunk_size=65536):
+    """Yields `(cell_id, output_pin_id, related_input_pin, index_1, index_2, {metric: grid})` for every timing arc."""
+    if get_timing_storage(conn) == "blob":
+        cursor = conn.execute(f"""
+            SELECT Cell_ID, Output_Pin_ID, Related_Input_Pin, Index_1_Size, Index_2_Size, Index_1, Index_2, {', '.join(NLDM_METRICS)}
+            FROM Timing_Arcs ORDER BY Timing_Arc_ID""")
+        for cell_id, output_pin_id, related_input_pin, size_1, size_2, index_1, index_2, *blobs in cursor:
+            grids = [np.frombuffer(blob, dtype='<f4').astype(np.float64).reshape(size_1, size_2) for blob in blobs]
+            yield cell_id, output_pin_id, related_input_pin, np.frombuffer(index_1, dtype='<f4').astype(np.float64), np.frombuffer(index_2, dtype='<f4').astype(np.float64), dict(zip(NLDM_METRICS, grids))
+        return
+
+    cursor = conn.execute(f"""
+        SELECT Cell_ID, Output_Pin_ID, Related_Input_Pin, Input_Transition, Output_Capacitance, {', '.join(NLDM_METRICS)}
+        FROM Timing_Values ORDER BY Cell_ID, Output_Pin_ID, Related_Input_Pin, Timing_Value_ID""")
+
+    def rows():
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                return
+            yield from chunk
+
+    for (cell_id, output_pin_id, related_input_pin), arc_rows in groupby(rows(), key=lambda row: row[:3]):
+        points = np.array([row[3:] for row in arc_rows], dtype=np.float64)
+        yield (cell_id, output_pin_id, related_input_pin, *points_to_grids(points))
+
+
+def summarize_arc(index_1, index_2, grids, input_capacitance=None):
+    """Returns the min, max, mean and center-of-table average delay and output transition
+    of one arc, its FO4 delay and its drive resistance.
+
+    The FO4 delay drives four times `input_capacitance` (the related input pin of the same
+    cell) with the output transition the cell itself produces at that load. The drive
+    resistance is the slope of the delay over the output capacitance at the center input
+    transition, in kOhm for ns and pF tables.
+    """
+    delay = grids['average_delay']
+    transition = (grids['fall_transition'] + grids['rise_transition']) / 2
+    center_slew, center_load = np.median(index_1), np.median(index_2)
+
+    summary = []
+    for values in (delay, transition):
+        summary += [np.nanmin(values), np.nanmax(values), np.nanmean(values), interpolate_grid(index_1, index_2, values, center_slew, center_load)]
+
+    fo4_delay = None
+    if input_capacitance:
+        load, slew = 4 * input_capacitance, center_slew
+        for _ in range(FO4_ITERATIONS):
+            slew = interpolate_grid(index_1, index_2, transition, slew, load)
+        fo4_delay = interpolate_grid(index_1, index_2, delay, slew, load)
+
+    drive_resistance = None
+    if len(index_2) > 1:
+        delays = interpolate_grid(index_1, index_2, delay, np.full(len(index_2), center_slew), index_2)
+        if not np.isnan(delays).any():
+            drive_resistance = np.polyfit(index_2, delays, 1)[0]
+
+    return [None if value is None or np.isnan(value) else float(value) for value in summary + [fo4_delay, drive_resistance]]
+
+
+def create_timing_summaries(conn):
+    """Materializes Timing_Arc_Summaries (one row per timing arc) and Cell_Timing_Summaries
+    (one row per cell) from the timing tables of a built lib database.
+
+    In a single database, cells are also compared with the same cell name in every other
+    corner through Corner_Delay_Delta and Corner_Delay_Ratio.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS Timing_Arc_Summaries;")
+    cursor.execute("DROP TABLE IF EXISTS Cell_Timing_Summaries;")
+    cursor.execute("""
+    CREATE TABLE Timing_Arc_Summaries (
+        Arc_Summary_ID INTEGER PRIMARY KEY,
+        Cell_ID INTEGER,
+        Output_Pin_ID INTEGER,
+        Related_Input_Pin TEXT,
+        Min_Delay REAL,
+        Max_Delay REAL,
+        Mean_Delay REAL,
+        Center_Delay REAL,
+        Min_Output_Transition REAL,
+        Max_Output_Transition REAL,
+        Mean_Output_Transition REAL,
+        Center_Output_Transition REAL,
+        FO4_Delay REAL,
+        Drive_Resistance REAL,
+        FOREIGN KEY (Cell_ID) REFERENCES Cells (Cell_ID),
+        FOREIGN KEY (Output_Pin_ID) REFERENCES Output_Pins (Output_Pin_ID)
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE Cell_Timing_Summaries (
+        Cell_ID INTEGER PRIMARY KEY,
+        Name TEXT,
+        Worst_Delay REAL,
+        Mean_Delay REAL,
+        FO4_Delay REAL,
+        Drive_Resistance REAL,
+        Corner_Delay_Delta REAL,
+        Corner_Delay_Ratio REAL,
+        FOREIGN KEY (Cell_ID) REFERENCES Cells (Cell_ID)
+    );
+    """)
+
+    input_capacitances = {(cell_id, name): capacitance for cell_id, name, capacitance in cursor.execute("SELECT Cell_ID, Input_Pin_Name, Capacitance FROM Input_Pins")}
+    rows = []
+    for arc_id, (cell_id, output_pin_id, related_input_pin, index_1, index_2, grids) in enumerate(iter_timing_grids(conn), start=1):
+        summary = summarize_arc(index_1, index_2, grids, input_capacitances.get((cell_id, related_input_pin)))
+        rows.append((arc_id, cell_id, output_pin_id, related_input_pin, *summary))
+    cursor.executemany(f"INSERT INTO Timing_Arc_Summaries VALUES ({', '.join('?' for _ in range(14))})", rows)
+
+    cursor.execute("""
+    INSERT INTO Cell_Timing_Summaries (Cell_ID, Name, Worst_Delay, Mean_Delay, FO4_Delay, Drive_Resistance)
+    SELECT Cells.Cell_ID, Cells.Name, MAX(Max_Delay), AVG(Mean_Delay), MAX(FO4_Delay), MAX(Drive_Resistance)
+    FROM Cells
+    LEFT JOIN Timing_Arc_Summaries ON Timing_Arc_Summaries.Cell_ID = Cells.Cell_ID
+    GROUP BY Cells.Cell_ID;
+    """)
+
+    if 'Condition_ID' in [row[1] for row in cursor.execute("PRAGMA table_info(Cells)")]:
+        cursor.execute("""
+        UPDATE Cell_Timing_Summaries
+        SET Corner_Delay_Delta = Mean_Delay - Fastest.Fastest_Delay, Corner_Delay_Ratio = Mean_Delay / NULLIF(Fastest.Fastest_Delay, 0)
+        FROM (SELECT Name AS Fastest_Name, MIN(Mean_Delay) AS Fastest_Delay FROM Cell_Timing_Summaries GROUP BY Name) AS Fastest
+        WHERE Fastest.Fastest_Name = Cell_Timing_Summaries.Name;
+        """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_arc_summary_cell_id ON Timing_Arc_Summaries (Cell_ID);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cell_summary_name ON Cell_Timing_Summaries (Name);")
+    conn.commit()
+
+
 def get_lib_description(selected_schema=None, partition=False):
     """Returns the description of the tables in the selected schema
     """
@@ -379,6 +777,8 @@ This table contains information about the output pins for each cell in the Cells
     (Cell_ID, the unique identifier for the cell to which this pin belongs, referencing the Cells table. Value examples: [1, 2, 370, 255]),
     (Output_Pin_Name, the name of the output pin, typically representing its function or position within the cell. Value examples: [A, B, C, X]),
     (Function, the boolean function of the output pin, describing its logic behavior. Value examples: [(!A&!B) | (A&B), (A&!B) | (!A&B)]),
+    (Function_Signature, the NPN signature of Function: functions equal up to renaming, reordering or inverting the inputs and inverting the output share it. NULL for flip-flop, latch and three-state outputs. Use it to find logically equivalent cells instead of matching Function strings: Function_Signature = npn_signature('<function>') or the Function_Signature of another cell. Value examples: [3:07, 2:1, 2:6]),
+    (Function_Inputs, the number of inputs Function depends on. Value examples: [1, 2, 3, 4]),
     (Max_Capacitance, the maximum capacitance that the output pin can drive. Defines the drive strenght of the cell. This value impacts the load the pin can handle. Value examples: [0.175791, 0.324107, 0.535593]),
     (Max_Transition, the maximum transition time of the output pin. This value affects the signal integrity and speed. Value examples: [1.499941, 1.502465, 1.496226]),
     (Related_Power_Pin, the name of the power pin that provides the supply voltage for the output pin. Value examples: [VPWR]),
@@ -387,6 +787,11 @@ This table contains information about the output pins for each cell in the Cells
 ]
 """
     
+    signature_function = """
+# Function: npn_signature(function)
+Returns the Function_Signature of a boolean function written like Output_Pins.Function, so cells are compared by logic rather than by how their function is written. Example: SELECT DISTINCT Cells.Name FROM Cells JOIN Output_Pins ON Output_Pins.Cell_ID = Cells.Cell_ID WHERE Output_Pins.Function_Signature = npn_signature('(A1&A2) | B1');
+"""
+
     timing_tables = """
 # Table Timing_Values
 This table stores the average propagation delay values, computed as the average of rise and fall delays for each combination of index parameters.
@@ -404,6 +809,50 @@ This table stores the average propagation delay values, computed as the average
     (Rise_Transition, The rise transition time, which indicates the time taken for the output signal to transition from low to high. Example values: [0.035, 0.045, 0.055])
 ]
 """
+    timing_function = """
+# Function: nldm_lookup(cell, output_pin, related_input_pin, metric, input_transition, output_capacitance)
+Interpolates the timing table of one arc at any input transition and output capacitance, including values between or outside the table points (clamped to the table edges). Prefer it over filtering Timing_Values by exact Input_Transition/Output_Capacitance values.
+[
+    (cell, the Cell_ID of the cell, or its Name when the name matches a single row of Cells),
+    (output_pin, the Output_Pin_Name of the arc. Example values: [X, Y, Q]),
+    (related_input_pin, the Related_Input_Pin of the arc. Example values: [A, B, CLK]),
+    (metric, one of 'fall_delay', 'rise_delay', 'average_delay', 'fall_transition', 'rise_transition'),
+]
+It returns NULL when the arc does not exist. Example: SELECT Name, nldm_lookup(Cell_ID, 'X', 'A', 'rise_delay', 0.05, 0.01) FROM Cells WHERE Name = 'sky130_fd_sc_hd__buf_1';
+"""
+
+    summary_tables = """
+# Table: Timing_Arc_Summaries
+This table summarizes the timing table of every arc (cell, output pin, related input pin) of Timing_Values. Delays are the average of rise and fall delays, transitions the average of rise and fall output transitions. Prefer it over aggregating Timing_Values.
+[
+    (Arc_Summary_ID, the unique identifier of the arc summary. Example values: [1, 2, 3]),
+    (Cell_ID, the cell of the arc, referencing the Cells table. Example values: [1001, 1002, 1003]),
+    (Output_Pin_ID, the output pin of the arc, referencing the Output_Pins table. Example values: [2001, 2002, 2003]),
+    (Related_Input_Pin, the name of the input pin of the arc. Example values: [A, B, CLK]),
+    (Min_Delay, Max_Delay, Mean_Delay, the smallest, largest and mean delay over the whole table. Example values: [0.021, 1.472, 0.310]),
+    (Center_Delay, the delay at the center input transition and output capacitance of the table. Example values: [0.150, 0.231]),
+    (Min_Output_Transition, Max_Output_Transition, Mean_Output_Transition, Center_Output_Transition, the same statistics of the output transition. Example values: [0.018, 1.503, 0.322, 0.140]),
+    (FO4_Delay, the delay when driving four copies of the related input pin of the same cell, with the input transition the cell itself produces at that load. Example values: [0.092, 0.135]),
+    (Drive_Resistance, the slope of the delay over the output capacitance at the center input transition, in kOhm. Lower is a stronger driver. Example values: [2.95, 6.12, 11.8]),
+]
+
+# Table: Cell_Timing_Summaries
+This table summarizes the timing of every cell over all of its arcs, so questions like the fastest buffer of a corner are point lookups.
+[
+    (Cell_ID, the cell, referencing the Cells table. Example values: [1, 2, 370]),
+    (Name, name of the cell. Example values: [sky130_fd_sc_hd__buf_2, sky130_fd_sc_hd__nand2_1]),
+    (Worst_Delay, the largest delay of all the arcs of the cell. Example values: [1.472, 0.918]),
+    (Mean_Delay, the mean delay over all the arcs of the cell. Example values: [0.310, 0.506]),
+    (FO4_Delay, the largest FO4 delay of the arcs of the cell. Example values: [0.092, 0.135]),
+    (Drive_Resistance, the largest drive resistance of the arcs of the cell, in kOhm. Example values: [2.95, 6.12]),
+    (Corner_Delay_Delta, Mean_Delay minus the Mean_Delay of the same cell name in its fastest operating condition, 0 in the fastest one. Example values: [0.0, 0.085, 0.412]),
+    (Corner_Delay_Ratio, Mean_Delay divided by the Mean_Delay of the same cell name in its fastest operating condition, 1 in the fastest one. Example values: [1.0, 1.27, 2.31]),
+]
+"""
+    if partition:
+        summary_tables = summary_tables.replace("""    (Corner_Delay_Delta, Mean_Delay minus the Mean_Delay of the same cell name in its fastest operating condition, 0 in the fastest one. Example values: [0.0, 0.085, 0.412]),
+    (Corner_Delay_Ratio, Mean_Delay divided by the Mean_Delay of the same cell name in its fastest operating condition, 1 in the fastest one. Example values: [1.0, 1.27, 2.31]),
+""", "")
 
     desc = """The liberty file database contains information about the different standard cell libraries under different operating conditions.
     It has the following tables: \n"""
@@ -419,16 +868,16 @@ This table stores the average propagation delay values, computed as the average
             desc += input_pins_table 
             
         if 'Output_Pins' in selected_schema: 
-            desc += output_pins_table 
+            desc += output_pins_table + signature_function
         
         if 'Timing_Values' in selected_schema: 
-            desc += timing_tables
+            desc += timing_tables + timing_function + summary_tables
     
     else:
         if partition: 
-            desc = cells_table + input_pins_table + output_pins_table + timing_tables 
+            desc = cells_table + input_pins_table + output_pins_table + signature_function + timing_tables + timing_function + summary_tables
         else: 
-            desc = op_cond_table + cells_table + input_pins_table + output_pins_table + timing_tables 
+            desc = op_cond_table + cells_table + input_pins_table + output_pins_table + signature_function + timing_tables + timing_function + summary_tables
          
     return desc 
 
@@ -443,6 +892,9 @@ def get_lib_foreign_keys(selected_schema, partition=False):
         timing_values = """
 Timing_Values.`Cell_ID` = Cells.`Cell_ID`
 Timing_Values.`Output_Pin_ID` = Output_Pins.`Output_Pin_ID`
+Timing_Arc_Summaries.`Cell_ID` = Cells.`Cell_ID`
+Timing_Arc_Summaries.`Output_Pin_ID` = Output_Pins.`Output_Pin_ID`
+Cell_Timing_Summaries.`Cell_ID` = Cells.`Cell_ID`
 """
         
         fk_str = ""
@@ -470,6 +922,9 @@ Cells.`Cell_ID` = Output_Pins.`Cell_ID`
 Output_Pins.`Output_Pin_ID` = Timing_Tables.`Output_Pin_ID`
 Timing_Values.`Cell_ID` = Cells.`Cell_ID`
 Timing_Values.`Output_Pin_ID` = Output_Pins.`Output_Pin_ID`
+Timing_Arc_Summaries.`Cell_ID` = Cells.`Cell_ID`
+Timing_Arc_Summaries.`Output_Pin_ID` = Output_Pins.`Output_Pin_ID`
+Cell_Timing_Summaries.`Cell_ID` = Cells.`Cell_ID`
 """
         else: 
             fk_str = """
@@ -479,6 +934,9 @@ Cells.`Cell_ID` = Output_Pins.`Cell_ID`
 Output_Pins.`Output_Pin_ID` = Timing_Tables.`Output_Pin_ID`
 Timing_Values.`Cell_ID` = Cells.`Cell_ID`
 Timing_Values.`Output_Pin_ID` = Output_Pins.`Output_Pin_ID`
+Timing_Arc_Summaries.`Cell_ID` = Cells.`Cell_ID`
+Timing_Arc_Summaries.`Output_Pin_ID` = Output_Pins.`Output_Pin_ID`
+Cell_Timing_Summaries.`Cell_ID` = Cells.`Cell_ID`
 """
     return fk_str
 
@@ -551,11 +1009,32 @@ def main():
     parser.add_argument('--pdk_path', type=str, help='Path to the sky130 pdk', default='/home/manar/.volare/sky130A/libs.ref')
     parser.add_argument('--partition', help='Partition the database by standard cells and operating conditions.', action='store_true', default=False)
     parser.add_argument('--output_dir', type=str, help='Path to output director', default='./dbs/')
+    parser.add_argument('--stream', help='Parse and insert the Liberty files cell by cell to bound memory usage.', action='store_true', default=False)
+    parser.add_argument('--lib_parser', type=str, help='Liberty parser to use: liberty (generic grammar) or fast (purpose-built tokenizer).', choices=['liberty', 'fast'], default='liberty')
+    parser.add_argument('--timing_storage', type=str, help='Store NLDM tables as one row per point (rows) or as packed float32 arcs behind a Timing_Values view (blob).', choices=['rows', 'blob'], default='rows')
+    parser.add_argument('--jobs', type=int, help='Number of worker processes parsing Liberty corners in parallel.', default=1)
+    parser.add_argument('--benchmark', type=str, help='Path to one Liberty corner; compares per-row and bulk inserts instead of building the database.', default=None)
     args = parser.parse_args()
 
+    if args.benchmark:
+        os.makedirs(args.output_dir, exist_ok=True)
+        print("In memory:")
+        benchmark_lib_insert(args.benchmark, lib_parser=args.lib_parser)
+        print("On disk:")
+        benchmark_db_path = os.path.join(args.output_dir, "benchmark_lib.db")
+        benchmark_lib_insert(args.benchmark, lib_parser=args.lib_parser, db_path=benchmark_db_path)
+        os.remove(benchmark_db_path)
+        print("Timing storage:")
+        benchmark_timing_storage(args.benchmark, args.output_dir, lib_parser=args.lib_parser)
+        return
+
     pdk_name = args.pdk_name
     partition = args.partition
     output_dir = args.output_dir
+    stream = args.stream
+    lib_parser = args.lib_parser
+    jobs = args.jobs
+    timing_storage = args.timing_storage
    
     os.makedirs(output_dir, exist_ok=True)
 
@@ -566,33 +1045,52 @@ def main():
     if not partition:
         conn = sqlite3.connect(":memory:")
         db_conn["single"] = conn
-        create_lib_tables(conn)
+        create_lib_tables(conn, indexes=False, timing_storage=timing_storage)
 
     if partition:
         for variant in tqdm.tqdm(scl_variants):
             lib_path = get_lib_paths(pdk_name, variant=variant.value)
             for corner in tqdm.tqdm(os.listdir(lib_path)):
                 db_conn[f"{variant.value}_{corner}"] = sqlite3.connect(":memory:")  
-                create_lib_tables(db_conn[f"{variant.value}_{corner}"])
+                create_lib_tables(db_conn[f"{variant.value}_{corner}"], indexes=False, timing_storage=timing_storage)
+
+    for conn in db_conn.values():
+        set_build_pragmas(conn)
 
-    for variant in tqdm.tqdm(scl_variants):
+    tasks = []
+    for variant in scl_variants:
         lib_path = get_lib_paths(pdk_name, variant.value)
         
-        for corner in tqdm.tqdm(os.listdir(lib_path)):
+        for corner in os.listdir(lib_path):
             if 'ccsnoise' in corner or 'pwrlkg' in corner or 'ka1v76' in corner or ".db" in corner or os.path.splitext(corner)[1] != ".lib" :  # Ignore certain corners
                 continue
             
-            print("Running Corner: ", corner)
             corner_path = os.path.join(lib_path, corner)
-            print(corner_path)
-            
-            cells, operating_conditions = parse_liberty_file(corner_path)
-
-            if partition:
-                insert_lib_data(db_conn[f"{variant.value}_{corner}"], cells, operating_conditions, cell_varaint=variant.value)
-                drop_cell_library_corner_column(db_conn[f"{variant.value}_{corner}"])
+            task = {'stage': 'Liberty', 'key': f"{variant.value}_{corner}", 'variant': variant.value}
+            if jobs > 1:
+                task.update(parse=parse_liberty_rows, args=(corner_path, variant.value, lib_parser, timing_storage))
             else:
-                insert_lib_data(db_conn["single"], cells, operating_conditions, cell_varaint=variant.value)
+                task.update(parse=parse_liberty_file, args=(corner_path, stream, lib_parser))
+            tasks.append(task)
+
+    def write(task, result):
+        print("Writing Corner: ", task['key'])
+        conn = db_conn[task['key']] if partition else db_conn["single"]
+        if jobs > 1:
+            insert_lib_rows(conn, result)
+        else:
+            cells, operating_conditions = result
+            insert_lib_data(conn, cells, operating_conditions, cell_varaint=task['variant'])
+        if partition:
+            drop_cell_library_corner_column(conn)
+            create_lib_indexes(conn, partition=True)
+            create_timing_summaries(conn)
+
+    run_build_tasks(tasks, write, jobs=jobs)
+
+    if not partition:
+        create_lib_indexes(db_conn["single"])
+        create_timing_summaries(db_conn["single"])
 
     if partition:
         for key, conn in db_conn.items():
@@ -5,7 +5,7 @@ import argparse
 from tqdm import tqdm
 from core.parsers.lib.lib_parser import parse_liberty_file
 from core.database.db_utils import delete_database, import_csv_to_sql, write_to_csv, write_to_csv_header
-from core.database.sql_lib import create_lib_tables
+from core.database.sql_lib import create_lib_tables, get_output_pin_signature
 
 
 
@@ -49,6 +49,7 @@ def generate_lib_csv_files(ids, cells, operating_conditions, cell_variant, outpu
             op_cond_id
         ])
 
+        input_pin_names = tuple(sorted(pin['name'] for pin in cell['pins'] if pin['direction'] in ("input", "inout")))
         for pin in cell['pins']:
             if pin['direction'] == "input":
                 is_clock = True if pin.get('clock', 'false').lower() == "true" else False
@@ -72,6 +73,7 @@ def generate_lib_csv_files(ids, cells, operating_conditions, cell_variant, outpu
                     cell_id, 
                     pin['name'], 
                     pin.get('function', None),
+                    *get_output_pin_signature(pin, input_pin_names),
                     float(pin['max_capacitance']) if 'max_capacitance' in pin.keys() else None,
                     float(pin['max_transition']) if 'max_transition' in pin.keys() else None,
                     str(pin['power_down_function']) if 'power_down_function' in pin.keys() else None,
@@ -176,7 +178,7 @@ def main():
         'Rise_Capacitance', 'Max_Transition', 'Related_Power_Pin', 'Related_Ground_Pin'])
 
     write_to_csv_header(os.path.join(output_dir, 'Output_Pins.csv'),
-        ['Output_Pin_ID', 'Cell_ID', 'Output_Pin_Name', 'Function', 'Max_Capacitance', 'Max_Transition',
+        ['Output_Pin_ID', 'Cell_ID', 'Output_Pin_Name', 'Function', 'Function_Signature', 'Function_Inputs', 'Max_Capacitance', 'Max_Transition',
         'Power_Down_Function', 'Related_Power_Pin', 'Related_Ground_Pin'])
 
     write_to_csv_header(os.path.join(output_dir, 'Timing_Values.csv'),
@@ -214,7 +216,7 @@ def main():
         ("Operating_Conditions", "Operating_Conditions.csv", "Condition_ID, Name, Voltage, Process, Temperature, Tree_Type, Cell_Library"),
         ("Cells", "Cells.csv", "Cell_ID, Name, Drive_Strength, Area, Cell_Footprint, Leakage_Power, Driver_Waveform_Fall, Driver_Waveform_Rise, Is_Buffer, Is_Inverter, Is_Flip_Flop, Is_Scan_Enabled_Flip_Flop, Condition_ID"),
         ("Input_Pins", "Input_Pins.csv", "Input_Pin_ID, Cell_ID, Input_Pin_Name, Clock, Capacitance, Fall_Capacitance, Rise_Capacitance, Max_Transition, Related_Power_Pin, Related_Ground_Pin"),
-        ("Output_Pins", "Output_Pins.csv", "Output_Pin_ID, Cell_ID, Output_Pin_Name, Function, Max_Capacitance, Max_Transition, Power_Down_Function, Related_Power_Pin, Related_Ground_Pin"),
+        ("Output_Pins", "Output_Pins.csv", "Output_Pin_ID, Cell_ID, Output_Pin_Name, Function, Function_Signature, Function_Inputs, Max_Capacitance, Max_Transition, Power_Down_Function, Related_Power_Pin, Related_Ground_Pin"),
         ("Timing_Values", "Timing_Values.csv", "Timing_Value_ID, Cell_ID, Output_Pin_ID, Related_Input_Pin, Input_Transition, Output_Capacitance, Fall_Delay, Rise_Delay, Average_Delay, Fall_Transition, Rise_Transition")
     ]:
         csv_file_path = os.path.join(output_dir, file_name)
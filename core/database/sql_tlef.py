@@ -9,8 +9,8 @@ import sqlite3
 import argparse
 
 from config.pdks import get_scl, get_techlef_paths, get_techlef_corners
-from core.parsers.lef.lef_parser import LefParser
-from core.database.db_utils import delete_database
+from core.parsers.lef.lef_parser import LefParser, parse_lef
+from core.database.db_utils import delete_database, set_build_pragmas, RowBuilder, get_next_ids, write_rows, insert_rows
 
 
 def parse_via_name(via_name):
@@ -40,13 +40,41 @@ def parse_via_name(via_name):
     }
 
     
-def insert_tlef_data(conn, layer_dict, via_dict, corner, scl_variant):
-    
-    cursor = conn.cursor()
+TLEF_ROW_COLUMNS = {
+    'Routing_Layers': ('Layer_ID', 'Name', 'Type', 'Direction', 'Pitch_X', 'Pitch_Y', 'Offset_X', 'Offset_Y', 'Width', 'Spacing', 'Area', 'Thickness', 'Min_Enclosed_Area', 'Edge_Capacitance', 'Capacitance_Per_SQ_Dist', 'Resistance_Per_SQ', 'DC_Current_Density_Avg', 'AC_Current_Density_Rms', 'Maximum_Density', 'Density_Check_Window_X', 'Density_Check_Window_Y', 'Density_Check_Step', 'Antenna_Model', 'Corner', 'Cell_Library'),
+    'Antenna_Diff_Side_Area_Ratios': ('Ratio_ID', 'Routing_Layer_ID', 'Type', 'X1', 'Y1', 'X2', 'Y2', 'X3', 'Y3', 'X4', 'Y4'),
+    'Cut_Layers': ('Layer_ID', 'Name', 'Type', 'Width', 'Spacing', 'Enclosure_Below_X', 'Enclosure_Below_Y', 'Enclosure_Above_X', 'Enclosure_Above_Y', 'Resistance', 'DC_Current_Density', 'Corner', 'Cell_Library'),
+    'Antenna_Diff_Area_Ratios': ('Ratio_ID', 'Cut_Layer_ID', 'Type', 'X1', 'Y1', 'X2', 'Y2', 'X3', 'Y3', 'X4', 'Y4'),
+    'Vias': ('Via_ID', 'Name', 'Corner', 'Lower_Layer', 'Upper_Layer', 'Cell_Library'),
+    'Via_Layers': ('Via_Layer_ID', 'Via_ID', 'Layer_Name', 'Rect_X1', 'Rect_Y1', 'Rect_X2', 'Rect_Y2'),
+}
+
+# Positions of the id columns in each row tuple and the table whose ids they hold
+TLEF_ROW_IDS = {
+    'Routing_Layers': {0: 'Routing_Layers'},
+    'Antenna_Diff_Side_Area_Ratios': {0: 'Antenna_Diff_Side_Area_Ratios', 1: 'Routing_Layers'},
+    'Cut_Layers': {0: 'Cut_Layers'},
+    'Antenna_Diff_Area_Ratios': {0: 'Antenna_Diff_Area_Ratios', 1: 'Cut_Layers'},
+    'Vias': {0: 'Vias'},
+    'Via_Layers': {0: 'Via_Layers', 1: 'Vias'},
+}
+
+
+def antenna_ratio_row(ratio_id, layer_id, ratio):
+    return (
+        ratio_id, layer_id, ratio[0],
+        ratio[1][0], ratio[1][1], ratio[2][0], ratio[2][1],
+        ratio[3][0], ratio[3][1], ratio[4][0], ratio[4][1]
+    )
 
-    # insert_via_data(cursor, via_dict)
-    for _, layer in layer_dict.items():
-        
+
+class TlefRowBuilder(RowBuilder):
+    """Converts parsed TechLEF layers and vias into row tuples for the tlef tables."""
+
+    def __init__(self, next_ids=None):
+        super().__init__(TLEF_ROW_COLUMNS, next_ids)
+
+    def add_layer(self, layer, corner, scl_variant):
         layer_type = layer.layer_type
         if layer_type == "ROUTING": 
             
@@ -58,7 +86,6 @@ def insert_tlef_data(conn, layer_dict, via_dict, corner, scl_variant):
             if layer.resistance : 
                 resistance_per_sq = layer.resistance if isinstance(layer.resistance, float) else layer.resistance[1]
       
-            # dc_current_density = None 
             dc_current_density =  layer.dc_current_density[1] if layer.dc_current_density else None
             ac_current_density = layer.ac_current_density[1] if layer.ac_current_density else None
 
@@ -79,31 +106,17 @@ def insert_tlef_data(conn, layer_dict, via_dict, corner, scl_variant):
             density_check_window_x = layer.density_check_window[0]  if layer.density_check_window  else None 
             density_check_window_y = layer.density_check_window[1] if layer.density_check_window  else None 
             
-            min_enclosed_area = layer.min_enclosed_area
-            antenna_model = layer.antenna_model
-            antenna_diff_side_area = layer.antenna_diff_side_area_ratio
-            
-            # Insert layers and properties (simplified)
-            cursor.execute('''
-                INSERT INTO Routing_Layers (Name, Type, Direction, Pitch_X, Pitch_Y, Offset_X, Offset_Y, Width, Spacing, Area, Thickness, Min_Enclosed_Area, Edge_Capacitance, Capacitance_Per_SQ_Dist, Resistance_Per_SQ, DC_Current_Density_Avg, AC_Current_Density_Rms, Maximum_Density, Density_Check_Window_X, Density_Check_Window_Y, Density_Check_Step, Antenna_Model, Corner, Cell_Library)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (layer.name, layer.layer_type, layer.direction, pitch_x, pitch_y, offset_x, offset_y, layer.width, layer.spacing,
-                  layer.area, layer.thickness, min_enclosed_area, layer.edge_cap, capacitance_per_sq_dst, resistance_per_sq,dc_current_density, ac_current_density, layer.max_density, density_check_window_x, density_check_window_y, layer.density_check_step, antenna_model,
-                  corner, scl_variant))
-                        
-            layer_id = cursor.lastrowid
-
-            antenna_diff_side_area_type = None 
-            if antenna_diff_side_area: 
-                antenna_diff_side_area_type = antenna_diff_side_area[0]
-           
-                cursor.execute('''
-                    INSERT INTO Antenna_Diff_Side_Area_Ratios (Routing_Layer_ID, Type, X1, Y1, X2, Y2, X3, Y3, X4, Y4) 
-                    VALUES (?, ?, ?, ?, ?, ? , ?, ?, ?, ?) 
-                    ''', 
-                    (layer_id, antenna_diff_side_area_type, antenna_diff_side_area[1][0], antenna_diff_side_area[1][1], 
-                    antenna_diff_side_area[2][0], antenna_diff_side_area[2][1], antenna_diff_side_area[3][0], antenna_diff_side_area[3][1],
-                    antenna_diff_side_area[4][0], antenna_diff_side_area[4][1])
+            layer_id = self.new_id('Routing_Layers')
+            self.rows['Routing_Layers'].append((
+                layer_id, layer.name, layer.layer_type, layer.direction, pitch_x, pitch_y, offset_x, offset_y, layer.width, layer.spacing,
+                layer.area, layer.thickness, layer.min_enclosed_area, layer.edge_cap, capacitance_per_sq_dst, resistance_per_sq, dc_current_density,
+                ac_current_density, layer.max_density, density_check_window_x, density_check_window_y, layer.density_check_step, layer.antenna_model,
+                corner, scl_variant
+            ))
+
+            if layer.antenna_diff_side_area_ratio: 
+                self.rows['Antenna_Diff_Side_Area_Ratios'].append(
+                    antenna_ratio_row(self.new_id('Antenna_Diff_Side_Area_Ratios'), layer_id, layer.antenna_diff_side_area_ratio)
                 )
 
         elif layer_type == "CUT": 
@@ -122,48 +135,64 @@ def insert_tlef_data(conn, layer_dict, via_dict, corner, scl_variant):
                     enclosure_above_x = enclosure[1]
                     enclosure_above_y = enclosure[2]
             
-            
-            antenna_diff_area_ratio = layer.antenna_diff_area_ratio if layer.antenna_diff_area_ratio else None
-            cursor.execute('''
-            INSERT INTO Cut_Layers (Name, Type, Width, Spacing, Enclosure_Below_X, Enclosure_Below_Y, Enclosure_Above_X, Enclosure_Above_Y, Resistance, DC_Current_Density, Corner, Cell_Library
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            
-            ''', (layer.name, layer.layer_type, layer.width, layer.spacing, enclosure_below_x, enclosure_below_y, enclosure_above_x, enclosure_above_y, layer.resistance, dc_current_density, corner, scl_variant))
-
-            
-            layer_id = cursor.lastrowid
-
-            if antenna_diff_area_ratio: 
-                antenna_diff_area_type = antenna_diff_area_ratio[0]
-                cursor.execute('''
-                    INSERT INTO Antenna_Diff_Area_Ratios (Cut_Layer_ID, Type, X1, Y1, X2, Y2, X3, Y3, X4, Y4) 
-                    VALUES (?, ?, ?, ?, ?, ? , ?, ?, ?, ?) 
-                    ''', 
-                    (layer_id, antenna_diff_area_type, antenna_diff_area_ratio[1][0], antenna_diff_area_ratio[1][1], 
-                    antenna_diff_area_ratio[2][0], antenna_diff_area_ratio[2][1], antenna_diff_area_ratio[3][0], antenna_diff_area_ratio[3][1],
-                    antenna_diff_area_ratio[4][0], antenna_diff_area_ratio[4][1])
+            layer_id = self.new_id('Cut_Layers')
+            self.rows['Cut_Layers'].append((
+                layer_id, layer.name, layer.layer_type, layer.width, layer.spacing, enclosure_below_x, enclosure_below_y, 
+                enclosure_above_x, enclosure_above_y, layer.resistance, dc_current_density, corner, scl_variant
+            ))
+
+            if layer.antenna_diff_area_ratio: 
+                self.rows['Antenna_Diff_Area_Ratios'].append(
+                    antenna_ratio_row(self.new_id('Antenna_Diff_Area_Ratios'), layer_id, layer.antenna_diff_area_ratio)
                 )
 
+    def add_via(self, via, corner, scl_variant):
+        metal_layers = parse_via_name(via.name)
+        via_id = self.new_id('Vias')
+        self.rows['Vias'].append((via_id, via.name, corner, metal_layers['lower_layer'], metal_layers['upper_layer'], scl_variant))
 
-    # Insert via data
-    for _, via in via_dict.items():
-        via_name = via.name     
-        metal_layers = parse_via_name(via_name)
-        lower_layer = metal_layers['lower_layer']
-        upper_layer =  metal_layers['upper_layer']
-        cursor.execute('''
-            INSERT INTO VIAS (Name, Corner, Lower_Layer, Upper_Layer, Cell_Library) VALUES (?, ?, ?, ?, ?)
-        ''', (via_name,corner, lower_layer, upper_layer, scl_variant))
-        via_id = cursor.lastrowid
         for layer in via.layers:            
-            cursor.execute('''
-                INSERT INTO Via_Layers (Via_ID, Layer_Name, Rect_X1, Rect_Y1, Rect_X2, Rect_Y2)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (via_id, layer.name, layer.shapes[0].points[0][0], layer.shapes[0].points[0][1], layer.shapes[0].points[1][0], layer.shapes[0].points[1][1]))
+            self.rows['Via_Layers'].append((
+                self.new_id('Via_Layers'), via_id, layer.name, 
+                layer.shapes[0].points[0][0], layer.shapes[0].points[0][1], layer.shapes[0].points[1][0], layer.shapes[0].points[1][1]
+            ))
+
+
+def add_tlef_data(builder, layer_dict, via_dict, corner, scl_variant):
+    for _, layer in layer_dict.items():
+        builder.add_layer(layer, corner, scl_variant)
+
+    for _, via in via_dict.items():
+        builder.add_via(via, corner, scl_variant)
+
+
+def build_tlef_rows(layer_dict, via_dict, corner, scl_variant):
+    """Returns the rows of one TechLEF file as `{table: [row tuples]}` with ids starting at 1."""
+    builder = TlefRowBuilder()
+    add_tlef_data(builder, layer_dict, via_dict, corner, scl_variant)
+    return builder.take()
+
+
+def parse_techlef_rows(techlef_path, corner, scl_variant, lef_parser="lef"):
+    """Parses a TechLEF file into compact row tuples, see `build_tlef_rows`."""
+    tlef_parser = parse_lef(techlef_path, parser=lef_parser)
+    return build_tlef_rows(tlef_parser.layer_dict, tlef_parser.via_dict, corner, scl_variant)
+
+
+def insert_tlef_rows(conn, rows):
+    """Inserts rows from `build_tlef_rows`, shifting their ids past the rows already in the database."""
+    insert_rows(conn, TLEF_ROW_COLUMNS, TLEF_ROW_IDS, rows)
 
-    conn.commit()
-    
     
+def insert_tlef_data(conn, layer_dict, via_dict, corner, scl_variant):
+    """Inserts the layers and vias of a TechLEF file with one `executemany` per table."""
+    builder = TlefRowBuilder(get_next_ids(conn, TLEF_ROW_COLUMNS))
+    add_tlef_data(builder, layer_dict, via_dict, corner, scl_variant)
+
+    write_rows(conn, TLEF_ROW_COLUMNS, builder.take())
+    conn.commit()
+
+
 def get_tlef_description(selected_schema=None, partition=False):
     routing_layers_table = """
 # Table: Routing_Layers
@@ -399,7 +428,8 @@ Vias.`Via_ID` = Via_Layers.`Via_ID`
     return fk_str
 
 
-def create_tlef_tables(conn):
+def create_tlef_tables(conn, indexes=True):
+    """Creates the tlef tables; pass `indexes=False` to defer `create_tlef_indexes` until after a bulk load."""
     
     cursor = conn.cursor()
 
@@ -506,6 +536,16 @@ def create_tlef_tables(conn):
     );
     ''') 
 
+    if indexes:
+        create_tlef_indexes(conn)
+
+    conn.commit()
+
+
+def create_tlef_indexes(conn):
+    """Creates the secondary indexes of the tlef tables."""
+    cursor = conn.cursor()
+
     index_queries = [
         "CREATE INDEX IF NOT EXISTS idx_routing_layer_id ON Antenna_Diff_Side_Area_Ratios (Routing_Layer_ID);",
         "CREATE INDEX IF NOT EXISTS idx_cut_layer_id ON Antenna_Diff_Area_Ratios (Cut_Layer_ID);",
@@ -596,14 +636,17 @@ def main():
     if not partition:
         conn = sqlite3.connect(":memory:")  # Single in-memory database
         db_conn["single"] = conn
-        create_tlef_tables(conn)  # Create tables once for the single database
+        create_tlef_tables(conn, indexes=False)  # Create tables once for the single database
 
     for variant in scl_variants:
         for corner in techlef_corners:
             if partition:
                 conn = sqlite3.connect(":memory:")  
-                db_conn[f"{variant.value}_tlef_{corner.value}"] = conn
-                create_tlef_tables(conn)
+                db_conn[f"{variant.value}_{corner.value}"] = conn
+                create_tlef_tables(conn, indexes=False)
+
+    for conn in db_conn.values():
+        set_build_pragmas(conn)
 
     for variant in tqdm.tqdm(scl_variants):
         for corner in tqdm.tqdm(techlef_corners):
@@ -611,14 +654,16 @@ def main():
 
             tlef_parser = LefParser(techlef_path)
             tlef_parser.parse()
-            print(tlef_parser)
-            print(tlef_parser.layer_dict)
             if partition:
                 insert_tlef_data(db_conn[f"{variant.value}_{corner.value}"], tlef_parser.layer_dict, tlef_parser.via_dict, corner=corner.value, scl_variant=variant.value)
-                drop_cell_library_corner_columns(db_conn[f"{variant.value}_{corner.value}"])
             else:
                 insert_tlef_data(db_conn["single"], tlef_parser.layer_dict, tlef_parser.via_dict, corner=corner.value, scl_variant=variant.value)
 
+    for conn in db_conn.values():
+        if partition:
+            drop_cell_library_corner_columns(conn)
+        create_tlef_indexes(conn)
+
     if partition:
         for key, conn in db_conn.items():
             parts = key.split('_')
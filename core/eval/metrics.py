@@ -28,6 +28,7 @@ from langchain_community.graphs import Neo4jGraph
 from neo4j.exceptions import Neo4jError
 
 from core.database.graphdb import URI, USER, PASSWORD
+from core.database.query_guard import QueryTooExpensiveError
 
 
 def tuple_to_sorted_list(t):
@@ -74,7 +75,8 @@ def normalize(data: list) -> list:
 
 
 
-def execute_query(query, database, use_cypher=False):
+def execute_query(query, database, use_cypher=False, guard=None):
+    """Runs `query` and returns its time and normalized result, `guard` is an optional `QueryGuard` for SQL."""
     if not query:
         return 0, set([])  
     
@@ -88,11 +90,11 @@ def execute_query(query, database, use_cypher=False):
             query_result = extract_values((list(query_result)))
         else:
             start_time = time.time()
-            query_result = database.run(query)
+            query_result = guard.run(database, query) if guard else database.run(query)
             exec_time = time.time() - start_time
             print(f"Query Result is {query_result}")
             query_result = {tuple(tuple_to_sorted_list(t)) for t in query_result}
-    except (TypeError, sqlalchemy.exc.OperationalError, sqlalchemy.exc.StatementError, sqlite3.OperationalError, sqlite3.Warning,  Neo4jError, neo4j.exceptions.CypherSyntaxError, ValueError, sqlalchemy.exc.InvalidRequestError) as e: 
+    except (TypeError, sqlalchemy.exc.OperationalError, sqlalchemy.exc.StatementError, sqlite3.OperationalError, sqlite3.ProgrammingError, sqlite3.Warning,  Neo4jError, neo4j.exceptions.CypherSyntaxError, ValueError, sqlalchemy.exc.InvalidRequestError, QueryTooExpensiveError) as e: 
         print(f"Encoutered Error: {e} during Queyr Execution!!!!")
         return 0, set([]) 
     
@@ -110,13 +112,13 @@ def clean_abnormal(input):
     return processed_list
 
 
-def measure_time_ratio(predicted_sql, ground_truth, database, num_iters=1, use_cypher=False):
+def measure_time_ratio(predicted_sql, ground_truth, database, num_iters=1, use_cypher=False, guard=None):
     diff_list = []
     
     if predicted_sql is None:
         return 0 
     
-    predicted_time, pred_res = execute_query(predicted_sql, database, use_cypher=use_cypher)
+    predicted_time, pred_res = execute_query(predicted_sql, database, use_cypher=use_cypher, guard=guard)
 
     passed = False
     for ground_truth_sql in ground_truth: 
@@ -126,6 +128,7 @@ def measure_time_ratio(predicted_sql, ground_truth, database, num_iters=1, use_c
             passed = True 
             
     if passed: 
+        # The guard already let the prediction run above, time both queries the same raw way
         for _ in range(num_iters):
             predicted_time, _ = execute_query(predicted_sql, database, use_cypher=use_cypher)
             ground_truth_time, _ = execute_query(ground_truth[0], database, use_cypher=use_cypher) 
@@ -146,11 +149,11 @@ def measure_time_ratio(predicted_sql, ground_truth, database, num_iters=1, use_c
     return time_ratio
 
 
-def compute_ves(predicted_queries, ground_truth, database, num_iters=1, use_cypher=False):
+def compute_ves(predicted_queries, ground_truth, database, num_iters=1, use_cypher=False, guard=None):
     time_ratios = []
     for pred_query, ground_truth_query in zip(predicted_queries, ground_truth):
 
-        time_ratio = measure_time_ratio(pred_query, ground_truth_query, database, num_iters=num_iters, use_cypher=use_cypher)
+        time_ratio = measure_time_ratio(pred_query, ground_truth_query, database, num_iters=num_iters, use_cypher=use_cypher, guard=guard)
         time_ratios.append(time_ratio)
         
     num_queries = len(predicted_queries)
@@ -170,7 +173,7 @@ def compute_ves(predicted_queries, ground_truth, database, num_iters=1, use_cyph
 
 
 
-def compute_execution_acc(predicted_queries, ground_truth_queries, database, use_cypher=False):
+def compute_execution_acc(predicted_queries, ground_truth_queries, database, use_cypher=False, guard=None):
     results = []
     num_queries = len(predicted_queries)
 
@@ -179,7 +182,7 @@ def compute_execution_acc(predicted_queries, ground_truth_queries, database, use
         print("Predicted Query: ", pred_query)
         if pred_query is None: 
             continue 
-        _, pred_res = execute_query(pred_query, database, use_cypher=use_cypher)
+        _, pred_res = execute_query(pred_query, database, use_cypher=use_cypher, guard=guard)
 
         for ground_truth in ground_truth_query: 
             _, ground_truth_res = execute_query(ground_truth, database, use_cypher=use_cypher)
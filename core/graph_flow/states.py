@@ -18,6 +18,7 @@ class PDKQueryState(TypedDict):
     table_info: str 
     desc_str: str
     fk_str: str
+    resolved_names: str
     qa_pairs: List[str]
     sql_query: str 
     sql_executes: bool 
@@ -0,0 +1,292 @@
+"""Fast LEF reader with compact rectangle storage.
+
+A single pass over the file that dispatches on the first keyword of each statement
+without building a `Statement` object per block. The rectangles of every port and
+obstruction go into one contiguous array of (layer id, x1, y1, x2, y2) rows per file,
+and each `LayerDef`-like entry holds a view into it. `FastLefParser` exposes the same
+`macro_dict`, `layer_dict`, `via_dict` and `cell_height` as `LefParser`. The `shapes`
+of a layer are only turned into `Rect` objects when they are asked for, and
+`LefRowBuilder` reads the arrays directly. TechLEF LAYER and VIA sections are handed
+to the `Layer` and `Via` statements of `lef_util`.
+"""
+
+import io
+import os
+import time
+import argparse
+import contextlib
+from array import array
+
+import numpy as np
+
+from core.parsers.lef.lef_parser import LefParser
+from core.parsers.lef.lef_util import Layer, Via, Pin, Macro, Rect, Polygon
+
+# Columns of a rectangle row
+RECT_COLUMNS = ('Layer_ID', 'X1', 'Y1', 'X2', 'Y2')
+
+
+class CompactLayerDef:
+    """A LAYER entry of a port or obstruction whose rectangles are rows of the file's rectangle array."""
+
+    __slots__ = ('type', 'name', 'layer_id', 'start', 'stop', 'rects', 'polygons')
+
+    def __init__(self, name, layer_id, start):
+        self.type = "LayerDef"
+        self.name = name
+        self.layer_id = layer_id
+        self.start = start
+        self.stop = start
+        # View of the (n, 5) rectangle rows, set once the file is read
+        self.rects = None
+        self.polygons = []
+
+    @property
+    def shapes(self):
+        """The rectangles as `Rect` objects followed by the polygons, as `LayerDef.shapes`."""
+        rects = [Rect([(x1, y1), (x2, y2)]) for _, x1, y1, x2, y2 in self.rects.tolist()]
+        return rects + self.polygons
+
+
+class CompactGeometry:
+    """A PORT or OBS section with `info['LAYER']` holding `CompactLayerDef` entries."""
+
+    __slots__ = ('type', 'name', 'info')
+
+    def __init__(self, geometry_type):
+        self.type = geometry_type
+        self.name = ""
+        self.info = {}
+
+
+class FastLefParser:
+    """Drop-in replacement for `LefParser` that reads macros into compact arrays."""
+
+    def __init__(self, lef_file):
+        self.lef_path = lef_file
+        self.macro_dict = {}
+        self.layer_dict = {}
+        self.via_dict = {}
+        self.cell_height = -1
+        # Layer names of the rectangle rows, indexed by their layer id
+        self.layer_names = []
+        self.rects = np.empty((0, len(RECT_COLUMNS)))
+
+    def get_layer_id(self, layer_ids, name):
+        layer_id = layer_ids.get(name)
+        if layer_id is None:
+            layer_id = layer_ids[name] = len(self.layer_names)
+            self.layer_names.append(name)
+        return layer_id
+
+    def parse(self):
+        rect_values = array('d')
+        add_rect = rect_values.extend
+        layer_defs = []
+        layer_ids = {}
+        macro = pin = geometry = layer_def = block = None
+
+        with open(self.lef_path, "r") as f:
+            for line in f:
+                data = line.split()
+                if not data:
+                    continue
+                keyword = data[0]
+
+                # Inside PORT or OBS, the bulk of a cell LEF
+                if geometry is not None:
+                    if keyword == "RECT":
+                        if layer_def is not None:
+                            try:
+                                rect = [layer_def.layer_id, float(data[1]), float(data[2]), float(data[3]), float(data[4])]
+                            except (ValueError, IndexError):
+                                continue
+                            add_rect(rect)
+                            layer_def.stop += 1
+                    elif keyword == "LAYER":
+                        layer_def = CompactLayerDef(data[1], self.get_layer_id(layer_ids, data[1]), len(rect_values) // len(RECT_COLUMNS))
+                        geometry.info.setdefault("LAYER", []).append(layer_def)
+                        layer_defs.append(layer_def)
+                    elif keyword == "POLYGON":
+                        points = [[float(data[idx]), float(data[idx + 1])] for idx in range(1, len(data) - 2, 2)]
+                        layer_def.polygons.append(Polygon(points))
+                    elif keyword == "END":
+                        geometry = layer_def = None
+                    continue
+
+                # TechLEF sections keep their statement objects
+                if block is not None:
+                    if block.parse_next(data) == 1:
+                        if isinstance(block, Layer):
+                            self.layer_dict[block.name] = block
+                        else:
+                            self.via_dict[block.name] = block
+                        block = None
+                    continue
+
+                if pin is not None:
+                    if keyword == "PORT":
+                        geometry = CompactGeometry("PORT")
+                        pin.info["PORT"] = geometry
+                    elif keyword == "END":
+                        if data[1] == pin.name:
+                            pin = None
+                    else:
+                        pin.parse_next(data)
+                    continue
+
+                if macro is not None:
+                    if keyword == "PIN":
+                        pin = Pin(data[1])
+                        macro.pin_dict[data[1]] = pin
+                        macro.info.setdefault("PIN", []).append(pin)
+                    elif keyword == "OBS":
+                        geometry = CompactGeometry("OBS")
+                        macro.info["OBS"] = geometry
+                    elif keyword == "END":
+                        if data[1] == macro.name:
+                            self.macro_dict[macro.name] = macro
+                            macro = None
+                    else:
+                        macro.parse_next(data)
+                    continue
+
+                if keyword == "MACRO":
+                    macro = Macro(data[1])
+                elif keyword == "LAYER" and len(data) == 2:
+                    block = Layer(data[1])
+                elif keyword == "VIA":
+                    block = Via(data[1])
+
+        # One contiguous array for the file, every layer entry keeps a view of its rows
+        self.rects = np.frombuffer(rect_values, dtype=np.float64).reshape(-1, len(RECT_COLUMNS))
+        for layer_def in layer_defs:
+            layer_def.rects = self.rects[layer_def.start:layer_def.stop]
+
+        for macro in self.macro_dict.values():
+            self.cell_height = macro.info["SIZE"][1]
+            break
+
+
+def get_layer_rects(layer):
+    """Returns the (x1, y1, x2, y2) tuples of a `LayerDef` or `CompactLayerDef`."""
+    if isinstance(layer, CompactLayerDef):
+        return [tuple(rect) for rect in layer.rects[:, 1:].tolist()]
+    return [
+        (float(rect.points[0][0]), float(rect.points[0][1]), float(rect.points[1][0]), float(rect.points[1][1]))
+        for rect in layer.shapes
+    ]
+
+
+def _normalize_shapes(shapes):
+    return [(shape.type, [tuple(point) for point in shape.points]) for shape in shapes]
+
+
+def _normalize_geometry(geometry):
+    if geometry is None:
+        return None
+    return [(layer.name, _normalize_shapes(layer.shapes)) for layer in geometry.info.get("LAYER", [])]
+
+
+def _normalize_macro(macro):
+    info = {key: value for key, value in macro.info.items() if key not in ("PIN", "OBS")}
+    pins = []
+    for name, pin in macro.pin_dict.items():
+        pin_info = {key: value for key, value in pin.info.items() if key != "PORT"}
+        pins.append((name, pin_info, _normalize_geometry(pin.info.get("PORT"))))
+    return info, pins, _normalize_geometry(macro.info.get("OBS"))
+
+
+def _normalize_statement(statement):
+    values = dict(vars(statement))
+    if "layers" in values:
+        values["layers"] = [(layer.name, _normalize_shapes(layer.shapes)) for layer in values["layers"]]
+    return values
+
+
+def compare_parsers(lef_file):
+    """Checks that `FastLefParser` matches `LefParser` on a LEF or TechLEF file and reports both run times."""
+    start = time.perf_counter()
+    reference = LefParser(lef_file)
+    reference.parse()
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = FastLefParser(lef_file)
+    fast.parse()
+    fast_time = time.perf_counter() - start
+
+    mismatches = []
+    if list(reference.macro_dict) != list(fast.macro_dict):
+        mismatches.append(f"macro names ({len(reference.macro_dict)} != {len(fast.macro_dict)})")
+    for name, macro in reference.macro_dict.items():
+        if name in fast.macro_dict and _normalize_macro(macro) != _normalize_macro(fast.macro_dict[name]):
+            mismatches.append(f"macro {name}")
+    for attr in ("layer_dict", "via_dict"):
+        reference_items = {name: _normalize_statement(item) for name, item in getattr(reference, attr).items()}
+        fast_items = {name: _normalize_statement(item) for name, item in getattr(fast, attr).items()}
+        if reference_items != fast_items:
+            mismatches.append(attr)
+    if reference.cell_height != fast.cell_height:
+        mismatches.append("cell_height")
+
+    print(f"LefParser: {reference_time:.3f}s, FastLefParser: {fast_time:.3f}s, speedup: {reference_time / max(fast_time, 1e-9):.1f}x")
+    print(f"{len(fast.macro_dict)} macros, {len(fast.rects)} rectangles, {len(fast.layer_dict)} layers, {len(fast.via_dict)} vias, {len(mismatches)} mismatches")
+    for mismatch in mismatches:
+        print(f"  mismatch: {mismatch}")
+    return mismatches
+
+
+def benchmark_parsers(lef_files, repeats=3):
+    """Prints the best-of-`repeats` throughput of both parsers on each file."""
+    for lef_file in lef_files:
+        megabytes = os.path.getsize(lef_file) / 2**20
+        times = {}
+        for parser_class in (LefParser, FastLefParser):
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    parser_class(lef_file).parse()
+                best = min(best, time.perf_counter() - start)
+            times[parser_class.__name__] = best
+        print(
+            f"{os.path.basename(lef_file)}: {megabytes:.1f} MB, "
+            f"LefParser {megabytes / times['LefParser']:.1f} MB/s, "
+            f"FastLefParser {megabytes / times['FastLefParser']:.1f} MB/s, "
+            f"speedup {times['LefParser'] / times['FastLefParser']:.1f}x"
+        )
+
+
+__all__ = [
+    'FastLefParser',
+    'get_layer_rects',
+    'compare_parsers',
+    'benchmark_parsers'
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lef_path', type=str, nargs='*', help='LEF or TechLEF files to check', default=[])
+    parser.add_argument('--pdk_name', type=str, help='Check and benchmark the LEF file of every cell library variant of this PDK, e.g. sky130', default=None)
+    parser.add_argument('--repeats', type=int, help='Runs per parser and file for the throughput', default=3)
+    args = parser.parse_args()
+
+    lef_files = list(args.lef_path)
+    if args.pdk_name:
+        from config.pdks import get_scl, get_lef_paths
+        for variant in get_scl(args.pdk_name):
+            lef_files += get_lef_paths(args.pdk_name, variant.value)
+
+    mismatches = []
+    for lef_file in lef_files:
+        print(lef_file)
+        mismatches += compare_parsers(lef_file)
+    benchmark_parsers(lef_files, repeats=args.repeats)
+    if mismatches:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -115,8 +115,26 @@ def draw_cells():
     plt.show()
 
 
+def parse_lef(lef_file, parser="lef"):
+    """Parses a LEF or TechLEF file and returns the parser holding its dictionaries.
+
+    `parser="fast"` uses the single-pass reader in `fast_lef_parser`, which keeps the
+    rectangles in arrays, instead of the statement stack of `LefParser`.
+    """
+    if parser == "fast":
+        from core.parsers.lef.fast_lef_parser import FastLefParser
+        lef_parser = FastLefParser(lef_file)
+    elif parser == "lef":
+        lef_parser = LefParser(lef_file)
+    else:
+        raise ValueError(f"Invalid LEF parser {parser}, expected one of ['lef', 'fast']")
+    lef_parser.parse()
+    return lef_parser
+
+
 __all__ = [
-    'LefParser'
+    'LefParser',
+    'parse_lef'
 ]
 
 
@@ -0,0 +1,405 @@
+"""Fast Liberty parser for the subset of the format stored in the PDK database.
+
+A single-pass tokenizer that only builds nodes for the groups ChipXplore uses
+(operating_conditions, lu_table_template, cell, pin, timing and the four NLDM
+tables per arc). Every other group is skipped by brace matching without being
+tokenized. The output matches `parse_liberty_file`.
+"""
+
+import re
+import time
+import argparse
+import numpy as np
+
+from core.parsers.lib.lib_parser import (
+    is_buf, is_inv, is_ff, get_drive_strength, unify_timing_tables,
+    iter_liberty_groups, parse_liberty_file
+)
+
+TIMING_TABLES = ['cell_fall', 'cell_rise', 'fall_transition', 'rise_transition']
+
+# Groups that are turned into nodes, every other group is skipped.
+CELL_SPEC = {'pin': {'timing': {table: {} for table in TIMING_TABLES}}}
+LIBRARY_SPEC = {
+    'operating_conditions': {},
+    'lu_table_template': {},
+    'cell': CELL_SPEC,
+}
+
+_TOKEN = re.compile(r'''
+    (?:\s+|\\\r?\n|/\*.*?\*/)*                 # whitespace, line continuations and comments
+    (?:
+        "((?:\\.|[^"\\])*)"                     # 1: quoted string
+      | ([(){};:,])                             # 2: punctuation
+      | ([^\s(){};:,"\\]+)                      # 3: bare word or number
+    )?
+''', re.S | re.X)
+
+_SKIP = re.compile(r'"(?:\\.|[^"\\])*"|/\*.*?\*/|[{}]', re.S)
+_INT = re.compile(r'[-+]?\d+$')
+_FLOAT = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?$')
+
+
+class LibertySyntaxError(Exception):
+    pass
+
+
+class Group:
+    """A parsed Liberty group with its arguments, simple/complex attributes and kept subgroups."""
+
+    __slots__ = ('name', 'args', 'attributes', 'groups')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.attributes = []
+        self.groups = []
+
+    def get(self, name, default=None):
+        for attr_name, value in self.attributes:
+            if attr_name == name:
+                return value
+        return default
+
+    def get_groups(self, name):
+        return [group for group in self.groups if group.name == name]
+
+
+def _convert(quoted, word):
+    if quoted is not None:
+        return quoted
+    if _INT.match(word):
+        return int(word)
+    if _FLOAT.match(word):
+        return float(word)
+    return word
+
+
+class Tokenizer:
+
+    def __init__(self, text, pos=0):
+        self.text = text
+        self.pos = pos
+
+    def next(self):
+        """Returns the next `(quoted, punct, word)` token, all None at the end of the text."""
+        match = _TOKEN.match(self.text, self.pos)
+        self.pos = match.end()
+        return match.groups()
+
+    def expect(self, punct):
+        token = self.next()
+        if token[1] != punct:
+            raise LibertySyntaxError(f"Expected '{punct}' at offset {self.pos}, got {token}")
+
+    def skip_group(self):
+        """Skips the body of a group whose opening brace was already consumed."""
+        depth = 1
+        for match in _SKIP.finditer(self.text, self.pos):
+            token = match.group(0)
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+                if depth == 0:
+                    self.pos = match.end()
+                    return
+        raise LibertySyntaxError("Unbalanced braces")
+
+    def read_args(self):
+        """Reads a parenthesized argument list whose opening parenthesis was already consumed."""
+        args = []
+        while True:
+            quoted, punct, word = self.next()
+            if punct == ')':
+                return args
+            if punct == ',':
+                continue
+            if quoted is None and word is None:
+                raise LibertySyntaxError(f"Unterminated argument list at offset {self.pos}")
+            args.append(_convert(quoted, word))
+
+    def read_statement(self, spec, group):
+        """Reads one statement into `group`, returns False at the closing brace or end of text."""
+        quoted, punct, word = self.next()
+        if punct == '}' or (quoted is None and punct is None and word is None):
+            return False
+        if punct == ';':
+            return True
+
+        name = word if word is not None else quoted
+        _, punct, _ = self.next()
+
+        if punct == ':':
+            quoted, _, word = self.next()
+            group.attributes.append((name, _convert(quoted, word)))
+            pos = self.pos
+            if self.next()[1] != ';':
+                self.pos = pos
+        elif punct == '(':
+            args = self.read_args()
+            pos = self.pos
+            punct = self.next()[1]
+            if punct == '{':
+                if name in spec:
+                    subgroup = Group(name, args)
+                    self.read_group_body(spec[name], subgroup)
+                    group.groups.append(subgroup)
+                else:
+                    self.skip_group()
+            else:
+                group.attributes.append((name, args))
+                if punct != ';':
+                    self.pos = pos
+        else:
+            raise LibertySyntaxError(f"Unexpected token after '{name}' at offset {self.pos}")
+        return True
+
+    def read_group_body(self, spec, group):
+        while self.read_statement(spec, group):
+            pass
+        return group
+
+
+def _to_array(strings):
+    return np.array([np.array(s.replace("\\\n", "").split(','), dtype=float) for s in strings])
+
+
+def _get_operating_conditions(library):
+    op_cond = library.get_groups('operating_conditions')[0]
+    operating_conditions = {'name': op_cond.args[0]}
+    for attr_name, value in op_cond.attributes:
+        operating_conditions[attr_name] = value
+
+    if 'tree_type' not in operating_conditions.keys():
+        operating_conditions['tree_type'] = ""
+
+    return operating_conditions
+
+
+def _get_templates(library):
+    return {
+        template.args[0]: (template.get('variable_1'), template.get('variable_2'))
+        for template in library.get_groups('lu_table_template')
+    }
+
+
+def _select_timing_table(pin_group, related_pin, table_name):
+    """Mirrors `liberty.types.select_timing_table`: first timing group of the related pin."""
+    for timing_group in pin_group.get_groups('timing'):
+        if timing_group.get('related_pin') == related_pin:
+            tables = timing_group.get_groups(table_name)
+            if not tables:
+                raise KeyError(f"Table name must be one of: {sorted({g.name for g in timing_group.groups})}")
+            return tables[0]
+    raise KeyError(f"No timing group found for related pin {related_pin}")
+
+
+def build_cell(cell_group, templates):
+    """Converts a fast-parsed cell group into the cell dict produced by `parse_cell_group`."""
+    name = cell_group.args[0]
+
+    cell = {
+        'name': name,
+        'area': 0.0,
+        'drive': get_drive_strength(name),
+        'cell_footprint': '',
+        'cell_leakage_power': 0.0,
+        'driver_waveform_fall': '',
+        'driver_waveform_rise': '',
+        'is_buffer': is_buf(name),
+        'is_inverter': is_inv(name),
+        'is_sequential': False,
+        'is_flip_flop': is_ff(name),
+        'is_scan_enabled_flip_flop': False
+    }
+    for attr_name, value in cell_group.attributes:
+        cell[attr_name] = value
+
+    pins = []
+    input_pins = []
+    output_pins = []
+    pin_groups = {}
+
+    for pin_group in cell_group.get_groups('pin'):
+        pin_name = pin_group.args[0]
+        pin = {'name': pin_name}
+        for attr_name, value in pin_group.attributes:
+            pin[attr_name] = value
+
+        cell['is_sequential'] = pin.get('clock', 'false').lower() == "true"
+        cell['is_scan_enabled_flip_flop'] = 'SCE' in pin_name
+
+        if pin['direction'] == 'output':
+            output_pins.append(pin_name)
+            pin_groups.setdefault(pin_name, pin_group)
+        else:
+            input_pins.append(pin_name)
+        pins.append(pin)
+
+    timing_tables_output_pins = {}
+    if len(input_pins) != 0 and len(output_pins) != 0:
+        for output_pin in output_pins:
+            out_pin = pin_groups[output_pin]
+            timing_tables_bypinn = {}
+            for in_pin in input_pins:
+                try:
+                    timing_tables = {}
+                    for table_type in TIMING_TABLES:
+                        table = _select_timing_table(out_pin, in_pin, table_type)
+                        index_1 = _to_array(table.get('index_1'))
+                        index_2 = table.get('index_2')
+                        index_2 = _to_array(index_2) if index_2 is not None else index_1
+                        data = _to_array(table.get('values'))
+                        index_1_label, index_2_label = templates[table.args[0]]
+
+                        timing_tables[table_type] = {'index_1': index_1, 'index_2': index_2, 'data': data,
+                                               'index_1_label': index_1_label, 'index_2_label': index_2_label,
+                                               'timing_sense': [], 'timing_type': []}
+
+                    timing_tables_bypinn[in_pin] = unify_timing_tables(timing_tables)
+                except (KeyError, ValueError) as e:
+                    print(f"Got Error {e}, output pins {output_pins}, input pins: {input_pins}, cell {name}")
+
+            timing_tables_output_pins[output_pin] = timing_tables_bypinn
+
+    for pin in pins:
+        if pin['direction'] == 'output' and pin['name'] in timing_tables_output_pins.keys():
+            pin['timing'] = timing_tables_output_pins[pin['name']]
+
+    cell['pins'] = pins
+    return cell
+
+
+def _parse_library_start(tokenizer):
+    """Consumes `library (name) {` and returns the library group."""
+    quoted, _, word = tokenizer.next()
+    if word != 'library':
+        raise LibertySyntaxError(f"Expected a library group, got {word or quoted}")
+    tokenizer.expect('(')
+    library = Group('library', tokenizer.read_args())
+    tokenizer.expect('{')
+    return library
+
+
+def _iter_cells(tokenizer, library):
+    """Reads the library body and yields each cell group as soon as it is complete."""
+    while True:
+        n_groups = len(library.groups)
+        if not tokenizer.read_statement(LIBRARY_SPEC, library):
+            return
+        if len(library.groups) > n_groups and library.groups[-1].name == 'cell':
+            yield library.groups.pop()
+
+
+def parse_fast_header(header_text):
+    """Parses the library header (everything but the cells) into `(templates, operating_conditions)`."""
+    tokenizer = Tokenizer(header_text)
+    library = _parse_library_start(tokenizer)
+    tokenizer.read_group_body(LIBRARY_SPEC, library)
+    return _get_templates(library), _get_operating_conditions(library)
+
+
+def parse_fast_cell(cell_text, templates):
+    """Parses the text of a single `cell (...) { ... }` group into a cell dict."""
+    cell_group = Group('cell', None)
+    Tokenizer(cell_text).read_statement(LIBRARY_SPEC, cell_group)
+    return build_cell(cell_group.groups[0], templates)
+
+
+def parse_fast_liberty_file(liberty_file, stream=False):
+    """Parses a Liberty file with the fast tokenizer.
+
+    Returns `(cells, operating_conditions)` like `parse_liberty_file`. With
+    `stream=True`, the cells are a generator fed one cell group at a time by
+    `iter_liberty_groups`, so the file is never fully held in memory.
+    """
+    if stream:
+        f = open(liberty_file, "r")
+        groups = iter_liberty_groups(f)
+        _, header_text = next(groups)
+        templates, operating_conditions = parse_fast_header(header_text)
+
+        def cells():
+            with f:
+                for _, cell_text in groups:
+                    yield parse_fast_cell(cell_text, templates)
+
+        return cells(), operating_conditions
+
+    with open(liberty_file, "r") as f:
+        data = f.read()
+
+    tokenizer = Tokenizer(data)
+    library = _parse_library_start(tokenizer)
+
+    cells_data = []
+    cell_groups = list(_iter_cells(tokenizer, library))
+    templates = _get_templates(library)
+    for cell_group in cell_groups:
+        cells_data.append(build_cell(cell_group, templates))
+
+    return cells_data, _get_operating_conditions(library)
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items() if key not in ('timing_sense', 'timing_type')}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'value'):
+        return value.value
+    return value
+
+
+def compare_parsers(liberty_file):
+    """Checks that the fast parser matches the liberty-parser output and reports both run times."""
+    start = time.time()
+    reference_cells, reference_op_cond = parse_liberty_file(liberty_file)
+    reference_time = time.time() - start
+
+    start = time.time()
+    fast_cells, fast_op_cond = parse_fast_liberty_file(liberty_file)
+    fast_time = time.time() - start
+
+    mismatches = []
+    if _normalize(reference_op_cond) != _normalize(fast_op_cond):
+        mismatches.append('operating_conditions')
+    if len(reference_cells) != len(fast_cells):
+        mismatches.append(f"cell count {len(reference_cells)} != {len(fast_cells)}")
+    for reference_cell, fast_cell in zip(reference_cells, fast_cells):
+        if _normalize(reference_cell) != _normalize(fast_cell):
+            mismatches.append(reference_cell['name'])
+
+    print(f"liberty parser: {reference_time:.2f}s, fast parser: {fast_time:.2f}s, speedup: {reference_time / max(fast_time, 1e-9):.1f}x")
+    print(f"{len(reference_cells)} cells, {len(mismatches)} mismatches")
+    for mismatch in mismatches:
+        print(f"  mismatch: {mismatch}")
+
+    return mismatches
+
+
+__all__ = [
+    'parse_fast_liberty_file',
+    'parse_fast_header',
+    'parse_fast_cell',
+    'compare_parsers'
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lib_path', type=str, help='Path to the liberty file, e.g. sky130_fd_sc_hd__tt_025C_1v80.lib', required=True)
+    args = parser.parse_args()
+
+    mismatches = compare_parsers(args.lib_path)
+    if mismatches:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""Byte-offset index of the cell groups in a Liberty file.
+
+A one-time scan records the byte range of the library header and of every
+top-level `cell (...) { ... }` group. The index is persisted as a JSON sidecar
+keyed by the file hash, so later lookups mmap the file and parse only the
+requested cells instead of the whole corner.
+"""
+
+import os
+import re
+import json
+import mmap
+import hashlib
+import argparse
+
+from config.pdks import get_scl, get_scl_corners, get_corner_path, cell_variant
+from core.parsers.lib.lib_parser import parse_liberty_header, parse_liberty_cell
+from core.parsers.lib.fast_lib_parser import parse_fast_header, parse_fast_cell
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".cellidx.json"
+
+_GROUP_TOKENS = re.compile(rb'"(?:\\.|[^"\\])*"|/\*.*?\*/|[{}]|\bcell\s*\(', re.S)
+_CELL_NAME = re.compile(rb'\s*"?([^")\s]+)"?\s*\)')
+
+_hash_cache = {}
+
+
+def file_hash(liberty_file):
+    """Returns the sha1 of a file, cached per (path, size, mtime) for the process lifetime."""
+    stat = os.stat(liberty_file)
+    key = (os.path.abspath(liberty_file), stat.st_size, stat.st_mtime_ns)
+    if key not in _hash_cache:
+        sha = hashlib.sha1()
+        with open(liberty_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        _hash_cache[key] = sha.hexdigest()
+    return _hash_cache[key]
+
+
+def scan_cell_offsets(liberty_file):
+    """Scans a Liberty file and returns `(header_end, {cell_name: [start, end]})` byte offsets."""
+    cells = {}
+    header_end = None
+    depth = 0
+    cell_start = None
+    cell_name = None
+
+    with open(liberty_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for match in _GROUP_TOKENS.finditer(mm):
+            token = match.group(0)
+            if token == b'{':
+                depth += 1
+            elif token == b'}':
+                depth -= 1
+                if cell_start is not None and depth == 1:
+                    cells[cell_name] = [cell_start, match.end()]
+                    cell_start = None
+            elif token.startswith(b'cell') and depth == 1 and cell_start is None:
+                name = _CELL_NAME.match(mm, match.end())
+                cell_name = name.group(1).decode()
+                cell_start = match.start()
+                if header_end is None:
+                    header_end = cell_start
+
+        if header_end is None:
+            header_end = len(mm)
+
+    return header_end, cells
+
+
+def get_index_path(liberty_file, digest, index_dir=None):
+    index_dir = index_dir or os.path.dirname(os.path.abspath(liberty_file))
+    return os.path.join(index_dir, f"{os.path.basename(liberty_file)}.{digest[:16]}{INDEX_SUFFIX}")
+
+
+def build_cell_index(liberty_file, index_dir=None):
+    """Scans a Liberty file and writes its cell index sidecar."""
+    digest = file_hash(liberty_file)
+    header_end, cells = scan_cell_offsets(liberty_file)
+    index = {
+        'version': INDEX_VERSION,
+        'file': os.path.abspath(liberty_file),
+        'sha1': digest,
+        'header': [0, header_end],
+        'cells': cells,
+    }
+
+    index_path = get_index_path(liberty_file, digest, index_dir)
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with open(index_path, "w") as f:
+            json.dump(index, f)
+    except OSError as e:
+        print(f"Could not write cell index {index_path}: {e}")
+
+    return index
+
+
+def load_cell_index(liberty_file, index_dir=None):
+    """Returns the cell index of a Liberty file, building it if the sidecar is missing or stale."""
+    digest = file_hash(liberty_file)
+    index_path = get_index_path(liberty_file, digest, index_dir)
+    if os.path.exists(index_path):
+        with open(index_path, "r") as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION and index.get('sha1') == digest:
+            return index
+
+    return build_cell_index(liberty_file, index_dir=index_dir)
+
+
+def parse_cells(liberty_file, cell_names=None, parser="liberty", index_dir=None):
+    """Parses only the requested cells of a Liberty file.
+
+    Returns `(cells, operating_conditions)` like `parse_liberty_file`, where `cells`
+    follows the order of `cell_names` and skips names that are not in the file.
+    All cells are parsed when `cell_names` is None.
+    """
+    index = load_cell_index(liberty_file, index_dir=index_dir)
+    if cell_names is None:
+        cell_names = list(index['cells'].keys())
+
+    with open(liberty_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header_start, header_end = index['header']
+        header_text = mm[header_start:header_end].decode() + "}\n"
+
+        if parser == "fast":
+            templates, operating_conditions = parse_fast_header(header_text)
+        elif parser == "liberty":
+            library, operating_conditions = parse_liberty_header(header_text)
+        else:
+            raise ValueError(f"Invalid Liberty parser {parser}, expected one of ['liberty', 'fast']")
+
+        cells = []
+        for cell_name in cell_names:
+            if cell_name not in index['cells']:
+                continue
+            start, end = index['cells'][cell_name]
+            cell_text = mm[start:end].decode()
+            if parser == "fast":
+                cells.append(parse_fast_cell(cell_text, templates))
+            else:
+                cells.append(parse_liberty_cell(cell_text, library))
+
+    return cells, operating_conditions
+
+
+def lookup_cell_across_corners(pdk_name, cell_name, variant=None, parser="fast", index_dir=None):
+    """Returns `{(variant, corner): cell}` for one cell in every Liberty corner of the PDK.
+
+    `variant` restricts the lookup to one standard cell library (e.g. HighDensity).
+    """
+    results = {}
+    scl_corners = get_scl_corners(pdk_name)
+
+    for scl_variant in get_scl(pdk_name):
+        if variant is not None and variant not in (scl_variant.name, scl_variant.value):
+            continue
+        variant_name = cell_variant(pdk_name, [scl_variant.name])[0]
+
+        for corner in scl_corners[scl_variant]:
+            corner_path = get_corner_path(pdk_name, variant_name, corner.value)
+            if not os.path.exists(corner_path):
+                continue
+            cells, _ = parse_cells(corner_path, [cell_name], parser=parser, index_dir=index_dir)
+            if cells:
+                results[(variant_name, corner.value)] = cells[0]
+
+    return results
+
+
+__all__ = [
+    'build_cell_index',
+    'load_cell_index',
+    'parse_cells',
+    'lookup_cell_across_corners'
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdk_name', type=str, help='Name of the PDK', default="sky130")
+    parser.add_argument('--variant', type=str, help='Standard cell library variant to search, e.g. HighDensity', default=None)
+    parser.add_argument('--cell', type=str, help='Name of the cell to look up', required=True)
+    parser.add_argument('--index_dir', type=str, help='Directory for the cell index sidecars (defaults to the liberty file directory)', default=None)
+    args = parser.parse_args()
+
+    results = lookup_cell_across_corners(args.pdk_name, args.cell, variant=args.variant, index_dir=args.index_dir)
+    for (variant_name, corner), cell in results.items():
+        print(f"{variant_name} {corner}: area={cell['area']}, leakage={cell['cell_leakage_power']}, pins={[pin['name'] for pin in cell['pins']]}")
+
+
+if __name__ == '__main__':
+    main()
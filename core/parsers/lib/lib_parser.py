@@ -82,15 +82,42 @@ def create_unified_timing_table(timing_tables):
 
     return unified_timing_table
 
-def parse_liberty_file(liberty_file):
-    """Parses a Liberty file and extracts cell data."""
-    # Replace all occurrences of !VAR in 'when' conditions
-    with open(liberty_file, "r") as f:
-        data = f.read()
-
-    fixed_data = re.sub(r'leakage_power\s*\(\)\s*\{.*?\}', '', data, flags=re.DOTALL)
-
-    library = parse_liberty(fixed_data)
+def unify_timing_tables(timing_tables):
+    """Adds the average delay/transition tables and flattens the NLDM tables of one arc into rows.
+
+    `timing_tables` maps each of cell_fall, cell_rise, fall_transition and rise_transition
+    to its index vectors, data grid, template labels and timing attributes.
+    """
+    # compute average delay
+    average_delay = (timing_tables['cell_fall']['data'] + timing_tables['cell_rise']['data']) / 2
+    average_prop_delay = {
+        'index_1': timing_tables['cell_fall']['index_1'],
+        'index_2': timing_tables['cell_fall']['index_2'],
+        'index_1_label': timing_tables['cell_fall']['index_1_label'], 
+        'index_2_label': timing_tables['cell_fall']['index_2_label'], 
+        'timing_sense': timing_tables['cell_fall']['timing_sense'], 
+        'timing_type': timing_tables['cell_fall']['timing_type'], 
+        'data': average_delay
+    }
+    timing_tables['average_delay'] = average_prop_delay
+
+    # compute average transition
+    average_transition = (timing_tables['rise_transition']['data'] + timing_tables['fall_transition']['data']) / 2
+    average_transition_table = {
+        'index_1': timing_tables['rise_transition']['index_1'],
+        'index_2': timing_tables['rise_transition']['index_2'],
+        'index_1_label': timing_tables['rise_transition']['index_1_label'], 
+        'index_2_label': timing_tables['rise_transition']['index_2_label'], 
+        'timing_sense': timing_tables['rise_transition']['timing_sense'], 
+        'timing_type': timing_tables['rise_transition']['timing_type'], 
+        'data': average_transition
+    }
+    timing_tables['average_transition'] = average_transition_table
+    return create_unified_timing_table(timing_tables)
+
+
+def get_operating_conditions(library):
+    """Extracts the operating conditions and units of a parsed library group."""
     time_unit_str = library['time_unit'].value
     cap_unit_str = library['capacitive_load_unit']
     voltage_unit = library['voltage_unit']
@@ -117,187 +144,306 @@ def parse_liberty_file(liberty_file):
     print(f"time_unit_str = {time_unit_str}")
     print(f"cap_unit_str = {cap_unit_str}")
 
-    cells_data = []
-   
-    # Loop through all cells.
-    for cell_group in library.get_groups('cell'):
-        pins = []
-
-        if type(cell_group.args[0]) != str: 
-            name = cell_group.args[0].value
-        else: 
-            name = cell_group.args[0]
-
-        is_buffer = is_buf(name)
-        is_inverter = is_inv(name)
-        is_flip_flop = is_ff(name)
-
-        drive = get_drive_strength(name)
-
-        cell = {
-            'name': name, 
-            'area': 0.0, 
-            'drive': drive,
-            'cell_footprint': '', 
-            'cell_leakage_power': 0.0, 
-            'driver_waveform_fall': '', 
-            'driver_waveform_rise': '',
-            'is_buffer': is_buffer,
-            'is_inverter': is_inverter,
-            'is_sequential': False,
-            'is_flip_flop': is_flip_flop,
-            'is_scan_enabled_flip_flop': False
-        }
-        
-        for attribute in cell_group.attributes:
+    return operating_conditions
+
+
+def parse_cell_group(cell_group, library):
+    """Extracts the attributes, pins and unified timing tables of one cell group.
+
+    `library` is only used to resolve the lu_table_template of each timing table,
+    so a library holding just the header groups is enough.
+    """
+    pins = []
+
+    if type(cell_group.args[0]) != str: 
+        name = cell_group.args[0].value
+    else: 
+        name = cell_group.args[0]
+
+    is_buffer = is_buf(name)
+    is_inverter = is_inv(name)
+    is_flip_flop = is_ff(name)
+
+    drive = get_drive_strength(name)
+
+    cell = {
+        'name': name, 
+        'area': 0.0, 
+        'drive': drive,
+        'cell_footprint': '', 
+        'cell_leakage_power': 0.0, 
+        'driver_waveform_fall': '', 
+        'driver_waveform_rise': '',
+        'is_buffer': is_buffer,
+        'is_inverter': is_inverter,
+        'is_sequential': False,
+        'is_flip_flop': is_flip_flop,
+        'is_scan_enabled_flip_flop': False
+    }
+    
+    for attribute in cell_group.attributes:
+        if isinstance(attribute.value, EscapedString):
+            cell[attribute.name] = attribute.value.value
+        else:
+            cell[attribute.name] = attribute.value 
+
+    
+    # Loop through all pins of the cell.
+    input_pins = []
+    output_pins = [] 
+    
+    internal_power_tables_input_pins = {}
+    internal_power_tables_output_pins = {}
+    
+    for pin_group in cell_group.get_groups('pin'):
+
+        if type(pin_group.args[0]) != str: 
+            pin_name = pin_group.args[0].value
+        else:
+            pin_name = pin_group.args[0]
+
+        pin = {'name': pin_name}
+        for attribute in pin_group.attributes:
             if isinstance(attribute.value, EscapedString):
-                cell[attribute.name] = attribute.value.value
+                pin[attribute.name] = attribute.value.value
             else:
-                cell[attribute.name] = attribute.value 
-
-        
-        # Loop through all pins of the cell.
-        input_pins = []
-        output_pins = [] 
+                pin[attribute.name] = attribute.value
         
-        internal_power_tables_input_pins = {}
-        internal_power_tables_output_pins = {}
-        
-        for pin_group in cell_group.get_groups('pin'):
+        has_clock_pin = True if pin.get('clock', 'false').lower() == "true" else False
+        cell['is_sequential'] = has_clock_pin 
 
-            if type(pin_group.args[0]) != str: 
-                pin_name = pin_group.args[0].value
-            else:
-                pin_name = pin_group.args[0]
-
-            pin = {'name': pin_name}
-            for attribute in pin_group.attributes:
-                if isinstance(attribute.value, EscapedString):
-                    pin[attribute.name] = attribute.value.value
-                else:
-                    pin[attribute.name] = attribute.value
-            
-            has_clock_pin = True if pin.get('clock', 'false').lower() == "true" else False
-            cell['is_sequential'] = has_clock_pin 
-
-            cell['is_scan_enabled_flip_flop'] = True if 'SCE' in pin_name else False 
-
-            if pin['direction'] == 'output':
-               output_pins.append(pin['name'])
-            else:
-                input_pins.append(pin['name'])
-                # get internal power tables 
-                internal_power = pin_group.get_groups('internal_power')
-                # if len(internal_power) != 0:
-                #     fall_power = internal_power[0].get_groups('fall_power')
-                #     fall_power_index_1 = fall_power[0].get_array('index_1')[0]
-                #     fall_power_values = fall_power[0].get_array('values')[0]
-
-                #     rise_power = internal_power[0].get_groups('rise_power')
-                #     # rise_power_index_1 = rise_power[0].get_array('index_1')[0]
-                #     # rise_power_values = rise_power[0].get_array('values')[0]
-
-                #     # internal_power_tables_input_pins[pin_name] = {
-                #     #     'fall_power':{
-                #     #         'index_1': fall_power_index_1,
-                #     #         'values': fall_power_values
-                #     #     },
-                #     #     'rise_power': {
-                #     #         'index_1': rise_power_index_1,
-                #     #         'values': rise_power_values
-                #     #     }
-                #     # }
-
-            pins.append(pin)
- 
-        # get timing tables
-        timing_tables_output_pins = {}
-        if len(input_pins) != 0 and len(output_pins) != 0:
-            for output_pin in output_pins: 
-                out_pin = select_pin(cell_group, output_pin)
-                timing_tables_bypinn = {}
-                for in_pin in input_pins:
-                    try: 
-                        timing_tables = {}
-                        for table_type in ['cell_fall', 'cell_rise', 'fall_transition', 'rise_transition']: 
-                            table = select_timing_table(out_pin, related_pin=in_pin, table_name=table_type)
-                            
-                            timing_sense = table.get_groups('timing_sense')
-                            timing_type = table.get_groups('timing_type')
-                            index_1 = table.get_array('index_1')
-                            try: 
-                                index_2 = table.get_array('index_2')
-                            except: 
-                                index_2 = index_1 
-
-                            data = table.get_array('values')
-                            
-                            # Find out which index is the output load and which the input slew.
-                            template_name = table.args[0]
-                            template = library.get_group('lu_table_template', template_name)
-
-                            if type(template['variable_1']) != str:
-                                index_1_label = template['variable_1'].value
-                                index_2_label = template['variable_2'].value
-                            else:
-                                index_1_label = template['variable_1']
-                                index_2_label = template['variable_2']
-                            
-                            timing_tables[table_type] = {'index_1': index_1, 'index_2': index_2, 'data': data, 
-                                                   'index_1_label': index_1_label, 'index_2_label': index_2_label,
-                                                   'timing_sense': timing_sense, 'timing_type': timing_type}
+        cell['is_scan_enabled_flip_flop'] = True if 'SCE' in pin_name else False 
+
+        if pin['direction'] == 'output':
+           output_pins.append(pin['name'])
+        else:
+            input_pins.append(pin['name'])
+            # get internal power tables 
+            internal_power = pin_group.get_groups('internal_power')
+            # if len(internal_power) != 0:
+            #     fall_power = internal_power[0].get_groups('fall_power')
+            #     fall_power_index_1 = fall_power[0].get_array('index_1')[0]
+            #     fall_power_values = fall_power[0].get_array('values')[0]
+
+            #     rise_power = internal_power[0].get_groups('rise_power')
+            #     # rise_power_index_1 = rise_power[0].get_array('index_1')[0]
+            #     # rise_power_values = rise_power[0].get_array('values')[0]
+
+            #     # internal_power_tables_input_pins[pin_name] = {
+            #     #     'fall_power':{
+            #     #         'index_1': fall_power_index_1,
+            #     #         'values': fall_power_values
+            #     #     },
+            #     #     'rise_power': {
+            #     #         'index_1': rise_power_index_1,
+            #     #         'values': rise_power_values
+            #     #     }
+            #     # }
+
+        pins.append(pin)
+
+    # get timing tables
+    timing_tables_output_pins = {}
+    if len(input_pins) != 0 and len(output_pins) != 0:
+        for output_pin in output_pins: 
+            out_pin = select_pin(cell_group, output_pin)
+            timing_tables_bypinn = {}
+            for in_pin in input_pins:
+                try: 
+                    timing_tables = {}
+                    for table_type in ['cell_fall', 'cell_rise', 'fall_transition', 'rise_transition']: 
+                        table = select_timing_table(out_pin, related_pin=in_pin, table_name=table_type)
                         
-                        # compute average delay
-                        average_delay = (timing_tables['cell_fall']['data'] + timing_tables['cell_rise']['data']) / 2
-                        average_prop_delay = {
-                            'index_1': timing_tables['cell_fall']['index_1'],
-                            'index_2': timing_tables['cell_fall']['index_2'],
-                            'index_1_label': timing_tables['cell_fall']['index_1_label'], 
-                            'index_2_label': timing_tables['cell_fall']['index_2_label'], 
-                            'timing_sense': timing_tables['cell_fall']['timing_sense'], 
-                            'timing_type': timing_tables['cell_fall']['timing_type'], 
-                            'data': average_delay
-                        }
-                        timing_tables['average_delay'] = average_prop_delay
-
-                        # compute average transition
-                        average_transition = (timing_tables['rise_transition']['data'] + timing_tables['fall_transition']['data']) / 2
-                        average_transition_table = {
-                            'index_1': timing_tables['rise_transition']['index_1'],
-                            'index_2': timing_tables['rise_transition']['index_2'],
-                            'index_1_label': timing_tables['rise_transition']['index_1_label'], 
-                            'index_2_label': timing_tables['rise_transition']['index_2_label'], 
-                            'timing_sense': timing_tables['rise_transition']['timing_sense'], 
-                            'timing_type': timing_tables['rise_transition']['timing_type'], 
-                            'data': average_transition
-                        }
-                        timing_tables['average_transition'] = average_transition_table
-                        unified_timing_tables = create_unified_timing_table(timing_tables)
-                        timing_tables_bypinn[in_pin] = unified_timing_tables
-                    except (KeyError, ValueError) as e: 
-                        print(f"Got Error {e}, output pins {output_pins}, input pins: {input_pins}, cell {name}")
-
-                timing_tables_output_pins[output_pin] = timing_tables_bypinn
-      
-            # get internal power tables
-
-        for pin in pins: 
-            name = pin['name']
-            if pin['direction'] == 'output' and name in timing_tables_output_pins.keys():
-                pin['timing'] = timing_tables_output_pins[name]
-            if pin['direction'] == 'input' and name in internal_power_tables_input_pins.keys():
-                pin['internal_power'] = internal_power_tables_input_pins[name]
-            # elif pin['direction'] == 'output':
-            #     pin['internal_power'] = internal_power_tables_output_pins[name]
-        
-        cell['pins'] = pins
-        cells_data.append(cell)    
+                        timing_sense = table.get_groups('timing_sense')
+                        timing_type = table.get_groups('timing_type')
+                        index_1 = table.get_array('index_1')
+                        try: 
+                            index_2 = table.get_array('index_2')
+                        except: 
+                            index_2 = index_1 
+
+                        data = table.get_array('values')
+                        
+                        # Find out which index is the output load and which the input slew.
+                        template_name = table.args[0]
+                        template = library.get_group('lu_table_template', template_name)
+
+                        if type(template['variable_1']) != str:
+                            index_1_label = template['variable_1'].value
+                            index_2_label = template['variable_2'].value
+                        else:
+                            index_1_label = template['variable_1']
+                            index_2_label = template['variable_2']
+                        
+                        timing_tables[table_type] = {'index_1': index_1, 'index_2': index_2, 'data': data, 
+                                               'index_1_label': index_1_label, 'index_2_label': index_2_label,
+                                               'timing_sense': timing_sense, 'timing_type': timing_type}
+                    
+                    unified_timing_tables = unify_timing_tables(timing_tables)
+                    timing_tables_bypinn[in_pin] = unified_timing_tables
+                except (KeyError, ValueError) as e: 
+                    print(f"Got Error {e}, output pins {output_pins}, input pins: {input_pins}, cell {name}")
+
+            timing_tables_output_pins[output_pin] = timing_tables_bypinn
+  
+        # get internal power tables
+
+    for pin in pins: 
+        name = pin['name']
+        if pin['direction'] == 'output' and name in timing_tables_output_pins.keys():
+            pin['timing'] = timing_tables_output_pins[name]
+        if pin['direction'] == 'input' and name in internal_power_tables_input_pins.keys():
+            pin['internal_power'] = internal_power_tables_input_pins[name]
+        # elif pin['direction'] == 'output':
+        #     pin['internal_power'] = internal_power_tables_output_pins[name]
+    
+    cell['pins'] = pins
+    return cell
+
+
+def strip_leakage_power(data):
+    """Removes the `leakage_power () { ... }` groups the liberty parser can not handle."""
+    return re.sub(r'leakage_power\s*\(\)\s*\{.*?\}', '', data, flags=re.DOTALL)
+
+
+def parse_liberty_file(liberty_file, stream=False, parser="liberty"):
+    """Parses a Liberty file and extracts cell data.
+
+    With `stream=True` the cells are returned as a generator that parses one
+    cell group at a time (see `stream_liberty_file`), otherwise as a list.
+    `parser="fast"` uses the purpose-built tokenizer in `fast_lib_parser` instead
+    of the generic liberty-parser grammar.
+    """
+    if parser == "fast":
+        from core.parsers.lib.fast_lib_parser import parse_fast_liberty_file
+        return parse_fast_liberty_file(liberty_file, stream=stream)
+    elif parser != "liberty":
+        raise ValueError(f"Invalid Liberty parser {parser}, expected one of ['liberty', 'fast']")
+
+    if stream:
+        return stream_liberty_file(liberty_file)
+
+    # Replace all occurrences of !VAR in 'when' conditions
+    with open(liberty_file, "r") as f:
+        data = f.read()
+
+    fixed_data = strip_leakage_power(data)
+
+    library = parse_liberty(fixed_data)
+    operating_conditions = get_operating_conditions(library)
+
+    cells_data = []
+   
+    # Loop through all cells.
+    for cell_group in library.get_groups('cell'):
+        cells_data.append(parse_cell_group(cell_group, library))
     
     return cells_data, operating_conditions  
 
 
+_BRACE_TOKENS = re.compile(r'"(?:\\.|[^"\\])*"|/\*|\*/|[{}]')
+_CELL_START = re.compile(r'^\s*cell\s*\(')
+
+
+def _scan_braces(line, in_comment):
+    """Returns the brace depth change of a line and whether it ends inside a comment.
+
+    Braces inside quoted strings and /* */ comments are ignored.
+    """
+    delta = 0
+    for match in _BRACE_TOKENS.finditer(line):
+        token = match.group(0)
+        if in_comment:
+            if token == '*/':
+                in_comment = False
+        elif token == '/*':
+            in_comment = True
+        elif token == '{':
+            delta += 1
+        elif token == '}':
+            delta -= 1
+    return delta, in_comment
+
+
+def iter_liberty_groups(f):
+    """Splits a Liberty file into its library header and its cell groups.
+
+    Yields `('header', text)` once, holding every library level statement that
+    appears before the first cell (units, lu_table_template, operating_conditions, ...),
+    followed by one `('cell', text)` per `cell (...) { ... }` group. Only one cell
+    group is held in memory at a time.
+    """
+    header = []
+    cell = None
+    depth = 0
+    in_comment = False
+    header_done = False
+
+    for line in f:
+        if cell is None and depth == 1 and not in_comment and _CELL_START.match(line):
+            cell = []
+            if not header_done:
+                header_done = True
+                yield 'header', ''.join(header) + '}\n'
+                header = None
+
+        delta, in_comment = _scan_braces(line, in_comment)
+        depth += delta
+
+        if cell is not None:
+            cell.append(line)
+            if depth == 1:
+                yield 'cell', ''.join(cell)
+                cell = None
+        elif not header_done:
+            header.append(line)
+
+    if not header_done:
+        yield 'header', ''.join(header)
+
+
+def parse_liberty_header(header_text):
+    """Parses the library header (everything but the cells) into `(library, operating_conditions)`."""
+    library = parse_liberty(strip_leakage_power(header_text))
+    return library, get_operating_conditions(library)
+
+
+def parse_liberty_cell(cell_text, library):
+    """Parses the text of a single `cell (...) { ... }` group into a cell dict."""
+    cell_library = parse_liberty('library (cell) {\n' + strip_leakage_power(cell_text) + '\n}\n')
+    return parse_cell_group(cell_library.get_groups('cell')[0], library)
+
+
+def stream_liberty_file(liberty_file):
+    """Parses a Liberty file cell by cell.
+
+    Returns the same `(cells, operating_conditions)` pair as `parse_liberty_file`,
+    but `cells` is a generator that reads and parses one cell group per step, so
+    peak memory is bounded by the largest cell instead of the whole library.
+    The library header (units, templates and operating conditions) must precede
+    the cell groups, as it does in the PDK libraries. The file is read once for the
+    header and reopened by `cells` when it is first iterated, so it is never left open
+    by a failed header or a generator that is not consumed.
+    """
+    with open(liberty_file, "r") as f:
+        _, header_text = next(iter_liberty_groups(f))
+
+    library, operating_conditions = parse_liberty_header(header_text)
+
+    def cells():
+        with open(liberty_file, "r") as f:
+            groups = iter_liberty_groups(f)
+            # The header was parsed above
+            next(groups)
+            for _, cell_text in groups:
+                yield parse_liberty_cell(cell_text, library)
+
+    return cells(), operating_conditions
+
+
 __all__ = [
-    'parse_liberty_file'
+    'parse_liberty_file',
+    'stream_liberty_file'
 ]
 
 
@@ -70,14 +70,16 @@ def compute_accuracy(run, example) -> dict:
     execution_accuracy = compute_execution_acc(
         predicted_queries=predicted_query, 
         ground_truth_queries=[ground_truth_query],
-        database=config.db_config.pdk_database
+        database=config.db_config.pdk_database,
+        guard=config.db_config.query_guard
     )
 
     valid_efficiency_score = compute_ves(
         predicted_queries=predicted_query,
         ground_truth=[ground_truth_query],
         database=config.db_config.pdk_database,
-        num_iters=3
+        num_iters=3,
+        guard=config.db_config.query_guard
     )
 
     return {